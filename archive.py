@@ -0,0 +1,315 @@
+""" This module stores finished games in a compact binary archive. Every move
+takes two bytes, the move code of Move (start, end and promotion), so a game
+is a small header followed by an array of 16-bit integers. An index of the
+game offsets at the end of the file gives random access: the archive is read
+through mmap and game K, or move N of game K, is found without reading or
+parsing the games before it.
+
+Usage:
+    python archive.py pack games.pgn.gz games.cga
+    python archive.py pack games.txt games.cga --format uci --append
+    python archive.py show games.cga 12 --ply 20
+    python archive.py info games.cga
+
+A file of format uci holds one game per line, as moves such as "e2e4 e7e5".
+
+Layout of an archive (all integers little-endian):
+    header: magic, version, number of games, offset of the index
+    games: plies, result, length of the starting FEN (0 for the starting
+        positions), the FEN and the move codes
+    index: the offset of every game
+Appending writes the new games and a new index after the old index, which
+is left behind unused.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List
+from bitboards import move_to_uci
+from classes import Positions
+from runner import parse_move
+
+MAGIC = b'CHGA'
+VERSION = 1
+# Magic, version, number of games and offset of the index
+HEADER = struct.Struct('<4sIIQ')
+# Plies, result and length of the starting FEN
+GAME_HEADER = struct.Struct('<HBB')
+MOVE = struct.Struct('<H')
+OFFSET = struct.Struct('<Q')
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+MAX_PLIES = 0xFFFF
+
+
+def _pack_game(game: Dict) -> bytes:
+    """ Returns the record of a game. The game is a dict with the moves (move
+    codes or move strings) and optionally the result and the FEN it starts
+    from as 'start_fen', such as the results of runner.GameRunner.play. """
+    moves = [parse_move(move) for move in game['moves']]
+    if len(moves) > MAX_PLIES:
+        raise ValueError(f'Games can have at most {MAX_PLIES} plies')
+    fen = (game.get('start_fen') or '').encode('ascii')
+    result = RESULTS.index(game.get('result') or '*')
+
+    return (
+        GAME_HEADER.pack(len(moves), result, len(fen))
+        + fen
+        + struct.pack(f'<{len(moves)}H', *moves)
+    )
+
+
+def append_games(path: str, games: Iterable[Dict]) -> int:
+    """ Adds the games to the end of an archive, creating it if it doesn't
+    exist, and returns the number of games in the archive. Every game is
+    packed before the file is touched. The new games and the whole index
+    are written after the old index, and only then does the header point to
+    them, so an append that fails leaves the archive as it was. The old
+    index stays behind as unused space, so games should be appended in
+    batches rather than one by one. """
+    records = [_pack_game(game) for game in games]
+    if not os.path.exists(path):
+        with open(path, 'wb') as archive:
+            archive.write(HEADER.pack(MAGIC, VERSION, 0, HEADER.size))
+
+    with open(path, 'r+b') as archive:
+        magic, version, count, index_offset = HEADER.unpack(
+            archive.read(HEADER.size)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a game archive')
+        archive.seek(index_offset)
+        index = archive.read(count * OFFSET.size)
+        if len(index) != count * OFFSET.size:
+            raise ValueError(f'{path} is truncated')
+        if not records:
+
+            return count
+        size = archive.seek(0, os.SEEK_END)
+        offset = size
+        offsets = bytearray(index)
+        try:
+            archive.seek(offset)
+            for record in records:
+                archive.write(record)
+                offsets += OFFSET.pack(offset)
+                offset += len(record)
+            archive.write(offsets)
+            archive.flush()
+            os.fsync(archive.fileno())
+        except BaseException:
+            archive.truncate(size)
+            raise
+        count += len(records)
+        archive.seek(0)
+        archive.write(HEADER.pack(MAGIC, VERSION, count, offset))
+
+    return count
+
+
+def write_archive(path: str, games: Iterable[Dict]) -> int:
+    """ Writes the games to a new archive, replacing the file if there is
+    one, and returns the number of games. """
+    if os.path.exists(path):
+        os.remove(path)
+
+    return append_games(path, games)
+
+
+class GameArchive:
+    """ Read-only view of an archive file.
+    Properties:
+        self.path: the archive file.
+        self.games: the number of games in the archive.
+    Methods:
+        self.plies(): returns the number of plies of a game.
+        self.move(): returns a single move of a game.
+        self.moves(): returns all the moves of a game.
+        self.game(): returns a game with its result and starting FEN.
+        self.positions(): returns the positions after a move of a game.
+        self.close(): closes the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        """ Maps the file and checks its header and index. """
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f'{self.path} is not a game archive')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.games, self._index = HEADER.unpack_from(
+            self._map, 0
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{self.path} is not a game archive')
+        if size < self._index + self.games * OFFSET.size:
+            raise ValueError(f'{self.path} is truncated')
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'GameArchive':
+
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+
+        return self.games
+
+    def __iter__(self) -> Iterator[Dict]:
+        for number in range(self.games):
+            yield self.game(number)
+
+    def __getstate__(self):
+        """ Only the path is pickled, see OpeningBook.__getstate__. """
+
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
+
+    def _header(self, number: int):
+        """ Returns the offset, plies, result and FEN length of a game. """
+        if not 0 <= number < self.games:
+            raise IndexError(f'There is no game {number} in {self.path}')
+        offset = OFFSET.unpack_from(
+            self._map, self._index + number * OFFSET.size
+        )[0]
+
+        return (offset, *GAME_HEADER.unpack_from(self._map, offset))
+
+    def plies(self, number: int) -> int:
+        """ Returns the number of plies of game number (counted from 0). """
+
+        return self._header(number)[1]
+
+    def move(self, number: int, ply: int) -> int:
+        """ Returns the move code of ply (counted from 0) of game number. """
+        offset, plies, _, fen_length = self._header(number)
+        if not 0 <= ply < plies:
+            raise IndexError(f'Game {number} has no ply {ply}')
+        offset += GAME_HEADER.size + fen_length + ply * MOVE.size
+
+        return MOVE.unpack_from(self._map, offset)[0]
+
+    def moves(self, number: int) -> List[int]:
+        """ Returns the move codes of game number. """
+        offset, plies, _, fen_length = self._header(number)
+        offset += GAME_HEADER.size + fen_length
+
+        return list(struct.unpack_from(f'<{plies}H', self._map, offset))
+
+    def game(self, number: int) -> Dict:
+        """ Returns the moves (as move codes), the result and the starting
+        FEN ('' for the starting positions) of game number. """
+        offset, plies, result, fen_length = self._header(number)
+        offset += GAME_HEADER.size
+        fen = self._map[offset:offset + fen_length].decode('ascii')
+        moves = struct.unpack_from(
+            f'<{plies}H', self._map, offset + fen_length
+        )
+
+        return {
+            'moves': list(moves),
+            'result': RESULTS[result],
+            'start_fen': fen,
+        }
+
+    def positions(self, number: int, ply: int = None) -> Positions:
+        """ Returns the positions of game number after its first ply moves,
+        or after all of them. This replays the moves, unlike the other
+        methods. """
+        game = self.game(number)
+        positions = Positions(game['start_fen'] or None)
+        for code in game['moves'][:ply]:
+            positions.make_move(code)
+
+        return positions
+
+
+def _read_source(path: str, source_format: str) -> Iterator[Dict]:
+    """ Yields the games of a PGN file or of a file of move strings. PGN games
+    with a move that can't be replayed are skipped and reported. """
+    if source_format == 'uci':
+        # Imported here, so that reading an archive doesn't import the book
+        from book import read_games
+        for moves in read_games(path):
+            yield {'moves': moves}
+
+        return
+
+    from pgn import read_file, replay_games
+    for number, game in enumerate(replay_games(read_file(path))):
+        if game['error']:
+            # The moves stop before the result, so the game isn't stored
+            print(f"Skipped game {number}: {game['error']}", file=sys.stderr)
+            continue
+        yield {
+            'moves': game['moves'],
+            'result': game['result'],
+            'start_fen': game['tags'].get('FEN', ''),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help='add games to an archive')
+    pack.add_argument('source', help='PGN file or file of move strings')
+    pack.add_argument('archive', help='archive file to write')
+    pack.add_argument(
+        '--format', choices=('pgn', 'uci'), default='pgn',
+        help='format of the source file'
+    )
+    pack.add_argument(
+        '--append', action='store_true',
+        help='add to the archive instead of replacing it'
+    )
+    show = commands.add_parser('show', help='show a game of an archive')
+    show.add_argument('archive', help='archive file to read')
+    show.add_argument('game', type=int, help='number of the game, from 0')
+    show.add_argument(
+        '--ply', type=int, help='show the positions after this many plies'
+    )
+    info = commands.add_parser('info', help='show the size of an archive')
+    info.add_argument('archive', help='archive file to read')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        games = _read_source(args.source, args.format)
+        if args.append:
+            count = append_games(args.archive, games)
+        else:
+            count = write_archive(args.archive, games)
+        print(f'{args.archive} holds {count} games')
+    elif args.command == 'show':
+        with GameArchive(args.archive) as archive:
+            game = archive.game(args.game)
+            print(' '.join(move_to_uci(code) for code in game['moves']))
+            print(f"Result: {game['result']}")
+            if args.ply is not None:
+                print(archive.positions(args.game, args.ply).to_fen())
+    else:
+        size = os.path.getsize(args.archive)
+        with GameArchive(args.archive) as archive:
+            games = len(archive)
+            plies = sum(archive.plies(number) for number in range(games))
+        print(
+            f'Games: {games}\n'
+            f'Plies: {plies}\n'
+            f'Bytes: {size} ({size / max(games, 1):.1f} per game)'
+        )
+
+
+if __name__ == '__main__':
+    main()
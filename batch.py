@@ -0,0 +1,214 @@
+""" This module holds many boards in NumPy arrays, so that they can be scored
+all at once instead of square by square in Python. A board is an 8x8 array of
+int8 piece codes: 0 for an empty square, 1 to 6 for a white pawn, knight,
+bishop, rook, queen and king, and -1 to -6 for the black pieces. As in
+Positions.get_positions(), row 0 is the first row of the board (white's side).
+"""
+from typing import List, Sequence
+import numpy as np
+import evaluation
+from bitboards import PIECE_TYPES
+from classes import FEN_LETTERS, Piece, Positions
+
+# Piece code for every Positions mailbox value (EMPTY and 0-11), shifted by
+# one so that EMPTY maps to index 0.
+MAILBOX_CODES = np.array([0, 1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6],
+                         dtype=np.int8)
+# Piece code for every bitboard index (0-11)
+BITBOARD_CODES = MAILBOX_CODES[1:]
+PIECE_VALUES = np.array(
+    [0] + [Piece.values[piece_type] for piece_type in PIECE_TYPES],
+    dtype=np.int16
+)
+SQUARE_BITS = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+# Piece-square tables in centipawns from white's point of view, indexed
+# [piece type, row, col] with row 0 being white's first row. The same tables
+# are used by the search.
+PIECE_SQUARE_TABLES = np.array(
+    evaluation.PIECE_SQUARE_TABLES, dtype=np.int16
+)
+
+KNIGHT_STEPS = [
+    (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)
+]
+KING_STEPS = [
+    (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)
+]
+ROOK_STEPS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+BISHOP_STEPS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+CENTRE = (slice(3, 5), slice(3, 5))
+
+
+def _signed_tables(tables: np.ndarray) -> np.ndarray:
+    """ Turns white's piece-square tables (6, 8, 8) into a lookup table
+    (13, 64) indexed by piece code + 6 and square, holding the score from
+    white's point of view. Black uses the tables mirrored top to bottom. """
+    lookup = np.zeros((13, 64), dtype=np.int32)
+    for piece_type in range(6):
+        lookup[piece_type + 7] = tables[piece_type].ravel()
+        lookup[5 - piece_type] = -tables[piece_type][::-1].ravel()
+
+    return lookup
+
+
+def _shift(boards: np.ndarray, d_row: int, d_col: int) -> np.ndarray:
+    """ Moves every square of a (N, 8, 8) array by d_row rows and d_col
+    columns. Squares moved off the board are dropped and the new squares are
+    zero. """
+    shifted = np.zeros_like(boards)
+    rows_to = slice(max(d_row, 0), 8 + min(d_row, 0))
+    rows_from = slice(max(-d_row, 0), 8 + min(-d_row, 0))
+    cols_to = slice(max(d_col, 0), 8 + min(d_col, 0))
+    cols_from = slice(max(-d_col, 0), 8 + min(-d_col, 0))
+    shifted[:, rows_to, cols_to] = boards[:, rows_from, cols_from]
+
+    return shifted
+
+
+class PositionBatch:
+    """ N boards stored as a (N, 8, 8) int8 array of piece codes.
+    Properties:
+        self.squares: the piece codes of every board.
+        self.turns: 0 if white is to move, 1 if black is, for every board.
+    Methods:
+        self.material(): material balance of every board.
+        self.piece_square_score(): piece-square table score of every board.
+        self.attack_counts(): number of attackers on every square.
+    """
+
+    def __init__(self, squares: np.ndarray, turns: np.ndarray = None):
+        self.squares = np.asarray(squares, dtype=np.int8).reshape(-1, 8, 8)
+        if turns is None:
+            turns = np.zeros(len(self.squares), dtype=np.int8)
+        self.turns = np.asarray(turns, dtype=np.int8)
+
+    def __len__(self):
+
+        return len(self.squares)
+
+    @classmethod
+    def from_positions(cls, positions: Sequence[Positions]) -> 'PositionBatch':
+        """ Creates a batch from a list of Positions. """
+        mailboxes = np.array(
+            [board.mailbox for board in positions], dtype=np.int8
+        ).reshape(-1, 64)
+        turns = np.array([board.turn for board in positions], dtype=np.int8)
+
+        return cls(MAILBOX_CODES[mailboxes + 1], turns)
+
+    def to_positions(self) -> List[Positions]:
+        """ Returns a Positions instance for every board. Castling rights and
+        en passant squares aren't stored in the batch and are left empty. """
+        boards = []
+        for squares, turn in zip(self.squares, self.turns):
+            fen_rows = []
+            for row in squares[::-1]:
+                fen_row = ''
+                for code in row:
+                    if code == 0:
+                        fen_row += '1'
+                    elif code > 0:
+                        fen_row += FEN_LETTERS[code - 1].upper()
+                    else:
+                        fen_row += FEN_LETTERS[-code - 1]
+                fen_rows.append(fen_row)
+            boards.append(Positions(
+                '/'.join(fen_rows) + ' ' + 'wb'[turn] + ' - - 0 1'
+            ))
+
+        return boards
+
+    @classmethod
+    def from_bitboards(
+            cls,
+            bitboards: np.ndarray,
+            turns: np.ndarray = None
+    ) -> 'PositionBatch':
+        """ Creates a batch from a (N, 12) uint64 array of bitboards, ordered
+        as Positions.bitboards. """
+        bitboards = np.asarray(bitboards, dtype=np.uint64).reshape(-1, 12)
+        bits = (bitboards[:, :, None] & SQUARE_BITS) != 0
+        squares = np.einsum(
+            'npq,p->nq', bits.astype(np.int8), BITBOARD_CODES
+        ).astype(np.int8)
+
+        return cls(squares, turns)
+
+    def to_bitboards(self) -> np.ndarray:
+        """ Returns the boards as a (N, 12) uint64 array of bitboards, ordered
+        as Positions.bitboards. """
+        squares = self.squares.reshape(-1, 64)
+        masks = squares[:, None, :] == BITBOARD_CODES[None, :, None]
+
+        return (masks * SQUARE_BITS).sum(axis=2, dtype=np.uint64)
+
+    def material(self) -> np.ndarray:
+        """ Returns the material balance (white minus black, using
+        Piece.values) of every board. """
+        squares = self.squares.reshape(-1, 64)
+        values = PIECE_VALUES[np.abs(squares)] * np.sign(squares)
+
+        return values.sum(axis=1)
+
+    def piece_square_score(
+            self,
+            tables: np.ndarray = PIECE_SQUARE_TABLES
+    ) -> np.ndarray:
+        """ Returns the piece-square table score of every board from white's
+        point of view. tables has shape (6, 8, 8) and is given for white; it's
+        mirrored for black. """
+        lookup = _signed_tables(tables)
+        squares = self.squares.reshape(-1, 64).astype(np.intp) + 6
+
+        return lookup[squares, np.arange(64)].sum(axis=1)
+
+    def attack_counts(self) -> np.ndarray:
+        """ Returns the number of pieces of each team that attack every
+        square, as a (N, 2, 8, 8) array where index 0 is white. Sliding
+        pieces are stopped by the first occupied square. """
+        squares = self.squares
+        empty = squares == 0
+        counts = np.zeros((len(squares), 2, 8, 8), dtype=np.int8)
+        for team, sign in enumerate((1, -1)):
+            team_counts = counts[:, team]
+
+            pawns = (squares == sign).astype(np.int8)
+            for d_col in (-1, 1):
+                team_counts += _shift(pawns, sign, d_col)
+
+            for code, steps in ((2, KNIGHT_STEPS), (6, KING_STEPS)):
+                pieces = (squares == sign * code).astype(np.int8)
+                for d_row, d_col in steps:
+                    team_counts += _shift(pieces, d_row, d_col)
+
+            queens = squares == sign * 5
+            for code, steps in ((4, ROOK_STEPS), (3, BISHOP_STEPS)):
+                sliders = (squares == sign * code) | queens
+                for d_row, d_col in steps:
+                    rays = sliders
+                    for _ in range(7):
+                        rays = _shift(rays, d_row, d_col)
+                        team_counts += rays
+                        rays = rays & empty
+
+        return counts
+
+    def attacked_squares(self) -> np.ndarray:
+        """ Returns the number of squares each team attacks, as a (N, 2)
+        array. """
+
+        return (self.attack_counts() > 0).sum(axis=(2, 3))
+
+    def centre_control(self) -> np.ndarray:
+        """ Returns the number of attacks on the four centre squares by white
+        minus those by black. """
+        counts = self.attack_counts()[:, :, CENTRE[0], CENTRE[1]]
+
+        return counts[:, 0].sum(axis=(1, 2)) - counts[:, 1].sum(axis=(1, 2))
+
+    def evaluate(self) -> np.ndarray:
+        """ Returns a simple score in centipawns from white's point of view:
+        material plus piece-square tables. """
+
+        return 100 * self.material() + self.piece_square_score()
@@ -0,0 +1,256 @@
+""" This module contains benchmarks that aren't tied to a single module. Run
+it as a script to check them against their budgets.
+
+Usage:
+    python benchmarks.py import_time
+    python benchmarks.py search --time 5
+    python benchmarks.py parallel --depth 4 --workers 1,2,4,8
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+import engine
+from classes import Positions
+
+# The directory of the modules, which the fresh interpreters import from
+# wherever the benchmarks are run
+MODULE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Modules that make up the rules core. They have to be importable without
+# matplotlib (or numpy) and within the import-time budget.
+CORE_MODULES = ['classes', 'control', 'movegen', 'zobrist', 'runner']
+# Modules that may never be imported by the core
+HEAVY_MODULES = ['matplotlib', 'numpy']
+# Extra time a fresh interpreter may spend importing the core, in seconds
+IMPORT_TIME_BUDGET = 0.075
+
+# Seconds the search gets per position. wac_001 is only solved once the
+# search reaches depth 3, which takes about 15000 nodes, so a second (about
+# 15000 nodes at the speed of the search) left no margin: the result
+# flipped with small changes to the move ordering or a slower machine.
+SEARCH_TIME = 2.0
+
+# Positions used to measure the speed and the strength of the search at a
+# fixed time: (name, FEN, best move or None)
+SEARCH_POSITIONS = [
+    ('back_rank_mate', '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1', 'd1d8'),
+    ('knight_fork', 'q3k3/8/8/1N6/8/8/8/4K3 w - - 0 1', 'b5c7'),
+    # Positions from the Win at Chess test suite
+    (
+        'wac_001',
+        '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1',
+        'g3g6'
+    ),
+    (
+        'wac_003',
+        '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - 0 1',
+        'e3g3'
+    ),
+    (
+        'wac_004',
+        'r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PPR/2KR4 w - - 0 1',
+        'h6h7'
+    ),
+    (
+        'wac_005',
+        '5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - 0 1',
+        'c6c4'
+    ),
+    (
+        'middlegame',
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - '
+        '0 10',
+        None
+    ),
+]
+
+
+def _run_python(code: str) -> float:
+    """ Runs the code in a fresh interpreter and returns the wall time. """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', code], check=True, cwd=MODULE_DIRECTORY
+    )
+
+    return time.perf_counter() - start
+
+
+def measure_import_time(
+        modules: List[str] = CORE_MODULES,
+        runs: int = 10
+) -> Dict:
+    """ Measures how much longer a fresh interpreter takes when it imports the
+    modules, compared to one that imports nothing. Uses the median of several
+    runs. Also reports which heavy modules were pulled in by the import. """
+    baseline = statistics.median(_run_python('pass') for _ in range(runs))
+    code = f'import {", ".join(modules)}'
+    with_imports = statistics.median(
+        _run_python(code) for _ in range(runs)
+    )
+    loaded = subprocess.run(
+        [
+            sys.executable, '-c',
+            code + '; import sys; print(" ".join('
+            f'm for m in {HEAVY_MODULES!r} if m in sys.modules))'
+        ],
+        check=True, capture_output=True, text=True, cwd=MODULE_DIRECTORY
+    ).stdout.split()
+    import_time = max(with_imports - baseline, 0.0)
+
+    return {
+        'modules': modules,
+        'import_time': import_time,
+        'budget': IMPORT_TIME_BUDGET,
+        'heavy_modules_loaded': loaded,
+        'passed': import_time <= IMPORT_TIME_BUDGET and not loaded,
+    }
+
+
+def measure_search(
+        time_limit: float = SEARCH_TIME,
+        positions: List = SEARCH_POSITIONS
+) -> Dict:
+    """ Searches every position for a fixed time and reports the nodes per
+    second and the depth reached, and whether the best move was found where
+    there is one. """
+    records = []
+    nodes = 0
+    seconds = 0.0
+    for name, fen, best_move in positions:
+        result = engine.Search(time_limit=time_limit).run(Positions(fen))
+        nodes += result['nodes']
+        seconds += result['seconds']
+        records.append({
+            'position': name,
+            'move': result['uci'],
+            'expected': best_move,
+            'solved': best_move is None or result['uci'] == best_move,
+            'depth': result['depth'],
+            'nodes': result['nodes'],
+            'nps': result['nps'],
+        })
+
+    return {
+        'positions': records,
+        'nps': nodes / seconds if seconds > 0 else 0.0,
+        'solved': sum(record['solved'] for record in records),
+        'passed': all(record['solved'] for record in records),
+    }
+
+
+def measure_parallel_speedup(
+        depth: int = 4,
+        worker_counts: List[int] = None,
+        positions: List = SEARCH_POSITIONS
+) -> Dict:
+    """ Searches every position to a fixed depth with the serial search and
+    with ParallelSearch on each number of workers (1, 2, 4... up to the
+    number of CPUs by default). Returns the time, nodes and the speedup
+    over the serial search for every worker count. """
+    if worker_counts is None:
+        cpus = os.cpu_count() or 1
+        worker_counts = [2 ** i for i in range(cpus.bit_length())]
+        if worker_counts[-1] != cpus:
+            worker_counts.append(cpus)
+    boards = [Positions(fen) for _, fen, _ in positions]
+
+    start = time.perf_counter()
+    nodes = sum(
+        engine.Search(max_depth=depth).run(board)['nodes']
+        for board in boards
+    )
+    serial_seconds = time.perf_counter() - start
+    records = [{
+        'workers': 0,
+        'seconds': serial_seconds,
+        'nodes': nodes,
+        'speedup': 1.0,
+    }]
+    for workers in worker_counts:
+        with engine.ParallelSearch(workers, max_depth=depth) as search:
+            # Starts the workers before the clock does
+            search.run(boards[0].copy())
+            start = time.perf_counter()
+            nodes = sum(search.run(board)['nodes'] for board in boards)
+            seconds = time.perf_counter() - start
+        records.append({
+            'workers': workers,
+            'seconds': seconds,
+            'nodes': nodes,
+            'speedup': serial_seconds / seconds if seconds > 0 else 0.0,
+        })
+
+    return {'depth': depth, 'runs': records}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the benchmarks.')
+    parser.add_argument(
+        'benchmark', choices=['import_time', 'search', 'parallel']
+    )
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument(
+        '--time', type=float, default=SEARCH_TIME,
+        help='seconds to search each position for'
+    )
+    parser.add_argument(
+        '--depth', type=int, default=4,
+        help='depth to search each position to'
+    )
+    parser.add_argument(
+        '--workers',
+        help='comma separated worker counts (default 1, 2, 4... CPUs)'
+    )
+    args = parser.parse_args()
+
+    if args.benchmark == 'import_time':
+        result = measure_import_time(runs=args.runs)
+        print(
+            f"Core import time: {result['import_time'] * 1000:.1f} ms "
+            f"(budget {result['budget'] * 1000:.0f} ms)"
+        )
+        if result['heavy_modules_loaded']:
+            print(
+                'Heavy modules imported by the core: '
+                + ', '.join(result['heavy_modules_loaded'])
+            )
+        passed = result['passed']
+
+    elif args.benchmark == 'search':
+        result = measure_search(args.time)
+        for record in result['positions']:
+            status = 'ok'
+            if not record['solved']:
+                status = f"FAILED, expected {record['expected']}"
+            print(
+                f"{record['position']:<16} {record['move']:<6} depth "
+                f"{record['depth']:>2}  {record['nodes']:>8} nodes  "
+                f"{record['nps']:>7.0f} nps  {status}"
+            )
+        print(
+            f"Solved {result['solved']}/{len(result['positions'])}, "
+            f"{result['nps']:.0f} nodes per second"
+        )
+        passed = result['passed']
+
+    elif args.benchmark == 'parallel':
+        worker_counts = None
+        if args.workers:
+            worker_counts = [int(count) for count in args.workers.split(',')]
+        result = measure_parallel_speedup(args.depth, worker_counts)
+        for run in result['runs']:
+            label = f"{run['workers']} workers" if run['workers'] else 'serial'
+            print(
+                f"{label:<11} {run['seconds']:>7.2f} s  "
+                f"{run['nodes']:>9} nodes  speedup {run['speedup']:.2f}"
+            )
+        passed = True
+
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+""" This module contains the constants and helpers for the bitboard
+representation of the board. A bitboard is a 64-bit integer where bit n is set
+if square n is occupied. Squares are numbered row * 8 + col, so a1 is 0, h1 is
+7 and h8 is 63. """
+from typing import Iterator
+
+TEAMS = ('white', 'black')
+PIECE_TYPES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+
+WHITE = 0
+BLACK = 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# Index of an empty square in the mailbox list
+EMPTY = -1
+
+FULL = (1 << 64) - 1
+
+
+def square_index(row: int, col: int) -> int:
+    """ Returns the square number (0-63) for a row and a column. """
+
+    return row * 8 + col
+
+
+def piece_index(piece_type: str, team: str) -> int:
+    """ Returns the bitboard index (0-11) for a piece type and a team. White
+    pieces come first, black pieces are offset by 6. """
+
+    return TEAMS.index(team) * 6 + PIECE_TYPES.index(piece_type)
+
+
+def bit(square: int) -> int:
+    """ Returns a bitboard with only the given square set. """
+
+    return 1 << square
+
+
+def lsb(mask: int) -> int:
+    """ Returns the square number of the least significant set bit. """
+
+    return (mask & -mask).bit_length() - 1
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """ Yields the square number of every set bit, lowest first. """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def popcount(mask: int) -> int:
+    """ Returns the number of set bits. """
+
+    return mask.bit_count()
+
+
+"""
+*******************************************************************************
+                                 Move encoding
+*******************************************************************************
+"""
+# A move is encoded in 16 bits: the start square in bits 0-5, the end square
+# in bits 6-11 and the promotion piece type (KNIGHT to QUEEN, 0 for none) in
+# bits 12-14. Castling and en passant are recognised from the moved piece.
+
+SQUARE_NAMES = [col + row for row in '12345678' for col in 'abcdefgh']
+PROMOTION_LETTERS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+# Promotion piece type for the letter after a move string ('' for none)
+PROMOTION_TYPES = {'': 0, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN}
+
+# Castling rights as bit flags
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+
+
+def encode_move(start: int, end: int, promotion: int = 0) -> int:
+    """ Packs the start square, end square and promotion into a move code. """
+
+    return start | (end << 6) | (promotion << 12)
+
+
+def move_start(code: int) -> int:
+    """ Returns the start square of a move code. """
+
+    return code & 63
+
+
+def move_end(code: int) -> int:
+    """ Returns the end square of a move code. """
+
+    return (code >> 6) & 63
+
+
+def move_promotion(code: int) -> int:
+    """ Returns the promotion piece type of a move code (0 for none). """
+
+    return code >> 12
+
+
+def move_to_uci(code: int) -> str:
+    """ Returns the move code as a string such as "e2e4" or "e7e8q". """
+    uci = SQUARE_NAMES[code & 63] + SQUARE_NAMES[(code >> 6) & 63]
+    if code >> 12:
+        uci += PROMOTION_LETTERS[code >> 12]
+
+    return uci
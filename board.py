@@ -0,0 +1,242 @@
+""" This module draws the board as a matplotlib figure. It's loaded lazily
+through classes.Board, so that the rules can be used without matplotlib. """
+import time
+from collections import deque
+from typing import List, Dict
+import numpy as np
+import matplotlib.pyplot as plt
+from classes import PIECES, Piece
+
+
+"""
+*******************************************************************************
+                                     Board
+*******************************************************************************
+"""
+
+
+def _create_board_background() -> List[int]:
+    """ Creates an 8x8 matrix of 1's and 0's, which will colour the main
+    background of the board."""
+    # 0 is white
+    board = []
+    for value in range(1, 9):
+        if value % 2 == 0:
+            row = [0, 1] * 4
+        else:
+            row = [1, 0] * 4
+        board.append(row)
+
+    return board
+
+
+def _remove_ax_elements(
+        ax: plt.Axes,
+        ticks: bool,
+        spines: bool) -> plt.Axes:
+    """ Removes x and y tick marks as well as all spines. """
+    if ticks:
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.tick_params(
+            axis='both', which='both', bottom=False,
+            top=False, left=False, right=False
+        )
+
+    if spines:
+        ax.spines['right'].set_color('none')
+        ax.spines['left'].set_color('none')
+        ax.spines['top'].set_color('none')
+        ax.spines['bottom'].set_color('none')
+
+    return ax
+
+
+def _create_board(fig: plt.Figure = None) -> Dict:
+    """ Creates the main matplotlib figure for the board and its
+    coordinates. Returns the figure and the axes as a dictionary. A figure
+    can be passed in to draw the board on it instead of on a new interactive
+    window, see render.py. """
+    background = _create_board_background()
+
+    if fig is None:
+        plt.ion()
+        fig = plt.figure(figsize=(4.5, 4.5), dpi=150)
+    # Using gridspec to be able to control the layout of the two axes
+    # that hold coordinates.
+    grid_spec = plt.GridSpec(
+        nrows=2, ncols=2, figure=fig, width_ratios=[0.1, 0.9],
+        height_ratios=[0.1, 0.9], wspace=0.03, hspace=0.03
+    )
+    ax_cols = fig.add_subplot(grid_spec[0, 1])
+    ax_rows = fig.add_subplot(grid_spec[1, 0])
+    ax_board = fig.add_subplot(grid_spec[1, 1])
+
+    # Setting up main board
+    ax_board.matshow(background, cmap='Greys')
+    ax_board.set_xticks([])
+    ax_board.set_yticks([])
+
+    # Making sure the first and last squares are fully visible
+    ax_board.set_ylim(bottom=-0.5, top=7.5)
+
+    # Fixing columns
+    X = np.arange(1.5, 9.5)
+    Y = np.zeros(8)
+
+    ax_cols.set_xticks([])
+    ax_cols.set_yticks([])
+
+    i = 0
+    labels = 'abcdefgh'
+    for x, y in zip(X, Y):
+        ax_cols.text(
+            x, y, labels[i], ha='center', va='bottom', fontsize=8
+        )
+        i += 1
+    ax_cols.set_xlim(1, 9)
+    ax_cols.set_ylim(bottom=0, top=2)
+
+    # Fixing rows
+    Y = np.arange(1.5, 9)
+    X = np.zeros(8)
+
+    i = 0
+    labels = '123456789'
+    for x, y in zip(X, Y):
+        ax_rows.text(x, y, labels[i], ha='center', va='center', fontsize=8)
+        i += 1
+    ax_rows.set_xlim(-1, 1)
+    ax_rows.set_ylim(bottom=1.1, top=9.1)
+
+    ax_rows = _remove_ax_elements(ax_rows, True, True)
+    ax_cols = _remove_ax_elements(ax_cols, True, True)
+    ax_board = _remove_ax_elements(ax_board, True, False)
+    fig.suptitle('Chess')
+
+    return {
+            'fig': fig,
+            'board': ax_board,
+            'rows': ax_rows,
+            'cols': ax_cols
+            }
+
+
+class Board:
+    """ The main board class. The figure, background and coordinate labels are
+    created once. Every piece type and team is drawn by one scatter collection
+    whose offsets are updated in place, and the last move is a single line.
+    Properties:
+        self.board: the fig and ax objects of the board.
+        self.collections: the scatter collection for each piece type and team.
+        self.target_fps: the frame rate the redraw is expected to reach.
+    Methods:
+        self.update_board(): draws an updated board.
+        self.frame_stats(): returns the measured frame rate.
+    """
+    target_fps = 30
+    # Number of recent frames used to measure the frame rate
+    frame_window = 60
+
+    def __init__(self):
+        self.board = _create_board()
+        ax_board = self.board['board']
+        self.collections = {}
+        self.offsets = {}
+        for piece in PIECES:
+            key = (piece.type, piece.team)
+            self.collections[key] = ax_board.scatter(
+                [], [], marker=piece.marker, color=piece.color,
+                s=piece.size, label=piece.type, animated=True
+            )
+            self.offsets[key] = []
+        self.last_move_line, = ax_board.plot([], [], c='blue', animated=True)
+        self.last_move = []
+        self.frame_times = deque(maxlen=Board.frame_window)
+
+        canvas = self.board['fig'].canvas
+        self.blit = canvas.supports_blit
+        self.background = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+        canvas.draw()
+
+    def _artists(self) -> List[plt.Artist]:
+        """ Returns all artists that change between moves. """
+
+        return list(self.collections.values()) + [self.last_move_line]
+
+    def _on_draw(self, event):
+        """ Stores the static part of the figure after every full draw (the
+        first one, resizes etc.), so that moves can be blitted on top of it.
+        """
+        fig = self.board['fig']
+        if self.blit:
+            self.background = fig.canvas.copy_from_bbox(fig.bbox)
+        for artist in self._artists():
+            fig.draw_artist(artist)
+
+    def update_board(
+            self,
+            positions: List[List[Piece]],
+            last_move: List[List[int]] = []
+            ):
+        """ Updates the ax_board with the provided positions. Only the
+        collections of piece types whose squares changed (normally the moved
+        and the captured piece) get new offsets.
+        Input: positions is the nested list of pieces from
+        Positions.get_positions().
+        last_move is a 2d list with y, x coordinates for the start and end
+        positions. """
+        frame_start = time.perf_counter()
+        offsets = {key: [] for key in self.offsets}
+        for y, row in enumerate(positions):
+            for x, piece in enumerate(row):
+                if piece != '':
+                    offsets[(piece.type, piece.team)].append((x, y))
+        for key, piece_offsets in offsets.items():
+            if piece_offsets != self.offsets[key]:
+                self.collections[key].set_offsets(
+                    np.array(piece_offsets, dtype=float).reshape(-1, 2)
+                )
+                self.offsets[key] = piece_offsets
+
+        if last_move != self.last_move:
+            Y = [position[0] for position in last_move]
+            X = [position[1] for position in last_move]
+            self.last_move_line.set_data(X, Y)
+            self.last_move = last_move
+
+        self._render()
+        self.frame_times.append(time.perf_counter() - frame_start)
+
+    def _render(self):
+        """ Blits the changing artists on top of the stored background if the
+        backend supports it, otherwise lets the canvas redraw itself. """
+        fig = self.board['fig']
+        canvas = fig.canvas
+        if self.blit and self.background is not None:
+            canvas.restore_region(self.background)
+            for artist in self._artists():
+                fig.draw_artist(artist)
+            canvas.blit(fig.bbox)
+        else:
+            canvas.draw_idle()
+        canvas.flush_events()
+
+    def frame_stats(self) -> Dict[str, float]:
+        """ Returns the frame rate measured over the most recent updates
+        together with the target frame rate. """
+        frames = len(self.frame_times)
+        elapsed = sum(self.frame_times)
+        fps = frames / elapsed if elapsed > 0 else float('inf')
+
+        return {
+            'frames': frames,
+            'fps': fps,
+            'target_fps': Board.target_fps,
+            'meets_target': fps >= Board.target_fps,
+        }
+
+    def show_board(self):
+        """ Shows the figure. """
+        plt.show()
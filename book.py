@@ -0,0 +1,232 @@
+""" This module builds and reads opening books. A book is a binary file of
+fixed-size records (position key, move code, weight), sorted by the Zobrist
+key of the position. It is read through mmap and searched with a binary
+search, so the book is never loaded into memory and every process that
+opens it shares the same pages of the file cache.
+
+Usage:
+    python book.py build games.txt book.bin --plies 16
+    python book.py probe book.bin --fen "<fen>"
+
+A games file holds one game per line, as moves such as "e2e4 e7e5 g1f3".
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+from collections import Counter
+from typing import Iterable, List, Tuple
+from bitboards import move_to_uci
+from classes import Move, Positions
+
+MAGIC = b'CHBK'
+VERSION = 1
+# Magic, version and number of records
+HEADER = struct.Struct('<4sII')
+# Position key, move code and weight
+RECORD = struct.Struct('<QHH')
+MAX_WEIGHT = 0xFFFF
+DEFAULT_PLIES = 16
+
+
+def read_games(path: str) -> Iterable[List[str]]:
+    """ Yields the moves of every game in a games file, one game per line.
+    """
+    with open(path) as games:
+        for line in games:
+            moves = line.split()
+            if moves:
+                yield moves
+
+
+def build_book(
+        games: Iterable[Iterable[str]],
+        path: str,
+        plies: int = DEFAULT_PLIES,
+        min_count: int = 1
+) -> int:
+    """ Plays the first plies moves of every game from the starting
+    positions and counts how often each move was played in each position.
+    Moves played fewer than min_count times are left out. The counts become
+    the weights (capped at MAX_WEIGHT). Writes the book to path and returns
+    the number of records. A game stops counting at its first illegal or
+    malformed move. """
+    counts = Counter()
+    for moves in games:
+        positions = Positions()
+        for uci in list(moves)[:plies]:
+            try:
+                code = Move.from_uci(uci.lower().strip()).code
+            except ValueError:
+                break
+            if code not in positions.legal_moves():
+                break
+            counts[(positions.key, code)] += 1
+            positions.make_move(code)
+
+    records = sorted(
+        (key, code, min(count, MAX_WEIGHT))
+        for (key, code), count in counts.items() if count >= min_count
+    )
+    with open(path, 'wb') as book:
+        book.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for record in records:
+            book.write(RECORD.pack(*record))
+
+    return len(records)
+
+
+class OpeningBook:
+    """ Read-only view of a book file.
+    Properties:
+        self.path: the book file.
+        self.records: the number of records in the book.
+    Methods:
+        self.lookup(): returns the moves and weights for the positions.
+        self.choose_move(): picks one of the moves by weight.
+        self.close(): closes the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        """ Maps the file and checks its header. The file is closed again if
+        it isn't a book. """
+        self._file = open(self.path, 'rb')
+        self._map = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f'{self.path} is not an opening book')
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+            magic, version, self.records = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{self.path} is not an opening book')
+            if size != HEADER.size + self.records * RECORD.size:
+                raise ValueError(f'{self.path} is truncated')
+        except (OSError, ValueError):
+            self.close()
+            raise
+
+    def close(self):
+        """ Closes the file. """
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'OpeningBook':
+
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+
+        return self.records
+
+    def __getstate__(self):
+        """ Only the path is pickled. A process that gets the book, for
+        example a pool worker, maps the file again. """
+
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
+
+    def _key_at(self, index: int) -> int:
+
+        return RECORD.unpack_from(
+            self._map, HEADER.size + index * RECORD.size
+        )[0]
+
+    def lookup(self, positions: Positions) -> List[Tuple[int, int]]:
+        """ Returns the (move code, weight) pairs stored for the positions,
+        most played first. The moves aren't checked against the positions,
+        see choose_move. """
+        key = positions.key
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        offset = HEADER.size + low * RECORD.size
+        for _ in range(low, self.records):
+            record_key, code, weight = RECORD.unpack_from(self._map, offset)
+            if record_key != key:
+                break
+            moves.append((code, weight))
+            offset += RECORD.size
+
+        return sorted(moves, key=lambda move: move[1], reverse=True)
+
+    def choose_move(
+            self,
+            positions: Positions,
+            chooser: random.Random = random
+    ) -> int:
+        """ Returns one of the book moves for the positions, picked at random
+        with the weights as odds, or None if the positions aren't in the
+        book. Moves that aren't legal in the positions (after a collision of
+        two keys) are left out. """
+        moves = self.lookup(positions)
+        if moves:
+            legal_moves = positions.legal_moves()
+            moves = [move for move in moves if move[0] in legal_moves]
+        if not moves:
+
+            return None
+
+        return chooser.choices(
+            [code for code, _ in moves],
+            weights=[weight for _, weight in moves]
+        )[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from games')
+    build.add_argument('games', help='games file, one game per line')
+    build.add_argument('book', help='book file to write')
+    build.add_argument(
+        '--plies', type=int, default=DEFAULT_PLIES,
+        help='moves of every game to put in the book'
+    )
+    build.add_argument(
+        '--min-count', type=int, default=1,
+        help='times a move has to be played to be kept'
+    )
+    probe = commands.add_parser('probe', help='show the book moves')
+    probe.add_argument('book', help='book file to read')
+    probe.add_argument('--fen', help='position to look up')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        records = build_book(
+            read_games(args.games), args.book, args.plies, args.min_count
+        )
+        print(f'Wrote {records} moves to {args.book}')
+    else:
+        positions = Positions(args.fen) if args.fen else Positions()
+        with OpeningBook(args.book) as book:
+            moves = book.lookup(positions)
+        total = sum(weight for _, weight in moves)
+        for code, weight in moves:
+            print(f'{move_to_uci(code)}: {weight} ({weight / total:.1%})')
+        if not moves:
+            print('The position is not in the book')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,111 +1,160 @@
-""" This is the main game. """
+""" This is the main game.
+
+Usage:
+    python chess.py
+    python chess.py --metrics turns.json --profile game.prof
+
+With --metrics, the time spent in every stage of a turn and the counters of
+moves, captures, rejected inputs and redraws are written to a JSON file when
+the game ends (see instrumentation.py). With --profile, the whole game runs
+under cProfile.
+"""
+import argparse
 import classes
+import contextlib
 import control
+import engine
 import interactions
+from bitboards import EMPTY
+from movegen import is_legal_move
+from instrumentation import Instrumentation, profile
 
-BOARD = classes.Board()
-POSITIONS = classes.Positions()
-BOARD.update_board(POSITIONS.get_positions())
-BOARD.show_board()
+# Players with this name are played by the computer
+COMPUTER_NAME = 'computer'
 
-print(
+WELCOME_MESSAGE = (
     '--------------------------------------------------------------------\n' +
     '|              Welcome to "Check yourself, mate!"                  |\n' +
     '--------------------------------------------------------------------\n' +
     '\nTo play you simply take turns entering your moves according to\n' +
     'the format <start position><end position>, for example  "E2E4"\n' +
-    'would move the piece from E2 to the square E4.\n\n'
+    'would move the piece from E2 to the square E4.\n' +
+    'To castle, move the king two squares, for example "E1G1". To promote\n' +
+    'a pawn, add the letter of the new piece (N, B, R or Q): "E7E8Q".\n' +
+    f'Name a player "{COMPUTER_NAME}" to play against the computer.\n\n'
 )
-NAMES = interactions.request_player_name()
-
-PLAYERS = []
-# Set player names
-for name in NAMES:
-    PLAYERS.append(classes.Player(name))
-
-# Assign teams. Happens just before starting each the game loop.
-SECOND_TEAM = PLAYERS[0].assign_first_team()
-PLAYERS[1].assign_second_team(SECOND_TEAM)
-QUEUE = classes.player_queue(PLAYERS)
-
-# Start play loop
-GAME_STATUS = True
-LAST_MOVE = ['', '']
-EN_PASSANT_POSITION = ['', '']
-while GAME_STATUS:
-    CURRENT_PLAYER = next(QUEUE)
-    USER_INPUT = interactions.request_move(CURRENT_PLAYER)
-    while not control.check_only_valid_characters(USER_INPUT):
-        print(
-            'That\'s not a valid move. It needs to follow the pattern ' +
-            '"E2E4". Please try again'
-        )
-        USER_INPUT = interactions.request_move(CURRENT_PLAYER)
-    # Check whether there is a check that needs to be broken
-    # Check that there are no obstacles (except for knights) Check that the
-    # destination is not occupied by the same team Check that move pattern
-    # conforms to the piece's move set
-    MOVE = classes.Move(USER_INPUT)
-    # x is the column and y is the row in the coordinate system
-    MOVE_DETAILS = POSITIONS.check_positions(MOVE)
-    # TODO check if moved piece == "pawn" and the end position is the
-    # en-passant position. Then execute special logic: remove previously moved
-    # pawn and place new pawn on the desired square.
-    verification = False
-    while not verification:
-        BASIC_CHECK = control.check_team_and_capture(
-                CURRENT_PLAYER.team,
-                MOVE_DETAILS['piece_start'].team,
-                MOVE_DETAILS['piece_end'],
-                )
-        # TODO implement an en_passant function
-        EN_PASSANT = control.check_en_passant(
-                MOVE_DETAILS['piece_start'].type,
-                MOVE.end.get_coordinates(),
-                EN_PASSANT_POSITION
-                )
-        NORMAL_MOVE = MOVE_DETAILS['piece_start'].verify_move(
-                move=MOVE,
-                captured_piece=MOVE_DETAILS['piece_end']
-                )
 
-        if BASIC_CHECK and (EN_PASSANT or NORMAL_MOVE):
-            verification = True
+
+def request_legal_move(
+        positions: classes.Positions,
+        player: classes.Player,
+        metrics: Instrumentation
+) -> classes.Move:
+    """ Asks the player for a move until a legal one is entered. Moves that
+    would leave the player's own king in check are refused like any other
+    illegal move, with the reason from control.explain_illegal_move. """
+    while True:
+        user_input = interactions.request_move(player)
+        with metrics.stage('parsing'):
+            valid_input = control.check_only_valid_characters(user_input)
+        if not valid_input:
+            metrics.count('rejected_inputs')
+            print(
+                'That\'s not a valid move. It needs to follow the pattern ' +
+                '"E2E4" (or "E7E8Q" for a promotion). Please try again'
+            )
+            continue
+        with metrics.stage('parsing'):
+            move = classes.Move(user_input)
+        with metrics.stage('validation'):
+            legal = is_legal_move(positions, move.code)
+        if legal:
+
+            return move
+        metrics.count('rejected_inputs')
+        reason = control.explain_illegal_move(positions, move.code)
+        print(f'Sorry, {reason}. Please try again.')
+
+
+def run_game(metrics: Instrumentation, resources: contextlib.ExitStack):
+    """ Sets up the board and the players and runs the game loop. The stages
+    of every turn are timed with metrics. Engine players are entered into
+    resources, so that their worker processes are shut down when the caller
+    closes it. """
+    board = classes.Board()
+    positions = classes.Positions()
+    board.update_board(positions.get_positions())
+    board.show_board()
+
+    print(WELCOME_MESSAGE)
+    names = interactions.request_player_name()
+
+    players = []
+    # Set player names
+    for name in names:
+        if name.lower().strip() == COMPUTER_NAME:
+            players.append(
+                resources.enter_context(engine.EnginePlayer(name))
+            )
+        else:
+            players.append(classes.Player(name))
+
+    # Assign teams. Happens just before starting each the game loop.
+    second_team = players[0].assign_first_team()
+    players[1].assign_second_team(second_team)
+    queue = classes.player_queue(players)
+
+    # Start play loop
+    game_status = True
+    while game_status:
+        current_player = next(queue)
+        game_end = control.check_game_end(positions)
+        if game_end == 'checkmate':
+            winner = players[0] if players[1] is current_player else players[1]
+            print(f'Check mate! {winner} wins.')
+        elif game_end == 'stalemate':
+            print(f'Stalemate, {current_player} has no legal move. Draw.')
+        elif game_end == 'insufficient_material':
+            print('Neither team can check mate any more. Draw.')
+        elif game_end == 'threefold_repetition':
+            print('The same position came up three times. Draw.')
+        elif game_end == 'fifty_moves':
+            print('Fifty moves without a capture or a pawn move. Draw.')
+        if game_end:
+            game_status = False
+            continue
+        if hasattr(current_player, 'choose_move'):
+            # The search only returns legal moves
+            with metrics.stage('search'):
+                move = classes.Move.from_code(
+                    current_player.choose_move(positions)
+                )
+            print(f'{current_player} plays {move}.')
         else:
-            print('Sorry, this piece can\'t be moved like that.'
-                  ' Please try again.')
-            USER_INPUT = interactions.request_move(CURRENT_PLAYER)
-            MOVE = classes.Move(USER_INPUT)
-            MOVE_DETAILS = POSITIONS.check_positions(MOVE.get_coordinates())
-    # TODO implement update_en_passant_position()
-    if EN_PASSANT:
-        CAPTURED_PIECE = POSITIONS.en_passant_capture(LAST_MOVE)
-    else:
-        CAPTURED_PIECE = MOVE_DETAILS['piece_end']
-    EN_PASSANT_POSITION = control.update_en_passant_position(
-            MOVE_DETAILS['piece_start'].type,
-            MOVE
+            move = request_legal_move(positions, current_player, metrics)
+        with metrics.stage('update'):
+            captured = positions.make_move(move.code)
+        with metrics.stage('rendering'):
+            board.update_board(
+                positions.get_positions(), move.get_coordinates()
             )
-    LAST_MOVE = POSITIONS.update_positions(MOVE)
-    BOARD.update_board(POSITIONS.get_positions(), MOVE.get_coordinates())
-    if CAPTURED_PIECE != '':
-        print(f'{CURRENT_PLAYER} captured: {CAPTURED_PIECE}.')
-    print('')
-    """ If last moved piece was pawn and move length was 2, save the position
-    for the en-passant take """
-    # TODO check if the MOVE_DETAILS['piece_end'] is not null. Then print a
-    # text with CURRENT_PLAYER and the captured piece.
-    """
-    General game loop
-    - Set up player names (wait with this part for a bit)
-    - Set up board (happens in the Board class)
-    - Choose white and black (wait with this for a bit)
-    - Ask for move (happens in interactions.py)
-    - Validate move (wait with this for a bit)
-    - Execute move (just feed some new values into the positions and then feed
-    the
-      positions to the Board class's update_board() function)
-    - Check for check and check mate (wait with this)
-        - No check mate, go to step "Ask for move"
-        - Yes check mate, display score + end game message and ask for rematch
-    """
+        metrics.count('redraws')
+        metrics.count('moves')
+        if captured != EMPTY:
+            metrics.count('captures')
+            print(f'{current_player} captured: {classes.PIECES[captured]}.')
+        print('')
+        metrics.end_turn()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check yourself, mate!')
+    parser.add_argument(
+        '--metrics', help='JSON file to write the turn timings to'
+    )
+    parser.add_argument(
+        '--profile', help='file to write cProfile statistics to'
+    )
+    args = parser.parse_args()
+
+    metrics = Instrumentation()
+    try:
+        with profile(args.profile), contextlib.ExitStack() as resources:
+            run_game(metrics, resources)
+    finally:
+        if args.metrics:
+            metrics.export(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,22 @@
-""" This module defines all classes in the game. """
+""" This module defines all classes in the game. The rules don't depend on
+matplotlib; the Board is defined in board.py and only loaded when it's first
+used, through classes.Board. """
+import random
 from typing import List, Dict, Generator
-import numpy as np
-import matplotlib.pyplot as plt
+from bitboards import (
+    TEAMS, PIECE_TYPES, EMPTY, WHITE, BLACK, PAWN, BISHOP, ROOK, QUEEN, KING,
+    ALL_CASTLING, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE,
+    BLACK_QUEENSIDE, PROMOTION_LETTERS, PROMOTION_TYPES, SQUARE_NAMES,
+    square_index, piece_index, move_to_uci, iter_bits
+)
+from movegen import (
+    BETWEEN, attackers_to, generate_legal_moves, piece_attacks, pin_rays
+)
+from evaluation import ENDGAME_SCORES, MIDGAME_SCORES, PHASE_WEIGHTS
+from zobrist import (
+    PIECE_KEYS, BLACK_TO_MOVE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS,
+    en_passant_key, compute_key
+)
 
 
 """
@@ -13,43 +28,147 @@ import matplotlib.pyplot as plt
 
 class Square:
     """ A single position on the board. It translates user input such as "A1"
-    to col = 0 and row = 0. Has two properties: col and row.  """
+    to col = 0 and row = 0. Has three properties: col, row and index (0-63,
+    see bitboards.square_index). The 64 squares are created once and shared,
+    so Square("e2") returns the same instance every time, and they can't be
+    changed. """
+    __slots__ = ('row', 'col', 'index', 'name')
     col_map = {letter: i for i, letter in enumerate('abcdefgh')}
     row_map = {num: int(num) - 1 for num in '12345678'}
-    # TODO should this take in the user string? If so, move the col_map and
-    row_map
-    # from the Move class.
+    # Filled in below with every square, by index and by name
+    squares = []
+    lookup = {}
     # TODO should it also (can it?) contain information about the piece
     # occupying the spot?
 
-    def __init__(self, user_input: str = None):
+    def __new__(cls, user_input: str = None):
         # We need to create empty moves for the en passant and the last move,
         # for its first initiation
         if user_input is None:
-            self.row = ''
-            self.col = ''
+
+            return EMPTY_SQUARE
+        square = Square.lookup.get(user_input[:2])
+        if square is None:
+            raise ValueError(f'{user_input!r} is not a square')
+
+        return square
+
+    @classmethod
+    def _create(cls, row, col) -> 'Square':
+        """ Creates a square. Only used to build the shared instances, which
+        can't be changed afterwards. """
+        square = object.__new__(cls)
+        if row == '':
+            index, name = None, ''
         else:
-            self.row = Square.row_map[user_input[1]]
-            self.col = Square.col_map[user_input[0]]
+            index = square_index(row, col)
+            name = SQUARE_NAMES[index]
+        for attribute, value in zip(Square.__slots__, (row, col, index, name)):
+            object.__setattr__(square, attribute, value)
+
+        return square
+
+    def __setattr__(self, name, value):
+        """ Squares are shared, so changing one would change it everywhere.
+        """
+        raise AttributeError('Squares are immutable')
+
+    def __reduce__(self):
+        """ Pickled and copied squares are the shared instances. """
+
+        return Square, (self.name or None,)
 
     def get_coordinates(self):
         """ Returns the row (y) and then the column (x) for the square. """
         return [self.row, self.col]
 
+    def __repr__(self):
+
+        return self.name
+
+
+EMPTY_SQUARE = Square._create('', '')
+Square.squares = [Square._create(*divmod(i, 8)) for i in range(64)]
+Square.lookup = {square.name: square for square in Square.squares}
+
 
 class Move:
     """ Carries information from the user input to the board.
     A move is always in <letter><number><letter><number> format, indicating the
-    position to move from and the position to move to. """
+    position to move from and the position to move to. A fifth letter (n, b, r
+    or q) can be added to choose the piece a pawn is promoted to.
+
+    Moves are shared, immutable instances: every move is created the first
+    time it's used, and Move("e2e4") or Move.from_uci("e2e4") returns the
+    same instance every time. The move code (see bitboards.encode_move) is
+    available as move.code. """
+    __slots__ = (
+        'start', 'end', 'squares', 'delta_rows', 'delta_cols', 'promotion',
+        'code', 'uci',
+    )
+    # The moves created so far: those without promotion by code, and all of
+    # them by string
+    moves = [None] * 4096
+    lookup = {}
 
-    def __init__(self, user_input: str):
+    def __new__(cls, user_input: str):
         """ Used to have "start_x" and "start_y" etc. Was replaced by the
         square class to simplify. """
-        self.start = Square(user_input[:2])
-        self.end = Square(user_input[2:])
-        self.squares = [self.start, self.end]
-        self.delta_rows = (1 + self.end.row) - (1 + self.start.row)
-        self.delta_cols = (1 + self.end.col) - (1 + self.start.col)
+
+        return cls.from_uci(user_input)
+
+    @classmethod
+    def from_uci(cls, user_input: str) -> 'Move':
+        """ Returns the shared move for a string such as "e2e4" or "e7e8q".
+        Raises ValueError if the string isn't a move. """
+        move = Move.lookup.get(user_input)
+        if move is None:
+            start = Square.lookup.get(user_input[:2])
+            end = Square.lookup.get(user_input[2:4])
+            promotion = PROMOTION_TYPES.get(user_input[4:])
+            if start is None or end is None or promotion is None:
+                raise ValueError(f'{user_input!r} is not a move')
+            move = cls._create(start, end, promotion)
+            Move.lookup[user_input] = move
+            if not promotion:
+                Move.moves[move.code] = move
+
+        return move
+
+    @classmethod
+    def from_code(cls, code: int) -> 'Move':
+        """ Returns the shared move for a move code. """
+        move = Move.moves[code] if code < 4096 else None
+        if move is None:
+
+            return cls.from_uci(move_to_uci(code))
+
+        return move
+
+    @classmethod
+    def _create(cls, start: Square, end: Square, promotion: int) -> 'Move':
+        """ Creates a move. Only used to build the shared instances, which
+        can't be changed afterwards. """
+        move = object.__new__(cls)
+        values = (
+            start, end, (start, end), end.row - start.row,
+            end.col - start.col, promotion,
+            start.index | (end.index << 6) | (promotion << 12),
+            start.name + end.name + PROMOTION_LETTERS.get(promotion, ''),
+        )
+        for attribute, value in zip(Move.__slots__, values):
+            object.__setattr__(move, attribute, value)
+
+        return move
+
+    def __setattr__(self, name, value):
+        """ Moves are shared, so changing one would change it everywhere. """
+        raise AttributeError('Moves are immutable')
+
+    def __reduce__(self):
+        """ Pickled and copied moves are the shared instances. """
+
+        return Move.from_code, (self.code,)
 
     def get_coordinates(self):
         """ Returns y and x coordinates of start and end position as two lists.
@@ -57,6 +176,10 @@ class Move:
 
         return [square.get_coordinates() for square in self.squares]
 
+    def __repr__(self):
+
+        return self.uci
+
 
 """
 *******************************************************************************
@@ -165,42 +288,135 @@ class Rook(Piece):
     def __init__(self, team):
         super(Rook, self).__init__('rook', team)
 
+    def verify_move(
+        self,
+        move: Move,
+        captured_piece: Piece,
+    ) -> bool:
+        # Straight along a row or a column
+        return (move.delta_rows == 0) != (move.delta_cols == 0)
+
 
 class Bishop(Piece):
 
     def __init__(self, team):
         super(Bishop, self).__init__('bishop', team)
 
+    def verify_move(
+        self,
+        move: Move,
+        captured_piece: Piece,
+    ) -> bool:
+        # Diagonally, the same distance along both axes
+        return move.delta_rows != 0 and (
+            abs(move.delta_rows) == abs(move.delta_cols)
+        )
+
 
 class Knight(Piece):
 
     def __init__(self, team):
         super(Knight, self).__init__('knight', team)
 
+    def verify_move(
+        self,
+        move: Move,
+        captured_piece: Piece,
+    ) -> bool:
+        # One square along one axis and two along the other
+        return {abs(move.delta_rows), abs(move.delta_cols)} == {1, 2}
+
 
 class Queen(Piece):
 
     def __init__(self, team):
         super(Queen, self).__init__('queen', team)
 
+    def verify_move(
+        self,
+        move: Move,
+        captured_piece: Piece,
+    ) -> bool:
+        # Like a rook or a bishop
+        delta_rows = abs(move.delta_rows)
+        delta_cols = abs(move.delta_cols)
+
+        return (delta_rows == 0) != (delta_cols == 0) or (
+            delta_rows != 0 and delta_rows == delta_cols
+        )
+
 
 class King(Piece):
 
     def __init__(self, team):
         super(King, self).__init__('king', team)
 
+    def verify_move(
+        self,
+        move: Move,
+        captured_piece: Piece,
+    ) -> bool:
+        # A single step in any direction
+        return max(abs(move.delta_rows), abs(move.delta_cols)) == 1
+
+
+# Pieces carry no state of their own, so a single instance per piece type and
+# team is shared by all boards. The list is ordered by bitboard index.
+PIECE_CLASSES = {
+    'pawn': Pawn,
+    'knight': Knight,
+    'bishop': Bishop,
+    'rook': Rook,
+    'queen': Queen,
+    'king': King,
+}
+PIECES = [
+    PIECE_CLASSES[piece_type](team)
+    for team in TEAMS
+    for piece_type in PIECE_TYPES
+]
+
 
 """
 *******************************************************************************
                                    Positions
 *******************************************************************************
 """
+# Castling rights that remain after a piece moves from or to the square. A
+# king or rook moving away, or a rook being captured, removes the right.
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[7] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASKS[63] &= ~BLACK_KINGSIDE
+CASTLING_MASKS[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+FEN_LETTERS = 'pnbrqk'
+FEN_PIECE_TYPES = dict(zip(FEN_LETTERS, PIECE_TYPES))
+FEN_CASTLING = {
+    'K': WHITE_KINGSIDE,
+    'Q': WHITE_QUEENSIDE,
+    'k': BLACK_KINGSIDE,
+    'q': BLACK_QUEENSIDE,
+}
+# Plies without a pawn move or a capture after which the game is drawn
+FIFTY_MOVE_PLIES = 100
 
 
 class Positions:
     """ Class containing information about the current positions on the playing
-    board. The positions can be accessed both as a list of pieces and as a
-    coordinate system of ones and zeros. """
+    board. The board is stored as twelve bitboards (one per piece type and
+    team) together with aggregated masks per team and for all pieces, which
+    are all updated incrementally on every move. The positions can still be
+    accessed both as a list of pieces and as a coordinate system of ones and
+    zeros. The position is identified by a 64-bit Zobrist key (self.key),
+    which is also updated incrementally, as are the attack sets of all pieces
+    (self.attacks) that check detection and the legal move filter use, and
+    the material and piece-square scores of the evaluation (see
+    evaluation.py). The keys of the positions since the last pawn move or
+    capture are kept for finding repetitions, together with the halfmove
+    clock of the fifty-move rule. """
     starting_positions = [
         [
             Rook('white'),
@@ -247,19 +463,317 @@ class Positions:
             Rook('black'),
         ],
     ]
-
-    def __init__(self):
-        self.positions = Positions.starting_positions
-        self.coordinates = [
-            [1 if x != '' else 0 for x in row]
-            for row in Positions.starting_positions
-        ]
+    # Copy of the starting state, made by the first instance
+    _start = None
+
+    def __init__(self, fen: str = None):
+        """ Sets up the starting positions, or the position described by a
+        FEN string if one is given. """
+        # One bitboard per piece type and team, indexed as in
+        # bitboards.piece_index, plus the aggregated masks per team and for
+        # the whole board. The mailbox list holds the piece index of every
+        # square (or EMPTY) so that a single square can be looked up directly.
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [EMPTY] * 64
+        # State that isn't visible from the pieces alone: the side to move
+        # (0 for white, 1 for black), the castling rights as bit flags and the
+        # square a pawn can move to when capturing en passant.
+        self.turn = WHITE
+        self.castling_rights = ALL_CASTLING
+        self.en_passant_square = None
+        # The Zobrist key identifying the position. Moves update it by XOR.
+        self.key = 0
+        # The plies played since the last pawn move or capture, and the keys
+        # of the positions reached since then (oldest first, without the
+        # current one). Pawn moves and captures can't be undone, so only
+        # these positions can come back.
+        self.halfmove_clock = 0
+        self.recent_keys = []
+        # Material plus piece-square scores from white's point of view, for
+        # the middlegame and the endgame, and the game phase. Every piece
+        # adds its share when it's put on a square and takes it back when
+        # it's removed.
+        self.midgame = 0
+        self.endgame = 0
+        self.phase = 0
+        # The squares attacked by the piece on every square (0 for empty
+        # squares). Moves only recompute the entries they can have changed.
+        self.attacks = [0] * 64
+        # One undo record per move played with make_move, see unmake_move
+        self.history = []
+        # The nested list views, the attack maps per team and the checkers
+        # and pins are derived lazily and cached until the next move
+        self._invalidate_views()
+
+        if fen is not None:
+            self._load_fen(fen)
+            self.key = compute_key(self)
+            self._update_attacks(self.occupied)
+        elif Positions._start is not None:
+            self._copy_state(Positions._start)
+        else:
+            for row, pieces in enumerate(Positions.starting_positions):
+                for col, piece in enumerate(pieces):
+                    if piece != '':
+                        self._put_piece(
+                            piece_index(piece.type, piece.team),
+                            square_index(row, col)
+                        )
+            self.key = compute_key(self)
+            self._update_attacks(self.occupied)
+            # Later boards copy the starting state instead of rebuilding it
+            Positions._start = self.copy()
+
+    def _load_fen(self, fen: str):
+        """ Places the pieces and sets the side to move, castling rights and
+        en passant square from a FEN string, and the halfmove clock if it's
+        given. The fullmove number is ignored. """
+        fields = fen.split()
+        for i, fen_row in enumerate(fields[0].split('/')):
+            row = 7 - i
+            col = 0
+            for letter in fen_row:
+                if letter.isdigit():
+                    col += int(letter)
+                else:
+                    team = 'white' if letter.isupper() else 'black'
+                    piece_type = FEN_PIECE_TYPES[letter.lower()]
+                    self._put_piece(
+                        piece_index(piece_type, team), square_index(row, col)
+                    )
+                    col += 1
+        self.turn = WHITE if fields[1] == 'w' else BLACK
+        self.castling_rights = 0
+        for letter, flag in FEN_CASTLING.items():
+            if letter in fields[2]:
+                self.castling_rights |= flag
+        if fields[3] != '-':
+            self.en_passant_square = SQUARE_NAMES.index(fields[3])
+        if len(fields) > 4:
+            self.halfmove_clock = int(fields[4])
+
+    def to_fen(self) -> str:
+        """ Returns the position as a FEN string. The fullmove number isn't
+        kept track of and is always written as 1. """
+        fen_rows = []
+        for row in range(7, -1, -1):
+            fen_row = ''
+            empty = 0
+            for index in self.mailbox[row * 8:row * 8 + 8]:
+                if index == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[index % 6]
+                fen_row += letter.upper() if index < 6 else letter
+            if empty:
+                fen_row += str(empty)
+            fen_rows.append(fen_row)
+        castling = ''.join(
+            letter for letter, flag in FEN_CASTLING.items()
+            if self.castling_rights & flag
+        )
+        en_passant = '-'
+        if self.en_passant_square is not None:
+            en_passant = SQUARE_NAMES[self.en_passant_square]
+
+        return ' '.join([
+            '/'.join(fen_rows), 'wb'[self.turn], castling or '-', en_passant,
+            str(self.halfmove_clock), '1',
+        ])
+
+    def _copy_state(self, other: 'Positions'):
+        """ Copies the board state of another instance. The undo history
+        isn't copied. """
+        self.bitboards = other.bitboards[:]
+        self.occupancy = other.occupancy[:]
+        self.occupied = other.occupied
+        self.mailbox = other.mailbox[:]
+        self.turn = other.turn
+        self.castling_rights = other.castling_rights
+        self.en_passant_square = other.en_passant_square
+        self.key = other.key
+        self.halfmove_clock = other.halfmove_clock
+        self.recent_keys = other.recent_keys[:]
+        self.attacks = other.attacks[:]
+        self.midgame = other.midgame
+        self.endgame = other.endgame
+        self.phase = other.phase
+
+    def copy(self) -> 'Positions':
+        """ Returns an independent copy of the positions. Only a few short
+        lists of integers are copied. Searching from a single instance with
+        make_move and unmake_move avoids even that. """
+        positions = Positions.__new__(Positions)
+        positions._copy_state(self)
+        positions.history = []
+        positions._invalidate_views()
+
+        return positions
+
+    @property
+    def side_to_move(self) -> str:
+        """ The team whose turn it is. """
+
+        return TEAMS[self.turn]
+
+    def repetitions(self) -> int:
+        """ Returns how often the current position was reached before. Only
+        the positions since the last pawn move or capture with the same side
+        to move are compared. """
+
+        return self.recent_keys[-2::-2].count(self.key)
+
+    def _put_piece(self, index: int, square: int):
+        """ Places the piece with the given bitboard index on an empty
+        square. """
+        mask = 1 << square
+        self.bitboards[index] |= mask
+        self.occupancy[index // 6] |= mask
+        self.occupied |= mask
+        self.mailbox[square] = index
+        self.key ^= PIECE_KEYS[index][square]
+        self.midgame += MIDGAME_SCORES[index][square]
+        self.endgame += ENDGAME_SCORES[index][square]
+        self.phase += PHASE_WEIGHTS[index]
+
+    def _remove_piece(self, square: int) -> int:
+        """ Removes the piece on the square and returns its bitboard index
+        (or EMPTY if the square was already empty). """
+        index = self.mailbox[square]
+        if index != EMPTY:
+            mask = ~(1 << square)
+            self.bitboards[index] &= mask
+            self.occupancy[index // 6] &= mask
+            self.occupied &= mask
+            self.mailbox[square] = EMPTY
+            self.key ^= PIECE_KEYS[index][square]
+            self.midgame -= MIDGAME_SCORES[index][square]
+            self.endgame -= ENDGAME_SCORES[index][square]
+            self.phase -= PHASE_WEIGHTS[index]
+
+        return index
+
+    def _invalidate_views(self):
+        """ Drops the cached nested list views, attack maps, checkers and pins
+        after the board has changed. """
+        self._positions = None
+        self._coordinates = None
+        self._attacked = None
+        self._checkers = [None, None]
+        self._pins = [None, None]
+
+    def _update_attacks(self, changed: int):
+        """ Recomputes the attack sets that can have changed after pieces were
+        placed on or removed from the changed squares: those of the pieces on
+        the changed squares and those of the sliding pieces whose attacks
+        reached one of them. All other attack sets stay as they are. """
+        attacks = self.attacks
+        mailbox = self.mailbox
+        occupied = self.occupied
+        bitboards = self.bitboards
+        sliders = (
+            bitboards[BISHOP] | bitboards[ROOK] | bitboards[QUEEN]
+            | bitboards[BISHOP + 6] | bitboards[ROOK + 6]
+            | bitboards[QUEEN + 6]
+        ) & ~changed
+        while sliders:
+            low = sliders & -sliders
+            sliders ^= low
+            square = low.bit_length() - 1
+            if attacks[square] & changed:
+                attacks[square] = piece_attacks(
+                    mailbox[square], square, occupied
+                )
+        while changed:
+            low = changed & -changed
+            changed ^= low
+            square = low.bit_length() - 1
+            index = mailbox[square]
+            if index == EMPTY:
+                attacks[square] = 0
+            else:
+                attacks[square] = piece_attacks(index, square, occupied)
+
+    def attacked_by(self, team=None) -> int:
+        """ Returns the squares attacked by the team ('white'/'black' or 0/1,
+        defaults to the side to move), combined from the attack sets of its
+        pieces. """
+        if self._attacked is None:
+            attacked = [0, 0]
+            attacks = self.attacks
+            for square in iter_bits(self.occupied):
+                attacked[self.mailbox[square] // 6] |= attacks[square]
+            self._attacked = attacked
+
+        return self._attacked[self._team(team)]
+
+    def _team(self, team) -> int:
+        """ Returns the team as 0 (white) or 1 (black), defaulting to the
+        side to move. """
+        if team is None:
+
+            return self.turn
+        if isinstance(team, str):
+
+            return TEAMS.index(team)
+
+        return team
+
+    def is_king_checked(self, team=None) -> bool:
+        """ Returns True if the king of the team (defaults to the side to
+        move) is attacked. """
+        us = self._team(team)
+        king = self.bitboards[us * 6 + KING]
+
+        return bool(king & self.attacked_by(us ^ 1))
+
+    def checkers(self, team=None) -> int:
+        """ Returns the pieces giving check to the king of the team (defaults
+        to the side to move) as a bitboard. """
+        us = self._team(team)
+        if self._checkers[us] is None:
+            king = self.bitboards[us * 6 + KING].bit_length() - 1
+            self._checkers[us] = 0
+            if (self.attacked_by(us ^ 1) >> king) & 1:
+                self._checkers[us] = attackers_to(
+                    self.bitboards, king, us ^ 1, self.occupied
+                )
+
+        return self._checkers[us]
+
+    def pins(self, team=None) -> Dict[int, int]:
+        """ Returns the pieces of the team (defaults to the side to move) that
+        are pinned to their king, mapped to the squares they may still move
+        to. """
+        us = self._team(team)
+        if self._pins[us] is None:
+            self._pins[us] = pin_rays(self.bitboards, us, self.occupied)
+
+        return self._pins[us]
+
+    def piece_at(self, square: int) -> Piece:
+        """ Returns the piece on the square (0-63), or '' if it's empty. """
+        index = self.mailbox[square]
+        if index == EMPTY:
+
+            return ''
+
+        return PIECES[index]
 
     def get_positions(self) -> List[List[Piece]]:
         """ Returns the nested list of pieces that make up the current
-        playing board. """
+        playing board. The list is derived from the bitboards and cached until
+        the next move. """
+        if self._positions is None:
+            cells = [PIECES[i] if i != EMPTY else '' for i in self.mailbox]
+            self._positions = [cells[row:row + 8] for row in range(0, 64, 8)]
 
-        return self.positions
+        return self._positions
 
     def check_positions(
         self,
@@ -267,199 +781,154 @@ class Positions:
     ) -> Dict[str, Piece]:
         """ Used to get information that will help verify that the move is
         allowed. Returns the piece on the starting square, the piece on the
-        destination square as well as any pieces in between (if piece is not a
-        horse). """
-        piece_start = self.positions[move.start.row][move.start.col]
-        if piece_start.type != 'knight':
-            # TODO Do the check of blocking pieces
-            # If there are pieces in between, return error
-            # Something can be done by taking the x1 - x2 and y1-y2
-            pass
-        piece_end = self.positions[move.end.row][move.end.col]
-
-        return {'piece_start': piece_start, 'piece_end': piece_end}
+        destination square and whether any pieces are in between (always False
+        if the piece is a horse). """
+        start = move.start.index
+        end = move.end.index
+        piece_start = self.piece_at(start)
+        blocked = False
+        if piece_start != '' and piece_start.type != 'knight':
+            blocked = bool(BETWEEN[start][end] & self.occupied)
+        piece_end = self.piece_at(end)
+
+        return {
+            'piece_start': piece_start,
+            'piece_end': piece_end,
+            'blocked': blocked,
+        }
 
     def update_positions(self, move: Move) -> List[int]:
         """ Takes the piece from the starting position and puts it at the end
         position. Returns the end positions. """
-        piece = self.positions[move.start.row][move.start.col]
-        self.positions[move.start.row][move.start.col] = ''
-        self.positions[move.end.row][move.end.col] = piece
+        self.make_move(move.code)
 
         return move.end.get_coordinates()
 
-    def get_coordinates(self):
+    def make_move(self, code: int) -> int:
+        """ Plays a move given as a move code (see bitboards.encode_move),
+        including the rook move when castling, the captured pawn for en
+        passant and promotions. Updates the castling rights, the en passant
+        square, the side to move and the halfmove clock, and pushes an undo
+        record so the move can be taken back with unmake_move. Returns the
+        bitboard index of the captured piece, or EMPTY. """
+        start = code & 63
+        end = (code >> 6) & 63
+        promotion = code >> 12
+        previous_key = self.key
+        index = self._remove_piece(start)
+        piece_type = index % 6
+        captured_square = end
+        if piece_type == PAWN and end == self.en_passant_square:
+            captured_square = end - 8 if index < 6 else end + 8
+        captured = self._remove_piece(captured_square)
+        self.history.append((
+            code, index, captured, captured_square, self.castling_rights,
+            self.en_passant_square, previous_key, self.attacks,
+            self.halfmove_clock, self.recent_keys,
+        ))
+        self.attacks = self.attacks[:]
+        if piece_type == PAWN or captured != EMPTY:
+            # The positions before can't be reached again; the undo record
+            # keeps their keys
+            self.halfmove_clock = 0
+            self.recent_keys = []
+        else:
+            self.halfmove_clock += 1
+            self.recent_keys.append(previous_key)
+        changed = (1 << start) | (1 << end) | (1 << captured_square)
+
+        if promotion:
+            self._put_piece(index - piece_type + promotion, end)
+        else:
+            self._put_piece(index, end)
+        if piece_type == KING and abs(end - start) == 2:
+            if end > start:
+                self._put_piece(self._remove_piece(start + 3), start + 1)
+                changed |= 0b1010 << start
+            else:
+                self._put_piece(self._remove_piece(start - 4), start - 1)
+                changed |= 0b1001 << (start - 4)
+        self._update_attacks(changed)
+
+        key = self.key ^ CASTLING_KEYS[self.castling_rights]
+        self.castling_rights &= CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        key ^= CASTLING_KEYS[self.castling_rights]
+        key ^= en_passant_key(self.en_passant_square)
+        if piece_type == PAWN and abs(end - start) == 16:
+            self.en_passant_square = (start + end) // 2
+            key ^= EN_PASSANT_KEYS[start & 7]
+        else:
+            self.en_passant_square = None
+        self.turn ^= 1
+        self.key = key ^ BLACK_TO_MOVE_KEY
+        self._invalidate_views()
+
+        return captured
+
+    def unmake_move(self) -> int:
+        """ Takes back the last move played with make_move, using the undo
+        record on top of the history. Returns the move code. """
+        (
+            code, index, captured, captured_square, castling_rights,
+            en_passant_square, key, attacks, halfmove_clock, recent_keys,
+        ) = self.history.pop()
+        start = code & 63
+        end = (code >> 6) & 63
+        self._remove_piece(end)
+        self._put_piece(index, start)
+        if captured != EMPTY:
+            self._put_piece(captured, captured_square)
+        if index % 6 == KING and abs(end - start) == 2:
+            if end > start:
+                self._put_piece(self._remove_piece(start + 1), start + 3)
+            else:
+                self._put_piece(self._remove_piece(start - 1), start - 4)
+
+        self.castling_rights = castling_rights
+        self.en_passant_square = en_passant_square
+        self.turn ^= 1
+        self.key = key
+        self.attacks = attacks
+        self.halfmove_clock = halfmove_clock
+        if self.recent_keys is recent_keys:
+            recent_keys.pop()
+        else:
+            self.recent_keys = recent_keys
+        self._invalidate_views()
+
+        return code
+
+    def legal_moves(self, team: str = None) -> List[int]:
+        """ Returns all legal moves for the team (defaults to the side to
+        move) as move codes. """
+
+        return generate_legal_moves(self, team)
+
+    def get_coordinates(self) -> List[List[int]]:
         """ Returns the nested list representing where there are pieces (1's)
         and which squares are empty (0's). """
+        if self._coordinates is None:
+            occupied = self.occupied
+            self._coordinates = [
+                [(occupied >> (row + col)) & 1 for col in range(8)]
+                for row in range(0, 64, 8)
+            ]
 
-        return self.coordinates
+        return self._coordinates
 
     def en_passant_capture(
         self,
         last_move_end: List[int]
     ) -> Piece:
         """ Executes the en_passant capture. The actual move will be done in
-        the update_positions function. """
-        captured_piece = self.positions[last_move_end[1]][last_move_end[0]]
-        self.positions[last_move_end[1]][last_move_end[0]] = ''
+        the update_positions function. last_move_end holds the row and the
+        column of the pawn that is captured. """
+        square = square_index(*last_move_end)
+        index = self._remove_piece(square)
+        self._update_attacks(1 << square)
+        self._invalidate_views()
 
-        return captured_piece
-
-
-"""
-*******************************************************************************
-                                     Board
-*******************************************************************************
-"""
-
-
-def _create_board_background() -> List[int]:
-    """ Creates an 8x8 matrix of 1's and 0's, which will colour the main
-    background of the board."""
-    # 0 is white
-    board = []
-    for value in range(1, 9):
-        if value % 2 == 0:
-            row = [0, 1] * 4
-        else:
-            row = [1, 0] * 4
-        board.append(row)
-
-    return board
-
-
-def _remove_ax_elements(
-        ax: plt.Axes,
-        ticks: bool,
-        spines: bool) -> plt.Axes:
-    """ Removes x and y tick marks as well as all spines. """
-    if ticks:
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.tick_params(
-            axis='both', which='both', bottom=False,
-            top=False, left=False, right=False
-        )
-
-    if spines:
-        ax.spines['right'].set_color('none')
-        ax.spines['left'].set_color('none')
-        ax.spines['top'].set_color('none')
-        ax.spines['bottom'].set_color('none')
-
-    return ax
-
-
-def _create_board() -> Dict:
-    """ Creates the main matplotlib figure for the board and its
-    coordinates. Returns the figure and the axes as a dictionary. """
-    background = _create_board_background()
-
-    plt.ion()
-    fig = plt.figure(figsize=(4.5, 4.5), dpi=150)
-    # Using gridspec to be able to control the layout of the two axes
-    # that hold coordinates.
-    grid_spec = plt.GridSpec(
-        nrows=2, ncols=2, figure=fig, width_ratios=[0.1, 0.9],
-        height_ratios=[0.1, 0.9], wspace=0.03, hspace=0.03
-    )
-    ax_cols = fig.add_subplot(grid_spec[0, 1])
-    ax_rows = fig.add_subplot(grid_spec[1, 0])
-    ax_board = fig.add_subplot(grid_spec[1, 1])
-
-    # Setting up main board
-    ax_board.matshow(background, cmap='Greys')
-    ax_board.set_xticks([])
-    ax_board.set_yticks([])
-
-    # Making sure the first and last squares are fully visible
-    ax_board.set_ylim(bottom=-0.5, top=7.5)
-
-    # Fixing columns
-    X = np.arange(1.5, 9.5)
-    Y = np.zeros(8)
-
-    ax_cols.set_xticks([])
-    ax_cols.set_yticks([])
-
-    i = 0
-    labels = 'abcdefgh'
-    for x, y in zip(X, Y):
-        ax_cols.text(
-            x, y, labels[i], ha='center', va='bottom', fontsize=8
-        )
-        i += 1
-    ax_cols.set_xlim(1, 9)
-    ax_cols.set_ylim(bottom=0, top=2)
-
-    # Fixing rows
-    Y = np.arange(1.5, 9)
-    X = np.zeros(8)
-
-    i = 0
-    labels = '123456789'
-    for x, y in zip(X, Y):
-        ax_rows.text(x, y, labels[i], ha='center', va='center', fontsize=8)
-        i += 1
-    ax_rows.set_xlim(-1, 1)
-    ax_rows.set_ylim(bottom=1.1, top=9.1)
-
-    ax_rows = _remove_ax_elements(ax_rows, True, True)
-    ax_cols = _remove_ax_elements(ax_cols, True, True)
-    ax_board = _remove_ax_elements(ax_board, True, False)
-    fig.suptitle('Chess')
-
-    return {
-            'fig': fig,
-            'board': ax_board,
-            'rows': ax_cols,
-            'cols': ax_cols
-            }
-
-
-class Board:
-    """ The main board class.
-    Properties:
-        self.board: the fig and ax objects of the board.
-    Methods:
-        self.update_board(): draws an updated board.
-    """
-    def __init__(self):
-        self.board = _create_board()
-
-    def update_board(
-            self,
-            positions: List[List[Piece]],
-            last_move: List[List[int]] = []
-            ) -> plt.Axes:
-        """ Updates the ax_board with the provided positions.
-        Input: positions is a Position class with all pieces.
-        last_move is a 2d list with x, y coordinates for the start and end
-        positions. """
-        plt.close()
-        self.board = _create_board()
-        for y, row in enumerate(positions):
-            for x, piece in enumerate(row):
-                if piece != '':
-                    self.board['board'].scatter(
-                        x, y, marker=piece.marker,
-                        c=piece.color, s=piece.size, label=piece.type
-                    )
-        X = []
-        Y = []
-
-        if last_move:
-            for position in last_move:
-                Y.append(position[0])
-                X.append(position[1])
-            self.board['board'].plot(X, Y, c='blue')
-        plt.show()
-        # self.board['fig'].canvas.draw()
-
-    def show_board(self):
-        """ Shows the figure. """
-        plt.show()
-        # self.board['fig'].canvas.draw()
+        return PIECES[index] if index != EMPTY else ''
 
 
 """
@@ -482,7 +951,7 @@ class Player:
     def assign_first_team(self):
         """ Randomly assigns a team to the player and returns the other colour,
         to be assigned to the other player. """
-        idx = np.random.randint(2, size=1)[0]
+        idx = random.randrange(2)
         team = Player.teams[idx]
         self.team = team
 
@@ -520,3 +989,14 @@ def player_queue(players: List[Player]) -> Generator[Player, None, None]:
     while True:
         yield queue[i]
         i = i * -1
+
+
+def __getattr__(name: str):
+    """ Loads the plotting module the first time classes.Board is used, so
+    that importing the rules doesn't import matplotlib. """
+    if name == 'Board':
+        import board
+
+        return board.Board
+
+    raise AttributeError(f"module 'classes' has no attribute '{name}'")
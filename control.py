@@ -1,16 +1,34 @@
 """ This module includes the controls and checks that make sure the game rules
 are being followed. """
 import re
-from typing import List
-from classes import Move, Piece
+from typing import Iterable, List, Tuple, Union
+from bitboards import (
+    EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, bit, popcount,
+)
+from classes import FIFTY_MOVE_PLIES, Move, Piece, Positions
+from movegen import (
+    LAST_ROWS, PROMOTIONS, has_legal_move, is_legal_move, is_pseudo_legal_move
+)
+from pool import pool_map
+
+# The dark squares (a1 is dark) and the light squares
+DARK_SQUARES = 0xAA55AA55AA55AA55
+LIGHT_SQUARES = ~DARK_SQUARES & ((1 << 64) - 1)
+MOVE_PATTERN = re.compile('^[a-h][1-8][a-h][1-8][nbrq]?$')
+# The ways check_game_end can end a game in a draw
+DRAWS = (
+    'stalemate', 'insufficient_material', 'threefold_repetition',
+    'fifty_moves',
+)
 
 
 def check_only_valid_characters(move_string):
     """ Checks that the input follows the convention
     <letter><number><letter><number> and that letters are only a-h and numbers
-    1-8. """
+    1-8, optionally followed by the letter of the piece a pawn is promoted to
+    (n, b, r or q). """
 
-    if re.match('^[a-h][1-8][a-h][1-8]$', move_string):
+    if MOVE_PATTERN.match(move_string):
 
         return True
 
@@ -67,3 +85,160 @@ def update_en_passant_position(
             return [move.end.row + 1, move.end.col]
 
     return ['', '']
+
+
+def is_check_mate(positions: Positions) -> bool:
+    """ Checks whether the side to move is in check and has no legal move.
+    """
+
+    return positions.is_king_checked() and not has_legal_move(positions)
+
+
+def is_stalemate(positions: Positions) -> bool:
+    """ Checks whether the side to move isn't in check but has no legal move.
+    The legal moves are generated lazily, so the check stops at the first
+    move it finds. """
+
+    return not positions.is_king_checked() and not has_legal_move(positions)
+
+
+def is_insufficient_material(positions: Positions) -> bool:
+    """ Checks whether neither team can possibly checkmate: only kings, a
+    king and a single bishop or knight against a king, or kings and bishops
+    that all stand on squares of the same colour. """
+    bitboards = positions.bitboards
+    for piece_type in (PAWN, ROOK, QUEEN):
+        if bitboards[piece_type] | bitboards[piece_type + 6]:
+
+            return False
+    knights = bitboards[KNIGHT] | bitboards[KNIGHT + 6]
+    bishops = bitboards[BISHOP] | bitboards[BISHOP + 6]
+    if popcount(knights | bishops) <= 1:
+
+        return True
+    if knights:
+
+        return False
+
+    return not bishops & DARK_SQUARES or not bishops & LIGHT_SQUARES
+
+
+def check_game_end(positions: Positions) -> str:
+    """ Runs at the start of every turn. Returns 'checkmate', 'stalemate',
+    'insufficient_material', 'threefold_repetition' or 'fifty_moves' if the
+    game is over, and '' if it isn't. Only one legal move has to be found to
+    continue, which the lazy move generator usually finds straight away.
+    The repetitions are only looked for since the last pawn move or capture,
+    see Positions.repetitions. """
+    if is_insufficient_material(positions):
+
+        return 'insufficient_material'
+    if has_legal_move(positions):
+        if positions.repetitions() >= 2:
+
+            return 'threefold_repetition'
+        if positions.halfmove_clock >= FIFTY_MOVE_PLIES:
+
+            return 'fifty_moves'
+
+        return ''
+    if positions.is_king_checked():
+
+        return 'checkmate'
+
+    return 'stalemate'
+
+
+"""
+*******************************************************************************
+                               Bulk validation
+*******************************************************************************
+"""
+
+
+def explain_illegal_move(positions: Positions, code: int) -> str:
+    """ Explains why a move that isn't among the legal moves is illegal. """
+    start, end = code & 63, (code >> 6) & 63
+    promotion = code >> 12
+    if promotion and promotion not in PROMOTIONS:
+
+        return 'a pawn can only be promoted to a knight, bishop, rook or queen'
+    piece = positions.mailbox[start]
+    if piece == EMPTY:
+
+        return 'there is no piece on the start square'
+    if piece // 6 != positions.turn:
+
+        return 'the piece belongs to the other team'
+    captured = positions.mailbox[end]
+    if captured != EMPTY and captured // 6 == positions.turn:
+
+        return 'the destination is occupied by a piece of the same team'
+    reaches_last_row = piece % 6 == PAWN and bit(end) & LAST_ROWS
+    if reaches_last_row and not promotion:
+
+        return 'a pawn reaching the last row has to be promoted'
+    if promotion and not reaches_last_row:
+
+        return 'only a pawn reaching the last row can be promoted'
+    if not is_pseudo_legal_move(positions, code):
+
+        return "the piece can't move like that"
+    if positions.is_king_checked():
+
+        return "the move doesn't get the king out of check"
+    pins = positions.pins()
+    if start in pins and not pins[start] & bit(end):
+
+        return 'the piece is pinned to its king'
+
+    return 'the move would leave the king in check'
+
+
+def validate_moves(
+        moves: Iterable[Union[int, str]],
+        fen: str = None
+) -> Tuple[int, str]:
+    """ Plays a whole game, given as move strings such as "e2e4" (or "e7e8q"
+    for a promotion) or as move codes, from the starting positions or from
+    fen. Nothing is printed or asked for. Returns the index of the first
+    illegal move and the reason it's illegal, or (-1, '') if every move is
+    legal. Every move is checked on its own with movegen.is_legal_move,
+    without generating all the legal moves, and only an illegal move gets
+    diagnosed. """
+    positions = Positions(fen) if fen else Positions()
+    for index, move in enumerate(moves):
+        if isinstance(move, str):
+            move = move.lower().strip()
+            if not MOVE_PATTERN.match(move):
+
+                return index, f'{move!r} is not a move'
+            code = Move.from_uci(move).code
+        elif isinstance(move, int) and 0 <= move < 1 << 15:
+            code = move
+        else:
+
+            return index, f'{move!r} is not a move code'
+        if not is_legal_move(positions, code):
+            if not has_legal_move(positions):
+
+                return index, 'the game is already over'
+
+            return index, explain_illegal_move(positions, code)
+        positions.make_move(code)
+
+    return -1, ''
+
+
+def validate_games(
+        games: Iterable[Iterable[Union[int, str]]],
+        workers: int = 1,
+        batch_size: int = 256
+) -> List[Tuple[int, str]]:
+    """ Validates many games, see validate_moves, and returns their results
+    in order. With more than one worker (or None for one per CPU) the games
+    are split into batches of batch_size and validated on a process pool.
+    """
+    games = [list(moves) for moves in games]
+
+    return list(pool_map(validate_moves, games, workers, batch_size))
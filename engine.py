@@ -0,0 +1,863 @@
+""" This module contains a computer player. It chooses its moves with an
+iterative deepening alpha-beta search on Positions, followed by a quiescence
+search of the captures. Moves are ordered by MVV-LVA (most valuable victim,
+least valuable attacker), killer moves and the history heuristic. Every move
+is searched within a time and/or node budget. Positions are scored by
+evaluation.evaluate.
+
+Usage:
+    python engine.py --time 2
+    python engine.py --fen "<fen>" --depth 5
+    python engine.py --workers 8 --time 10
+"""
+import argparse
+import os
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from bitboards import (
+    EMPTY, PAWN, move_to_uci, popcount
+)
+from book import OpeningBook
+from classes import FIFTY_MOVE_PLIES, Player, Positions
+from evaluation import PawnTable, evaluate
+from movegen import has_legal_move
+from pool import process_pool
+from tablebase import Tablebases
+from transposition import (
+    DEFAULT_SIZE_MB, EXACT, LOWER, UPPER, TranspositionTable
+)
+
+INFINITY = 1000000
+MATE_SCORE = 100000
+MAX_PLY = 64
+# Nodes searched between two checks of the time and node budget
+CHECK_INTERVAL = 1024
+
+# Move ordering scores. The move stored in the transposition table comes
+# first, then captures and promotions, then the killer moves and then the
+# quiet moves sorted by their history score.
+HASH_ORDER = 1 << 31
+CAPTURE_ORDER = 1 << 30
+KILLER_ORDER = 1 << 29
+HISTORY_LIMIT = 1 << 28
+# History scores of a search that hasn't played any moves yet
+NO_HISTORY = (0,) * 4096
+
+
+def is_tactical(positions: Positions, code: int) -> bool:
+    """ Checks whether the move is a capture (including en passant) or a
+    promotion. These are the moves the quiescence search looks at. """
+    end = (code >> 6) & 63
+    if code >> 12 or positions.mailbox[end] != EMPTY:
+
+        return True
+
+    return (
+        end == positions.en_passant_square
+        and positions.mailbox[code & 63] % 6 == PAWN
+    )
+
+
+def order_moves(
+        positions: Positions,
+        moves: List[int],
+        killers: Sequence[int] = (0, 0),
+        history: Sequence[int] = NO_HISTORY,
+        hash_move: int = 0
+) -> List[int]:
+    """ Sorts the moves so that the ones most likely to cause a cutoff are
+    searched first: the move from the transposition table, captures by
+    MVV-LVA and promotions, then the killer moves, then the rest by history
+    score. Without killers and history only the captures are ordered. """
+    mailbox = positions.mailbox
+    en_passant_square = positions.en_passant_square
+
+    def order(code: int) -> int:
+        if code == hash_move:
+
+            return HASH_ORDER
+        end = (code >> 6) & 63
+        victim = mailbox[end]
+        attacker = mailbox[code & 63] % 6
+        if victim != EMPTY:
+
+            return CAPTURE_ORDER + (victim % 6) * 8 - attacker
+        if code >> 12:
+
+            return CAPTURE_ORDER + (code >> 12) * 8
+        if attacker == PAWN and end == en_passant_square:
+
+            return CAPTURE_ORDER + PAWN * 8 + 7
+        if code == killers[0]:
+
+            return KILLER_ORDER + 1
+        if code == killers[1]:
+
+            return KILLER_ORDER
+
+        return history[code & 4095]
+
+    return sorted(moves, key=order, reverse=True)
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    """ Mate scores count the plies from the root. The table stores them
+    counted from the stored positions instead, so that they are right
+    wherever the positions are reached. """
+    if score >= MATE_SCORE - MAX_PLY:
+
+        return score + ply
+    if score <= MAX_PLY - MATE_SCORE:
+
+        return score - ply
+
+    return score
+
+
+def _score_from_table(score: int, ply: int) -> int:
+    """ Turns a mate score from the table back into plies from the root. """
+    if score >= MATE_SCORE - MAX_PLY:
+
+        return score - ply
+    if score <= MAX_PLY - MATE_SCORE:
+
+        return score + ply
+
+    return score
+
+
+class SearchStopped(Exception):
+    """ Raised inside the search when the time or node budget runs out. """
+
+
+class Search:
+    """ Iterative deepening alpha-beta search.
+    Properties:
+        self.max_depth: the deepest iteration to search.
+        self.time_limit: seconds per search, or None for no limit.
+        self.node_limit: nodes per search, or None for no limit.
+        self.nodes: nodes searched by the last search.
+        self.iterations: one dictionary per completed depth of the last
+            search.
+        self.table: the TranspositionTable, kept between searches.
+        self.pawns: the PawnTable of the evaluation, kept between searches.
+        self.tablebases: the endgame Tablebases, or None.
+    Methods:
+        self.run(): searches the positions and returns the best move.
+        self.principal_variation(): the best line found by the last search.
+    """
+
+    def __init__(
+            self,
+            max_depth: int = MAX_PLY,
+            time_limit: float = None,
+            node_limit: int = None,
+            table: TranspositionTable = None,
+            tablebases: Tablebases = None,
+    ):
+        """ A table of the default size is created if none is given. """
+        self.table = table if table is not None else TranspositionTable()
+        self.tablebases = tablebases
+        self.pawns = PawnTable()
+        self.max_depth = min(max_depth, MAX_PLY)
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.iterations = []
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self._deadline = None
+        self._next_check = CHECK_INTERVAL
+        self._root_best = None
+
+    def _reset(self, time_limit: float = None):
+        """ Prepares a new search: clears the node count and the killer moves
+        and sets the deadline. """
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self._deadline = None
+        if time_limit is not None:
+            self._deadline = time.perf_counter() + time_limit
+        self._next_check = 0
+        self._root_best = None
+
+    def _check_budget(self):
+        """ Raises SearchStopped once the time or node budget is used up. """
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped()
+        if (
+            self._deadline is not None
+            and time.perf_counter() >= self._deadline
+        ):
+            raise SearchStopped()
+        self._next_check = self.nodes + CHECK_INTERVAL
+        if self.node_limit is not None:
+            self._next_check = min(self._next_check, self.node_limit)
+
+    def _order_moves(
+            self,
+            positions: Positions,
+            moves: List[int],
+            ply: int,
+            hash_move: int = 0
+    ) -> List[int]:
+        """ Sorts the moves with order_moves, using the killer moves of the
+        ply and the history scores of the search. """
+
+        return order_moves(
+            positions, moves, self.killers[ply], self.history, hash_move
+        )
+
+    def _store_cutoff(self, code: int, depth: int, ply: int):
+        """ Remembers a quiet move that caused a beta cutoff as a killer
+        move of the ply and raises its history score. """
+        killers = self.killers[ply]
+        if code != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = code
+        history = self.history
+        history[code & 4095] += depth * depth
+        if history[code & 4095] > HISTORY_LIMIT:
+            self.history = [score // 2 for score in history]
+
+    def _quiescence(
+            self,
+            positions: Positions,
+            alpha: int,
+            beta: int,
+            ply: int
+    ) -> int:
+        """ Searches captures and promotions only, so that the evaluation
+        isn't taken in the middle of an exchange. The side to move may also
+        stand pat on the static evaluation. In check, every evasion is
+        searched instead. """
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_budget()
+        if ply >= MAX_PLY:
+
+            return evaluate(positions, self.pawns)
+
+        if positions.is_king_checked():
+            moves = positions.legal_moves()
+            if not moves:
+
+                return ply - MATE_SCORE
+            best = -INFINITY
+        else:
+            best = evaluate(positions, self.pawns)
+            if best >= beta:
+
+                return best
+            alpha = max(alpha, best)
+            moves = [
+                code for code in positions.legal_moves()
+                if is_tactical(positions, code)
+            ]
+
+        for code in self._order_moves(positions, moves, ply):
+            positions.make_move(code)
+            score = -self._quiescence(positions, -beta, -alpha, ply + 1)
+            positions.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        return best
+
+    def _alpha_beta(
+            self,
+            positions: Positions,
+            depth: int,
+            alpha: int,
+            beta: int,
+            ply: int
+    ) -> int:
+        """ Returns the score of the positions for the side to move, searched
+        to the given depth (fail-soft). Checks extend the depth by one. The
+        transposition table gives a cutoff if it holds a deep enough result
+        and otherwise the move to search first. Positions covered by the
+        endgame tablebases are scored exactly without searching. A position
+        that repeats an earlier one, or that the fifty-move rule has reached,
+        is scored as a draw, unless the move that reached the rule mated. """
+        if positions.repetitions():
+            self.nodes += 1
+
+            return 0
+        if positions.halfmove_clock >= FIFTY_MOVE_PLIES:
+            self.nodes += 1
+            if (
+                positions.is_king_checked()
+                and not has_legal_move(positions)
+            ):
+
+                return ply - MATE_SCORE
+
+            return 0
+        if (
+            self.tablebases is not None
+            and popcount(positions.occupied) <= 3
+        ):
+            result = self.tablebases.probe(positions)
+            if result is not None:
+                self.nodes += 1
+                outcome, plies = result
+
+                return outcome * (MATE_SCORE - ply - plies)
+        in_check = positions.is_king_checked()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+
+            return self._quiescence(positions, alpha, beta, ply)
+
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._check_budget()
+        # Mate distance pruning: from here the side to move can't mate
+        # sooner than with its next move, or be mated sooner than now, so
+        # once such a mate is found the remaining moves can't improve on it
+        alpha = max(alpha, ply - MATE_SCORE)
+        beta = min(beta, MATE_SCORE - ply - 1)
+        if alpha >= beta:
+
+            return alpha
+        key = positions.key
+        hash_move = 0
+        entry = self.table.probe(key)
+        if entry is not None:
+            hash_move, entry_depth, bound, score = entry
+            if entry_depth >= depth:
+                score = _score_from_table(score, ply)
+                if (
+                    bound == EXACT
+                    or bound == LOWER and score >= beta
+                    or bound == UPPER and score <= alpha
+                ):
+
+                    return score
+        moves = positions.legal_moves()
+        if not moves:
+
+            return ply - MATE_SCORE if in_check else 0
+
+        original_alpha = alpha
+        best = -INFINITY
+        best_move = 0
+        for code in self._order_moves(positions, moves, ply, hash_move):
+            positions.make_move(code)
+            score = -self._alpha_beta(
+                positions, depth - 1, -beta, -alpha, ply + 1
+            )
+            positions.unmake_move()
+            if score > best:
+                best = score
+                best_move = code
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not is_tactical(positions, code):
+                            self._store_cutoff(code, depth, ply)
+                        break
+
+        if best >= beta:
+            bound = LOWER
+        elif best > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.table.store(
+            key, best_move, depth, bound, _score_to_table(best, ply)
+        )
+
+        return best
+
+    def _search_root(
+            self,
+            positions: Positions,
+            moves: List[int],
+            depth: int
+    ) -> List[int]:
+        """ Searches every root move to the depth, best move of the previous
+        iteration first. Keeps the best move found so far in
+        self._root_best, so that it can be used if the budget runs out
+        during the iteration. Returns the moves reordered by score. """
+        alpha = -INFINITY
+        scores = {}
+        for code in moves:
+            positions.make_move(code)
+            score = -self._alpha_beta(
+                positions, depth - 1, -INFINITY, -alpha, 1
+            )
+            positions.unmake_move()
+            scores[code] = score
+            if score > alpha:
+                alpha = score
+                self._root_best = (code, score)
+
+        return sorted(moves, key=lambda code: scores[code], reverse=True)
+
+    def search_move(
+            self,
+            positions: Positions,
+            code: int,
+            depth: int,
+            alpha: int = -INFINITY,
+            time_limit: float = None
+    ) -> Optional[int]:
+        """ Searches a single root move to the depth with the window (alpha,
+        infinity), so a score above alpha is exact. Returns the score for the
+        side to move, or None if the time or node budget ran out. Used by the
+        workers of ParallelSearch; the move is played on the positions and is
+        left on them if the search is stopped. """
+        self._reset(time_limit)
+        positions.make_move(code)
+        try:
+            score = -self._alpha_beta(
+                positions, depth - 1, -INFINITY, -alpha, 1
+            )
+        except SearchStopped:
+
+            return None
+        positions.unmake_move()
+
+        return score
+
+    def run(self, positions: Positions) -> Dict:
+        """ Searches with increasing depth until max_depth is reached, a
+        mate is found or the budget runs out. The search plays on a copy of
+        the positions. Returns the best move code (None if there is no legal
+        move), its score in centipawns for the side to move, the depth
+        reached, the principal variation, the nodes searched and the speed.
+        """
+        start = time.perf_counter()
+        root = positions
+        positions = positions.copy()
+        self.iterations = []
+        self.history = [score // 8 for score in self.history]
+        self.table.new_search()
+        self._reset(self.time_limit)
+
+        moves = self._order_moves(positions, positions.legal_moves(), 0)
+        best_move = moves[0] if moves else None
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            if not moves:
+                break
+            try:
+                moves = self._search_root(positions, moves, depth)
+            except SearchStopped:
+                if self._root_best is not None:
+                    best_move, best_score = self._root_best
+                break
+            best_move, best_score = self._root_best
+            depth_reached = depth
+            self._root_best = None
+            self.table.store(
+                positions.key, best_move, depth, EXACT,
+                _score_to_table(best_score, 0)
+            )
+            self.iterations.append({
+                'depth': depth,
+                'move': move_to_uci(best_move),
+                'score': best_score,
+                'nodes': self.nodes,
+                'seconds': time.perf_counter() - start,
+            })
+            if len(moves) == 1 or abs(best_score) >= MATE_SCORE - MAX_PLY:
+                break
+        seconds = time.perf_counter() - start
+
+        return {
+            'move': best_move,
+            'uci': move_to_uci(best_move) if best_move is not None else '',
+            'score': best_score,
+            'depth': depth_reached,
+            'pv': self.principal_variation(root, depth_reached),
+            'nodes': self.nodes,
+            'seconds': seconds,
+            'nps': self.nodes / seconds if seconds > 0 else 0.0,
+        }
+
+    def principal_variation(
+            self,
+            positions: Positions,
+            depth: int
+    ) -> List[str]:
+        """ Follows the moves stored in the transposition table from the
+        positions, up to depth moves, and returns them as move strings. Stops
+        early at a missing entry or a repeated position. """
+        positions = positions.copy()
+        line = []
+        seen = set()
+        while len(line) < depth and positions.key not in seen:
+            seen.add(positions.key)
+            entry = self.table.probe(positions.key)
+            if entry is None or entry[0] not in positions.legal_moves():
+                break
+            line.append(move_to_uci(entry[0]))
+            positions.make_move(entry[0])
+
+        return line
+
+
+"""
+*******************************************************************************
+                                Parallel search
+*******************************************************************************
+"""
+
+# The Search of a worker process. It's kept between tasks, so that the
+# history scores carry over from one root move to the next.
+_worker_search = None
+
+
+def _start_worker(tablebases: Optional[Tablebases]):
+    """ Initializer of the ParallelSearch workers. """
+    global _worker_search
+    _worker_search = Search(tablebases=tablebases)
+
+
+def _search_root_move(task: Tuple) -> Tuple[int, Optional[int], int]:
+    """ Worker function of ParallelSearch. Searches one root move and returns
+    the move, its score (None if the budget ran out) and the nodes searched.
+    The deadline is given as wall clock time, since perf_counter isn't shared
+    between processes. """
+    positions, code, depth, alpha, deadline, node_limit = task
+    search = _worker_search
+    search.node_limit = node_limit
+    time_limit = None if deadline is None else deadline - time.time()
+    score = search.search_move(positions, code, depth, alpha, time_limit)
+
+    return code, score, search.nodes
+
+
+class ParallelSearch:
+    """ Iterative deepening search that splits the root moves over a process
+    pool. At every depth the best move of the previous iteration is searched
+    first, on its own, to get an alpha bound. The other root moves are then
+    searched in parallel, each with the best score found so far as its alpha
+    bound. A single Python process can't use more than one core, so this is
+    how the search scales.
+    Properties:
+        self.workers: the number of worker processes.
+        self.tablebases: the endgame Tablebases probed by the workers, or
+            None.
+        self.nodes: nodes searched by all workers in the last search.
+        self.iterations: one dictionary per completed depth of the last
+            search.
+    Methods:
+        self.run(): searches the positions and returns the best move.
+        self.close(): shuts the process pool down.
+    """
+
+    def __init__(
+            self,
+            workers: int = None,
+            max_depth: int = MAX_PLY,
+            time_limit: float = None,
+            node_limit: int = None,
+            tablebases: Tablebases = None,
+    ):
+        """ workers defaults to the number of CPUs. The node limit is checked
+        between iterations, and every root move search gets the nodes that
+        are left, so a search can go over it. """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_depth = min(max_depth, MAX_PLY)
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.tablebases = tablebases
+        self.nodes = 0
+        self.iterations = []
+        self._executor = None
+
+    def _pool(self):
+        """ Starts the process pool the first time it's needed. """
+        if self._executor is None:
+            self._executor = process_pool(
+                self.workers, _start_worker, (self.tablebases,)
+            )
+
+        return self._executor
+
+    def close(self):
+        """ Shuts the process pool down. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'ParallelSearch':
+
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self, positions: Positions) -> Dict:
+        """ Searches with increasing depth until max_depth is reached, a mate
+        is found or the budget runs out. Returns the same dictionary as
+        Search.run(). """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        start = time.perf_counter()
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.time() + self.time_limit
+        positions = positions.copy()
+        pool = self._pool()
+        self.nodes = 0
+        self.iterations = []
+
+        moves = order_moves(positions, positions.legal_moves())
+        best_move = moves[0] if moves else None
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            node_limit = None
+            if self.node_limit is not None:
+                node_limit = self.node_limit - self.nodes
+                if node_limit <= 0:
+                    break
+            if not moves:
+                break
+
+            code, score, nodes = pool.submit(
+                _search_root_move,
+                (positions, moves[0], depth, -INFINITY, deadline, node_limit)
+            ).result()
+            self.nodes += nodes
+            if score is None:
+                break
+            scores = {code: score}
+            best = (code, score)
+            stopped = False
+            # Only a few moves per worker are handed out at a time, so that
+            # every new task gets the best score found so far as its alpha
+            # bound.
+            remaining = iter(moves[1:])
+            pending = set()
+            for code in remaining:
+                pending.add(pool.submit(
+                    _search_root_move,
+                    (positions, code, depth, best[1], deadline, node_limit)
+                ))
+                if len(pending) >= 2 * self.workers:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    code, score, nodes = future.result()
+                    self.nodes += nodes
+                    if score is None:
+                        stopped = True
+                        continue
+                    scores[code] = score
+                    if score > best[1]:
+                        best = (code, score)
+                    code = None if stopped else next(remaining, None)
+                    if code is not None:
+                        pending.add(pool.submit(
+                            _search_root_move,
+                            (
+                                positions, code, depth, best[1], deadline,
+                                node_limit
+                            )
+                        ))
+            best_move, best_score = best
+            if stopped:
+                break
+
+            depth_reached = depth
+            moves = sorted(moves, key=lambda code: scores[code], reverse=True)
+            self.iterations.append({
+                'depth': depth,
+                'move': move_to_uci(best_move),
+                'score': best_score,
+                'nodes': self.nodes,
+                'seconds': time.perf_counter() - start,
+            })
+            if len(moves) == 1 or abs(best_score) >= MATE_SCORE - MAX_PLY:
+                break
+        seconds = time.perf_counter() - start
+
+        return {
+            'move': best_move,
+            'uci': move_to_uci(best_move) if best_move is not None else '',
+            'score': best_score,
+            'depth': depth_reached,
+            'nodes': self.nodes,
+            'seconds': seconds,
+            'nps': self.nodes / seconds if seconds > 0 else 0.0,
+        }
+
+
+class EnginePlayer(Player):
+    """ A player whose moves are chosen by the search instead of being typed
+    in. It can be put in player_queue like any other player, and it can be
+    given to GameRunner as a move chooser.
+    Properties:
+        self.search: the Search or ParallelSearch used to choose the moves.
+        self.book: the OpeningBook, or None.
+        self.tablebases: the endgame Tablebases, or None.
+        self.last_search: the result of the last search.
+    Methods:
+        self.choose_move(): probes the tablebases and the book, or else
+            searches the positions, and returns a move code.
+        self.close(): shuts the search pool down and closes the opening book
+            if it was opened from a path.
+    """
+
+    def __init__(
+            self,
+            name: str = 'Computer',
+            time_limit: float = 1.0,
+            node_limit: int = None,
+            max_depth: int = MAX_PLY,
+            workers: int = 1,
+            book: OpeningBook = None,
+            tablebases: Tablebases = None,
+    ):
+        """ With more than one worker (or None for one per CPU) the moves
+        are searched by a ParallelSearch. Positions found in the opening
+        book (an OpeningBook or the path of a book file) are played from
+        the book without searching, and so are positions found in the
+        endgame tablebases (Tablebases or the directory of the tables). """
+        super().__init__(name)
+        self._own_book = isinstance(book, str)
+        if self._own_book:
+            book = OpeningBook(book)
+        self.book = book
+        if isinstance(tablebases, str):
+            tablebases = Tablebases(tablebases)
+        self.tablebases = tablebases
+        if workers == 1:
+            self.search = Search(
+                max_depth, time_limit, node_limit, tablebases=tablebases
+            )
+        else:
+            self.search = ParallelSearch(
+                workers, max_depth, time_limit, node_limit, tablebases
+            )
+        self.last_search = {}
+
+    def choose_move(
+            self,
+            positions: Positions,
+            chooser: random.Random = random
+    ) -> int:
+        """ Returns the best move from the endgame tablebases if they cover
+        the positions, or else a move from the opening book, or else the code
+        of the best move found within the budget. Book moves are picked with
+        chooser. """
+        if self.tablebases is not None:
+            code = self.tablebases.best_move(positions)
+            if code is not None:
+                self.last_search = {
+                    'move': code, 'uci': move_to_uci(code), 'tablebase': True
+                }
+
+                return code
+        if self.book is not None:
+            code = self.book.choose_move(positions, chooser)
+            if code is not None:
+                self.last_search = {
+                    'move': code, 'uci': move_to_uci(code), 'book': True
+                }
+
+                return code
+        self.last_search = self.search.run(positions)
+
+        return self.last_search['move']
+
+    def __call__(
+            self,
+            positions: Positions,
+            chooser: random.Random = random
+    ) -> int:
+
+        return self.choose_move(positions, chooser)
+
+    def close(self):
+        """ Shuts the worker processes of a ParallelSearch down. A book that
+        was given as an OpeningBook is left open for its owner. """
+        if isinstance(self.search, ParallelSearch):
+            self.search.close()
+        if self._own_book:
+            self.book.close()
+            self._own_book = False
+
+    def __enter__(self) -> 'EnginePlayer':
+
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--fen', help='position to search')
+    parser.add_argument(
+        '--time', type=float, help='seconds to search for'
+    )
+    parser.add_argument('--nodes', type=int, help='nodes to search')
+    parser.add_argument(
+        '--depth', type=int, default=MAX_PLY, help='deepest iteration'
+    )
+    parser.add_argument(
+        '--hash', type=float, default=DEFAULT_SIZE_MB,
+        help='size of the transposition table in megabytes'
+    )
+    parser.add_argument(
+        '--tablebases', help='directory of the endgame tablebases'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='processes to split the root moves over (0 for one per CPU)'
+    )
+    args = parser.parse_args()
+
+    time_limit = args.time
+    if time_limit is None and args.nodes is None and args.depth == MAX_PLY:
+        time_limit = 1.0
+    positions = Positions(args.fen) if args.fen else Positions()
+    if args.workers == 1:
+        search = Search(
+            args.depth, time_limit, args.nodes, TranspositionTable(args.hash),
+            Tablebases(args.tablebases) if args.tablebases else None
+        )
+        result = search.run(positions)
+    else:
+        with ParallelSearch(
+                args.workers or None, args.depth, time_limit, args.nodes,
+                Tablebases(args.tablebases) if args.tablebases else None
+        ) as search:
+            result = search.run(positions)
+    for iteration in search.iterations:
+        print(
+            f"depth {iteration['depth']:>2}  score {iteration['score']:>7}  "
+            f"nodes {iteration['nodes']:>8}  "
+            f"time {iteration['seconds']:>6.2f} s  {iteration['move']}"
+        )
+    print(
+        f"Best move: {result['uci']}\nNodes: {result['nodes']}\n"
+        f"Nodes per second: {result['nps']:.0f}"
+    )
+    if args.workers == 1:
+        stats = search.table.stats()
+        print(
+            f"Principal variation: {' '.join(result['pv'])}\n"
+            f"Table: {stats['megabytes']:.0f} MB, "
+            f"hit rate {stats['hit_rate']:.1%}, "
+            f"{stats['collisions']} collisions, "
+            f"occupancy {stats['occupancy']:.1%}"
+        )
+
+
+if __name__ == '__main__':
+    main()
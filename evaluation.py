@@ -0,0 +1,330 @@
+""" This module scores positions for the search. The score is tapered: a
+middlegame and an endgame score are blended by the game phase, which goes
+down as pieces are traded. Material and piece-square scores are kept up to
+date by Positions itself as pieces are put on and taken off squares (see
+Positions._put_piece), so evaluating them costs nothing. The pawn structure
+(doubled, isolated and passed pawns) and the pawn shelter of the kings are
+only worked out once per formation of pawns and kings and kept in a
+PawnTable. """
+from typing import Dict, List, Tuple
+from bitboards import BLACK, PAWN, KING, WHITE
+
+# Piece values in centipawns, indexed by piece type. The middlegame values
+# are those of Piece.values.
+MIDGAME_VALUES = [100, 300, 300, 500, 900, 0]
+ENDGAME_VALUES = [120, 290, 310, 530, 950, 0]
+
+# Piece-square tables in centipawns from white's point of view, indexed
+# [piece type, row, col] with row 0 being white's first row.
+PIECE_SQUARE_TABLES = [
+    # Pawn
+    [[0, 0, 0, 0, 0, 0, 0, 0],
+     [5, 10, 10, -20, -20, 10, 10, 5],
+     [5, -5, -10, 0, 0, -10, -5, 5],
+     [0, 0, 0, 20, 20, 0, 0, 0],
+     [5, 5, 10, 25, 25, 10, 5, 5],
+     [10, 10, 20, 30, 30, 20, 10, 10],
+     [50, 50, 50, 50, 50, 50, 50, 50],
+     [0, 0, 0, 0, 0, 0, 0, 0]],
+    # Knight
+    [[-50, -40, -30, -30, -30, -30, -40, -50],
+     [-40, -20, 0, 5, 5, 0, -20, -40],
+     [-30, 5, 10, 15, 15, 10, 5, -30],
+     [-30, 0, 15, 20, 20, 15, 0, -30],
+     [-30, 5, 15, 20, 20, 15, 5, -30],
+     [-30, 0, 10, 15, 15, 10, 0, -30],
+     [-40, -20, 0, 0, 0, 0, -20, -40],
+     [-50, -40, -30, -30, -30, -30, -40, -50]],
+    # Bishop
+    [[-20, -10, -10, -10, -10, -10, -10, -20],
+     [-10, 5, 0, 0, 0, 0, 5, -10],
+     [-10, 10, 10, 10, 10, 10, 10, -10],
+     [-10, 0, 10, 10, 10, 10, 0, -10],
+     [-10, 5, 5, 10, 10, 5, 5, -10],
+     [-10, 0, 5, 10, 10, 5, 0, -10],
+     [-10, 0, 0, 0, 0, 0, 0, -10],
+     [-20, -10, -10, -10, -10, -10, -10, -20]],
+    # Rook
+    [[0, 0, 0, 5, 5, 0, 0, 0],
+     [-5, 0, 0, 0, 0, 0, 0, -5],
+     [-5, 0, 0, 0, 0, 0, 0, -5],
+     [-5, 0, 0, 0, 0, 0, 0, -5],
+     [-5, 0, 0, 0, 0, 0, 0, -5],
+     [-5, 0, 0, 0, 0, 0, 0, -5],
+     [5, 10, 10, 10, 10, 10, 10, 5],
+     [0, 0, 0, 0, 0, 0, 0, 0]],
+    # Queen
+    [[-20, -10, -10, -5, -5, -10, -10, -20],
+     [-10, 0, 5, 0, 0, 0, 0, -10],
+     [-10, 5, 5, 5, 5, 5, 0, -10],
+     [0, 0, 5, 5, 5, 5, 0, -5],
+     [-5, 0, 5, 5, 5, 5, 0, -5],
+     [-10, 0, 5, 5, 5, 5, 0, -10],
+     [-10, 0, 0, 0, 0, 0, 0, -10],
+     [-20, -10, -10, -5, -5, -10, -10, -20]],
+    # King
+    [[20, 30, 10, 0, 0, 10, 30, 20],
+     [20, 20, 0, 0, 0, 0, 20, 20],
+     [-10, -20, -20, -20, -20, -20, -20, -10],
+     [-20, -30, -30, -40, -40, -30, -30, -20],
+     [-30, -40, -40, -50, -50, -40, -40, -30],
+     [-30, -40, -40, -50, -50, -40, -40, -30],
+     [-30, -40, -40, -50, -50, -40, -40, -30],
+     [-30, -40, -40, -50, -50, -40, -40, -30]],
+]
+
+# In the endgame pawns should advance and the king should come to the
+# centre. The other pieces use the middlegame tables.
+ENDGAME_TABLES = PIECE_SQUARE_TABLES[:]
+ENDGAME_TABLES[PAWN] = [
+    [0] * 8, [0] * 8, [5] * 8, [10] * 8, [20] * 8, [35] * 8, [60] * 8,
+    [0] * 8,
+]
+ENDGAME_TABLES[KING] = [
+    [-50, -30, -30, -30, -30, -30, -30, -50],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+]
+
+# Game phase: the starting pieces add up to MAX_PHASE, and the endgame
+# score takes over as the knights, bishops, rooks and queens come off.
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0] * 2
+MAX_PHASE = 24
+
+# Pawn structure in centipawns (middlegame, endgame)
+DOUBLED_PAWN = (-10, -20)
+ISOLATED_PAWN = (-10, -15)
+# Bonus of a passed pawn by the number of rows it has advanced
+PASSED_PAWN = [
+    (0, 0), (5, 10), (10, 15), (15, 25), (25, 45), (40, 70), (60, 110),
+    (0, 0),
+]
+# King safety in middlegame centipawns: per pawn in front of the king (at
+# most three count) and per file next to the king without an own pawn
+SHIELD_PAWN = 10
+OPEN_FILE = -15
+
+PAWN_TABLE_SIZE = 1 << 14
+
+
+def _square_scores(values: List[int], tables: List) -> List[List[int]]:
+    """ Returns the material plus piece-square score of every piece on every
+    square from white's point of view, indexed [bitboard index][square].
+    Black uses the tables mirrored top to bottom. """
+    scores = [[0] * 64 for _ in range(12)]
+    for piece_type, table in enumerate(tables):
+        value = values[piece_type]
+        for square in range(64):
+            row, col = divmod(square, 8)
+            scores[piece_type][square] = value + table[row][col]
+            scores[piece_type + 6][square] = -value - table[7 - row][col]
+
+    return scores
+
+
+MIDGAME_SCORES = _square_scores(MIDGAME_VALUES, PIECE_SQUARE_TABLES)
+ENDGAME_SCORES = _square_scores(ENDGAME_VALUES, ENDGAME_TABLES)
+
+FILE_MASKS = [0x0101010101010101 << col for col in range(8)]
+ADJACENT_FILES = [
+    (FILE_MASKS[col - 1] if col > 0 else 0)
+    | (FILE_MASKS[col + 1] if col < 7 else 0)
+    for col in range(8)
+]
+
+
+def _passed_masks(team: int) -> List[int]:
+    """ Returns, for every square, the squares ahead of a pawn of the team
+    on its own and the adjacent files. A pawn is passed if no enemy pawn
+    stands on them. """
+    masks = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        rows = range(row + 1, 8) if team == WHITE else range(row)
+        ahead = sum(0xFF << (8 * ahead_row) for ahead_row in rows)
+        masks.append(ahead & (FILE_MASKS[col] | ADJACENT_FILES[col]))
+
+    return masks
+
+
+def _shield_masks(team: int) -> List[int]:
+    """ Returns, for every king square, the two rows of squares in front of
+    the king on its own and the adjacent files. """
+    masks = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        step = 1 if team == WHITE else -1
+        rows = [row + step, row + 2 * step]
+        files = FILE_MASKS[col] | ADJACENT_FILES[col]
+        masks.append(sum(
+            0xFF << (8 * shield_row) for shield_row in rows
+            if 0 <= shield_row < 8
+        ) & files)
+
+    return masks
+
+
+PASSED_MASKS = [_passed_masks(WHITE), _passed_masks(BLACK)]
+SHIELD_MASKS = [_shield_masks(WHITE), _shield_masks(BLACK)]
+
+
+def king_safety(pawns: int, king: int, team: int) -> int:
+    """ Returns the middlegame king safety of a team from its pawns and its
+    king square: the pawns sheltering the king and the files around it
+    without an own pawn. """
+    if king < 0:
+
+        return 0
+    shield = (pawns & SHIELD_MASKS[team][king]).bit_count()
+    score = SHIELD_PAWN * min(shield, 3)
+    col = king & 7
+    for file_col in (col - 1, col, col + 1):
+        if 0 <= file_col < 8 and not pawns & FILE_MASKS[file_col]:
+            score += OPEN_FILE
+
+    return score
+
+
+def pawn_structure(
+        white_pawns: int,
+        black_pawns: int,
+        white_king: int = -1,
+        black_king: int = -1
+) -> Tuple[int, int]:
+    """ Returns the (middlegame, endgame) score of the doubled, isolated and
+    passed pawns and of the king shelter from white's point of view. The
+    kings are given by their squares (-1 to leave the king safety out). """
+    midgame = (
+        king_safety(white_pawns, white_king, WHITE)
+        - king_safety(black_pawns, black_king, BLACK)
+    )
+    endgame = 0
+    for team, own, enemy in (
+            (WHITE, white_pawns, black_pawns),
+            (BLACK, black_pawns, white_pawns)):
+        sign = 1 if team == WHITE else -1
+        for col in range(8):
+            on_file = (own & FILE_MASKS[col]).bit_count()
+            if not on_file:
+                continue
+            if on_file > 1:
+                midgame += sign * DOUBLED_PAWN[0] * (on_file - 1)
+                endgame += sign * DOUBLED_PAWN[1] * (on_file - 1)
+            if not own & ADJACENT_FILES[col]:
+                midgame += sign * ISOLATED_PAWN[0] * on_file
+                endgame += sign * ISOLATED_PAWN[1] * on_file
+        pawns = own
+        passed_masks = PASSED_MASKS[team]
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            square = low.bit_length() - 1
+            if not enemy & passed_masks[square]:
+                advanced = square >> 3 if team == WHITE else 7 - (square >> 3)
+                midgame += sign * PASSED_PAWN[advanced][0]
+                endgame += sign * PASSED_PAWN[advanced][1]
+
+    return midgame, endgame
+
+
+class PawnTable:
+    """ Fixed-size cache of pawn structure scores, keyed by the pawns and
+    the king squares of both teams. A new formation replaces whatever was
+    stored in its slot.
+    Properties:
+        self.size: the number of slots.
+        self.probes, self.hits: lookups and lookups that were cached.
+    Methods:
+        self.score(): returns the pawn structure score of a formation.
+        self.clear(): empties the table.
+        self.stats(): returns the counters.
+    """
+
+    def __init__(self, size: int = PAWN_TABLE_SIZE):
+        self.size = size
+        self.keys = [None] * size
+        self.scores = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    def score(
+            self,
+            white_pawns: int,
+            black_pawns: int,
+            white_king: int,
+            black_king: int
+    ) -> Tuple[int, int]:
+        """ Returns pawn_structure for the pawns and kings, computing it only
+        if it isn't cached. """
+        self.probes += 1
+        key = (white_pawns, black_pawns, white_king, black_king)
+        slot = hash(key) % self.size
+        if self.keys[slot] == key:
+            self.hits += 1
+
+            return self.scores[slot]
+        score = pawn_structure(*key)
+        self.keys[slot] = key
+        self.scores[slot] = score
+
+        return score
+
+    def clear(self):
+        """ Empties the table and resets the counters. """
+        self.keys = [None] * self.size
+        self.scores = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def stats(self) -> Dict:
+        """ Returns the counters and the hit rate. """
+
+        return {
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+        }
+
+
+def evaluate(positions, pawn_table: PawnTable = None) -> int:
+    """ Returns the tapered score in centipawns from the point of view of
+    the side to move. The material and piece-square scores come straight
+    from positions.midgame and positions.endgame; the pawn structure and
+    king shelter come from pawn_table if one is given. """
+    bitboards = positions.bitboards
+    formation = (
+        bitboards[PAWN], bitboards[PAWN + 6],
+        bitboards[KING].bit_length() - 1, bitboards[KING + 6].bit_length() - 1,
+    )
+    if pawn_table is not None:
+        pawn_midgame, pawn_endgame = pawn_table.score(*formation)
+    else:
+        pawn_midgame, pawn_endgame = pawn_structure(*formation)
+
+    phase = min(positions.phase, MAX_PHASE)
+    midgame = positions.midgame + pawn_midgame
+    endgame = positions.endgame + pawn_endgame
+    if positions.turn:
+        # Turned before the division, which rounds down, so that a position
+        # and its mirror image score the same for the side to move
+        midgame, endgame = -midgame, -endgame
+
+    return (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def full_scores(positions) -> Tuple[int, int, int]:
+    """ Returns the middlegame, endgame and phase scores computed from every
+    square, which the incremental scores of positions always equal. """
+    midgame = endgame = phase = 0
+    for square, index in enumerate(positions.mailbox):
+        if index >= 0:
+            midgame += MIDGAME_SCORES[index][square]
+            endgame += ENDGAME_SCORES[index][square]
+            phase += PHASE_WEIGHTS[index]
+
+    return midgame, endgame, phase
@@ -0,0 +1,132 @@
+""" This module measures where the time of a turn goes. The game loop wraps
+its stages (parsing the input, validating the move, updating the positions,
+rendering the board) in Instrumentation.stage, counts events such as
+captures and rejected inputs, and can export the timings as percentiles to
+a JSON file. Hooks get every measurement as it's made, for example to
+forward it to a monitoring system. A cProfile capture can be switched on
+for a whole game with profile(). """
+import cProfile
+import json
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+# Number of recent measurements kept for every stage
+WINDOW = 10000
+PERCENTILES = (50, 90, 99)
+
+# A hook gets the name of the stage and its duration in seconds
+Hook = Callable[[str, float], None]
+
+
+def percentile(samples: List[float], share: float) -> float:
+    """ Returns the nearest-rank percentile (share from 0 to 100) of sorted
+    samples. """
+    if not samples:
+
+        return 0.0
+    rank = max(int(round(share / 100 * len(samples))) - 1, 0)
+
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Instrumentation:
+    """ Timers and counters of the game loop.
+    Properties:
+        self.timings: the most recent durations of every stage, in seconds.
+        self.counters: the number of moves, captures, rejected inputs etc.
+        self.hooks: functions called with every measurement.
+    Methods:
+        self.add_hook(): adds a function to call with every measurement.
+        self.stage(): context manager that times a stage.
+        self.count(): increases a counter.
+        self.end_turn(): records the time of the stages of a turn.
+        self.summary(): returns the percentiles and counters.
+        self.export(): writes the summary to a JSON file.
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.timings: Dict[str, deque] = {}
+        self.counters = Counter()
+        self.hooks: List[Hook] = []
+        self._turn = 0.0
+
+    def add_hook(self, hook: Hook):
+        """ Calls hook with the name and duration of every measurement. """
+        self.hooks.append(hook)
+
+    def record(self, name: str, seconds: float):
+        """ Stores the duration of a stage and passes it to the hooks. """
+        samples = self.timings.get(name)
+        if samples is None:
+            samples = self.timings[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+        for hook in self.hooks:
+            hook(name, seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ Times the code in the with block as the stage name. The time
+        also counts towards the current turn. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._turn += seconds
+            self.record(name, seconds)
+
+    def count(self, name: str, amount: int = 1):
+        """ Increases the counter name by amount. """
+        self.counters[name] += amount
+
+    def end_turn(self):
+        """ Records the time spent in the stages since the last turn ended as
+        the stage 'turn'. Time spent waiting for the players isn't part of
+        any stage, so it doesn't count. """
+        self.record('turn', self._turn)
+        self._turn = 0.0
+
+    def summary(self) -> Dict:
+        """ Returns, for every stage, the number of measurements in the
+        window and their mean, percentiles and maximum in milliseconds,
+        together with the counters. """
+        stages = {}
+        for name, samples in self.timings.items():
+            ordered = sorted(samples)
+            stats = {
+                'count': len(ordered),
+                'mean_ms': 1000 * sum(ordered) / len(ordered),
+                'max_ms': 1000 * ordered[-1],
+            }
+            for share in PERCENTILES:
+                stats[f'p{share}_ms'] = 1000 * percentile(ordered, share)
+            stages[name] = stats
+
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def export(self, path: str):
+        """ Writes the summary to path as JSON. """
+        with open(path, 'w') as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+
+
+@contextmanager
+def profile(path: str = None) -> Iterator[cProfile.Profile]:
+    """ Runs the with block under cProfile and, if path is given, writes the
+    statistics to it (readable with pstats or snakeviz). Without a path the
+    profiler does nothing. """
+    if path is None:
+        yield None
+
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,656 @@
+""" This module generates all pseudo-legal and legal moves for a side. The
+attack tables for knights, kings and pawns as well as the rays for the sliding
+pieces are computed once at import. Moves are returned as 16-bit move codes
+(see bitboards.encode_move). """
+from typing import Dict, Iterator, List
+from bitboards import (
+    WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, TEAMS,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE, FULL,
+    bit, iter_bits,
+)
+
+
+"""
+*******************************************************************************
+                                 Attack tables
+*******************************************************************************
+"""
+
+
+def _on_board(row: int, col: int) -> bool:
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _jump_table(offsets) -> List[int]:
+    """ Returns the attacked squares for every square for a piece that jumps
+    by the given (row, col) offsets. """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        mask = 0
+        for d_row, d_col in offsets:
+            if _on_board(row + d_row, col + d_col):
+                mask |= bit((row + d_row) * 8 + col + d_col)
+        table.append(mask)
+
+    return table
+
+
+KNIGHT_ATTACKS = _jump_table([
+    (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)
+])
+KING_ATTACKS = _jump_table([
+    (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)
+])
+# Squares attacked by a pawn of each team standing on the square
+PAWN_ATTACKS = [
+    _jump_table([(1, -1), (1, 1)]),
+    _jump_table([(-1, -1), (-1, 1)]),
+]
+
+# Ray directions as (row, col) steps. The first four increase the square
+# number, so the closest blocker is the lowest set bit. The last four decrease
+# it, so the closest blocker is the highest set bit.
+DIRECTIONS = [
+    (1, 0), (0, 1), (1, 1), (1, -1),
+    (-1, 0), (0, -1), (-1, -1), (-1, 1),
+]
+
+
+def _ray_table() -> List[List[int]]:
+    """ Returns RAYS[direction][square]: every square from (but excluding) the
+    square to the edge of the board in the direction. """
+    rays = []
+    for d_row, d_col in DIRECTIONS:
+        table = []
+        for square in range(64):
+            row, col = divmod(square, 8)
+            mask = 0
+            row, col = row + d_row, col + d_col
+            while _on_board(row, col):
+                mask |= bit(row * 8 + col)
+                row, col = row + d_row, col + d_col
+            table.append(mask)
+        rays.append(table)
+
+    return rays
+
+
+RAYS = _ray_table()
+(
+    NORTH, EAST, NORTH_EAST, NORTH_WEST,
+    SOUTH, WEST, SOUTH_WEST, SOUTH_EAST,
+) = RAYS
+
+
+def _between_table() -> List[List[int]]:
+    """ Returns BETWEEN[a][b]: the squares strictly between two squares on the
+    same row, column or diagonal (0 if they are not aligned). """
+    between = [[0] * 64 for _ in range(64)]
+    for d_row, d_col in DIRECTIONS:
+        for start in range(64):
+            row, col = divmod(start, 8)
+            passed = 0
+            row, col = row + d_row, col + d_col
+            while _on_board(row, col):
+                between[start][row * 8 + col] = passed
+                passed |= bit(row * 8 + col)
+                row, col = row + d_row, col + d_col
+
+    return between
+
+
+BETWEEN = _between_table()
+
+
+def _line_table() -> List[List[int]]:
+    """ Returns LINE[a][b]: the full line through two aligned squares,
+    including both of them (0 if they are not aligned). """
+    line = [[0] * 64 for _ in range(64)]
+    for index in range(4):
+        forward = RAYS[index]
+        backward = RAYS[index + 4]
+        for start in range(64):
+            full = forward[start] | backward[start] | bit(start)
+            for end in iter_bits(forward[start] | backward[start]):
+                line[start][end] = full
+
+    return line
+
+
+LINE = _line_table()
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    """ Returns the squares a rook on the square attacks, given the occupied
+    squares. """
+    attacks = NORTH[square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= NORTH[(blockers & -blockers).bit_length() - 1]
+    ray = EAST[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = WEST[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= WEST[blockers.bit_length() - 1]
+
+    return attacks | ray
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    """ Returns the squares a bishop on the square attacks, given the
+    occupied squares. """
+    attacks = NORTH_EAST[square]
+    blockers = attacks & occupied
+    if blockers:
+        attacks ^= NORTH_EAST[(blockers & -blockers).bit_length() - 1]
+    ray = NORTH_WEST[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= NORTH_WEST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_WEST[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_WEST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_EAST[square]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= SOUTH_EAST[blockers.bit_length() - 1]
+
+    return attacks | ray
+
+
+def queen_attacks(square: int, occupied: int) -> int:
+    """ Returns the squares a queen on the square attacks, given the occupied
+    squares. """
+
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+
+def piece_attacks(index: int, square: int, occupied: int) -> int:
+    """ Returns the squares attacked by the piece with the bitboard index
+    (0-11) standing on the square, given the occupied squares. """
+    piece_type = index % 6
+    if piece_type == PAWN:
+
+        return PAWN_ATTACKS[index // 6][square]
+    if piece_type == KNIGHT:
+
+        return KNIGHT_ATTACKS[square]
+    if piece_type == BISHOP:
+
+        return bishop_attacks(square, occupied)
+    if piece_type == ROOK:
+
+        return rook_attacks(square, occupied)
+    if piece_type == QUEEN:
+
+        return queen_attacks(square, occupied)
+
+    return KING_ATTACKS[square]
+
+
+def pin_rays(bitboards: List[int], team: int, occupied: int) -> Dict[int, int]:
+    """ Returns the pieces of the team that are pinned to their king, as a
+    dictionary from the square of the pinned piece to the line it may still
+    move along (the squares between the king and the pinning piece, plus the
+    pinning piece). """
+    king = bitboards[team * 6 + KING].bit_length() - 1
+    offset = (team ^ 1) * 6
+    queens = bitboards[offset + QUEEN]
+    snipers = (
+        (rook_attacks(king, 0) & (bitboards[offset + ROOK] | queens))
+        | (bishop_attacks(king, 0) & (bitboards[offset + BISHOP] | queens))
+    )
+    own = 0
+    for index in range(team * 6, team * 6 + 6):
+        own |= bitboards[index]
+    pins = {}
+    while snipers:
+        low = snipers & -snipers
+        snipers ^= low
+        sniper = low.bit_length() - 1
+        between = BETWEEN[king][sniper] & occupied
+        if between and not between & (between - 1) and between & own:
+            pins[between.bit_length() - 1] = BETWEEN[king][sniper] | low
+
+    return pins
+
+
+def attackers_to(
+        bitboards: List[int],
+        square: int,
+        team: int,
+        occupied: int
+) -> int:
+    """ Returns the pieces of the team (0 for white, 1 for black) that attack
+    the square, given the occupied squares. """
+    offset = team * 6
+    queens = bitboards[offset + QUEEN]
+
+    return (
+        (KNIGHT_ATTACKS[square] & bitboards[offset + KNIGHT])
+        | (PAWN_ATTACKS[team ^ 1][square] & bitboards[offset + PAWN])
+        | (KING_ATTACKS[square] & bitboards[offset + KING])
+        | (bishop_attacks(square, occupied)
+           & (bitboards[offset + BISHOP] | queens))
+        | (rook_attacks(square, occupied)
+           & (bitboards[offset + ROOK] | queens))
+    )
+
+
+"""
+*******************************************************************************
+                                Move generation
+*******************************************************************************
+"""
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+LAST_ROWS = 0xFF000000000000FF
+# Squares that have to be empty and squares that may not be attacked for each
+# castling move, together with the king's start and end square.
+CASTLING = [
+    (WHITE_KINGSIDE, 0x60, 0x70, 4, 6),
+    (WHITE_QUEENSIDE, 0x0E, 0x1C, 4, 2),
+    (BLACK_KINGSIDE, 0x60 << 56, 0x70 << 56, 60, 62),
+    (BLACK_QUEENSIDE, 0x0E << 56, 0x1C << 56, 60, 58),
+]
+
+
+def _team_index(positions, team) -> int:
+    """ Returns the team as 0 (white) or 1 (black). Defaults to the side to
+    move. """
+    if team is None:
+
+        return positions.turn
+    if isinstance(team, str):
+
+        return TEAMS.index(team)
+
+    return team
+
+
+def _add_pawn_moves(moves: List[int], start: int, end: int):
+    """ Adds a pawn move, expanded into the four promotions on the last row.
+    """
+    if (1 << end) & LAST_ROWS:
+        for piece_type in PROMOTIONS:
+            moves.append(start | (end << 6) | (piece_type << 12))
+    else:
+        moves.append(start | (end << 6))
+
+
+def generate_pseudo_legal_moves(positions, team=None) -> List[int]:
+    """ Returns all moves for the team that follow the piece move sets,
+    without checking whether the own king is left in check. Castling is only
+    generated when the king doesn't start, pass or end on an attacked square.
+    The team can be given as 'white'/'black' or 0/1 and defaults to the side
+    to move. """
+    us = _team_index(positions, team)
+    them = us ^ 1
+    bitboards = positions.bitboards
+    occupied = positions.occupied
+    own = positions.occupancy[us]
+    targets = ~own
+    enemies = positions.occupancy[them]
+    offset = us * 6
+    moves = []
+    append = moves.append
+
+    # Pawns
+    pawns = bitboards[offset + PAWN]
+    forward = 8 if us == WHITE else -8
+    start_row = 1 if us == WHITE else 6
+    ep_square = positions.en_passant_square
+    ep_mask = 0 if ep_square is None else 1 << ep_square
+    pawn_attacks = PAWN_ATTACKS[us]
+    while pawns:
+        low = pawns & -pawns
+        start = low.bit_length() - 1
+        pawns ^= low
+        end = start + forward
+        if not (occupied >> end) & 1:
+            _add_pawn_moves(moves, start, end)
+            if start >> 3 == start_row and not (
+                    occupied >> (end + forward)) & 1:
+                append(start | ((end + forward) << 6))
+        captures = pawn_attacks[start] & (enemies | ep_mask)
+        while captures:
+            low = captures & -captures
+            captures ^= low
+            _add_pawn_moves(moves, start, low.bit_length() - 1)
+
+    # Knights, bishops, rooks, queens and the king
+    for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+        pieces = bitboards[offset + piece_type]
+        while pieces:
+            low = pieces & -pieces
+            start = low.bit_length() - 1
+            pieces ^= low
+            if piece_type == KNIGHT:
+                attacks = KNIGHT_ATTACKS[start]
+            elif piece_type == BISHOP:
+                attacks = bishop_attacks(start, occupied)
+            elif piece_type == ROOK:
+                attacks = rook_attacks(start, occupied)
+            elif piece_type == QUEEN:
+                attacks = queen_attacks(start, occupied)
+            else:
+                attacks = KING_ATTACKS[start]
+            attacks &= targets
+            while attacks:
+                low = attacks & -attacks
+                attacks ^= low
+                append(start | ((low.bit_length() - 1) << 6))
+
+    # Castling
+    rights = positions.castling_rights
+    if rights:
+        attacked = positions.attacked_by(them)
+        for flag, empty, safe, king_start, king_end in CASTLING:
+            if not rights & flag or occupied & empty or attacked & safe:
+                continue
+            if (us == WHITE) == (king_start == 4):
+                append(king_start | (king_end << 6))
+
+    return moves
+
+
+def is_legal(positions, code: int, us: int) -> bool:
+    """ Checks that a pseudo-legal move doesn't leave the own king in check.
+    The move is played out on the occupancy masks only, so the positions are
+    not modified. """
+    start = code & 63
+    end = (code >> 6) & 63
+    bitboards = positions.bitboards
+    mailbox = positions.mailbox
+    them = us ^ 1
+    piece = mailbox[start]
+
+    captured = 0
+    if mailbox[end] != EMPTY:
+        captured = 1 << end
+    elif piece % 6 == PAWN and end == positions.en_passant_square:
+        captured = 1 << (end - 8 if us == WHITE else end + 8)
+    occupied = (positions.occupied & ~(1 << start) & ~captured) | (1 << end)
+
+    if piece % 6 == KING:
+        king = end
+    else:
+        king = (bitboards[us * 6 + KING]).bit_length() - 1
+
+    offset = them * 6
+    keep = ~captured
+    queens = bitboards[offset + QUEEN] & keep
+    if KNIGHT_ATTACKS[king] & bitboards[offset + KNIGHT] & keep:
+
+        return False
+    if PAWN_ATTACKS[us][king] & bitboards[offset + PAWN] & keep:
+
+        return False
+    if KING_ATTACKS[king] & bitboards[offset + KING]:
+
+        return False
+    if bishop_attacks(king, occupied) & (
+            (bitboards[offset + BISHOP] & keep) | queens):
+
+        return False
+    if rook_attacks(king, occupied) & (
+            (bitboards[offset + ROOK] & keep) | queens):
+
+        return False
+
+    return True
+
+
+def is_pseudo_legal_move(positions, code: int) -> bool:
+    """ Checks whether the piece of the side to move on the start square of
+    a single move code can reach the end square, without generating the other
+    moves and without checking the own king. Castling, which is rare, is
+    looked up in the pseudo-legal moves instead. """
+    start = code & 63
+    end = (code >> 6) & 63
+    promotion = code >> 12
+    if promotion and promotion not in PROMOTIONS:
+
+        return False
+    us = positions.turn
+    piece = positions.mailbox[start]
+    if piece == EMPTY or piece // 6 != us:
+
+        return False
+    if (positions.occupancy[us] >> end) & 1:
+
+        return False
+    occupied = positions.occupied
+    piece_type = piece % 6
+    if piece_type == PAWN:
+        if bool(promotion) != bool((1 << end) & LAST_ROWS):
+
+            return False
+        forward = 8 if us == WHITE else -8
+        if end == start + forward:
+            reachable = not (occupied >> end) & 1
+        elif end == start + 2 * forward:
+            reachable = (
+                start >> 3 == (1 if us == WHITE else 6)
+                and not (occupied >> end) & 1
+                and not (occupied >> (start + forward)) & 1
+            )
+        elif (PAWN_ATTACKS[us][start] >> end) & 1:
+            reachable = (
+                (positions.occupancy[us ^ 1] >> end) & 1
+                or end == positions.en_passant_square
+            )
+        else:
+            reachable = False
+    elif promotion:
+
+        return False
+    elif piece_type == KING and abs(end - start) == 2:
+
+        return code in generate_pseudo_legal_moves(positions, us)
+    else:
+        reachable = (piece_attacks(piece, start, occupied) >> end) & 1
+
+    return bool(reachable)
+
+
+def is_legal_move(positions, code: int) -> bool:
+    """ Checks whether a single move code is legal for the side to move,
+    without generating the other moves: is_pseudo_legal_move checks that the
+    piece can reach the end square and then is_legal checks the king. """
+
+    return (
+        is_pseudo_legal_move(positions, code)
+        and is_legal(positions, code, positions.turn)
+    )
+
+
+def generate_legal_moves(positions, team=None) -> List[int]:
+    """ Returns every legal move for the team as a list of move codes. The
+    team can be given as 'white'/'black' or 0/1 and defaults to the side to
+    move. Moves are filtered with the attack maps, checkers and pins kept by
+    the positions, so no move has to be played to test it. Only en passant
+    captures, which can uncover a check along the row, are played out on the
+    occupancy masks with is_legal. """
+    us = _team_index(positions, team)
+    them = us ^ 1
+    king = positions.bitboards[us * 6 + KING].bit_length() - 1
+    checkers = positions.checkers(us)
+    pins = positions.pins(us)
+    ep_square = positions.en_passant_square
+
+    # Squares the king can go to: not attacked, and not further along the
+    # line of a sliding piece that is giving check (the king itself hides
+    # that square from the attack map).
+    king_targets = KING_ATTACKS[king] & ~positions.attacked_by(them)
+    sliders = checkers & ~(
+        positions.bitboards[them * 6 + PAWN]
+        | positions.bitboards[them * 6 + KNIGHT]
+    )
+    while sliders:
+        low = sliders & -sliders
+        sliders ^= low
+        king_targets &= ~(LINE[king][low.bit_length() - 1] ^ low)
+
+    if checkers & (checkers - 1):
+        # Double check, only the king can move
+        targets = 0
+    elif checkers:
+        targets = checkers | BETWEEN[king][checkers.bit_length() - 1]
+    else:
+        targets = FULL
+
+    moves = []
+    for code in generate_pseudo_legal_moves(positions, us):
+        start = code & 63
+        end = (code >> 6) & 63
+        if start == king:
+            if (king_targets >> end) & 1 or (
+                    not checkers and abs(end - start) == 2):
+                moves.append(code)
+        elif end == ep_square and positions.mailbox[start] % 6 == PAWN:
+            if targets and is_legal(positions, code, us):
+                moves.append(code)
+        elif (targets >> end) & 1 and (
+                start not in pins or (pins[start] >> end) & 1):
+            moves.append(code)
+
+    return moves
+
+
+def _iter_piece_moves(positions, us: int, targets: int, pins: Dict[int, int]
+                      ) -> Iterator[int]:
+    """ Yields the legal moves of every piece except the king that end on one
+    of the target squares, piece by piece. Pinned pieces stay on their pin
+    line and en passant captures are checked with is_legal. """
+    bitboards = positions.bitboards
+    occupied = positions.occupied
+    offset = us * 6
+    enemies = positions.occupancy[us ^ 1]
+
+    # Knights and sliding pieces first, since they usually have the most moves
+    for piece_type in (KNIGHT, QUEEN, ROOK, BISHOP):
+        pieces = bitboards[offset + piece_type]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            start = low.bit_length() - 1
+            attacks = piece_attacks(offset + piece_type, start, occupied)
+            attacks &= targets & ~positions.occupancy[us]
+            if start in pins:
+                attacks &= pins[start]
+            while attacks:
+                low = attacks & -attacks
+                attacks ^= low
+                yield start | ((low.bit_length() - 1) << 6)
+
+    pawns = bitboards[offset + PAWN]
+    forward = 8 if us == WHITE else -8
+    start_row = 1 if us == WHITE else 6
+    ep_square = positions.en_passant_square
+    while pawns:
+        low = pawns & -pawns
+        pawns ^= low
+        start = low.bit_length() - 1
+        allowed = targets & pins.get(start, FULL)
+        ends = PAWN_ATTACKS[us][start] & enemies & allowed
+        end = start + forward
+        if not (occupied >> end) & 1:
+            ends |= (1 << end) & allowed
+            if start >> 3 == start_row and not (
+                    occupied >> (end + forward)) & 1:
+                ends |= (1 << (end + forward)) & allowed
+        while ends:
+            low = ends & -ends
+            ends ^= low
+            end = low.bit_length() - 1
+            if low & LAST_ROWS:
+                for piece_type in PROMOTIONS:
+                    yield start | (end << 6) | (piece_type << 12)
+            else:
+                yield start | (end << 6)
+        if ep_square is None or not (PAWN_ATTACKS[us][start] >> ep_square) & 1:
+            continue
+        # The captured pawn isn't on the end square, so the capture counts
+        # for the targets if either square is one
+        ep_targets = (1 << ep_square) | (1 << (ep_square - forward))
+        if targets & ep_targets:
+            code = start | (ep_square << 6)
+            if is_legal(positions, code, us):
+                yield code
+
+
+def iter_legal_moves(positions, team=None) -> Iterator[int]:
+    """ Yields the legal moves for the team one at a time, most likely
+    candidates first, so that a caller that only needs to know whether there
+    is a move can stop after the first one. In check, the king moves come
+    first, then captures of the checking piece and then blocks. The order
+    differs from generate_legal_moves. """
+    us = _team_index(positions, team)
+    them = us ^ 1
+    bitboards = positions.bitboards
+    king = bitboards[us * 6 + KING].bit_length() - 1
+    checkers = positions.checkers(us)
+    pins = positions.pins(us)
+
+    king_targets = (
+        KING_ATTACKS[king] & ~positions.occupancy[us]
+        & ~positions.attacked_by(them)
+    )
+    sliders = checkers & ~(
+        bitboards[them * 6 + PAWN] | bitboards[them * 6 + KNIGHT]
+    )
+    while sliders:
+        low = sliders & -sliders
+        sliders ^= low
+        king_targets &= ~(LINE[king][low.bit_length() - 1] ^ low)
+    while king_targets:
+        low = king_targets & -king_targets
+        king_targets ^= low
+        yield king | ((low.bit_length() - 1) << 6)
+
+    if checkers & (checkers - 1):
+
+        return
+    if checkers:
+        checker = checkers.bit_length() - 1
+        yield from _iter_piece_moves(positions, us, checkers, pins)
+        if BETWEEN[king][checker]:
+            yield from _iter_piece_moves(
+                positions, us, BETWEEN[king][checker], pins
+            )
+
+        return
+
+    yield from _iter_piece_moves(positions, us, FULL, pins)
+    rights = positions.castling_rights
+    if rights:
+        attacked = positions.attacked_by(them)
+        for flag, empty, safe, king_start, king_end in CASTLING:
+            if not rights & flag or positions.occupied & empty or (
+                    attacked & safe):
+                continue
+            if (us == WHITE) == (king_start == 4):
+                yield king_start | (king_end << 6)
+
+
+def has_legal_move(positions, team=None) -> bool:
+    """ Returns True as soon as one legal move for the team is found. """
+    for _ in iter_legal_moves(positions, team):
+
+        return True
+
+    return False
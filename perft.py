@@ -0,0 +1,220 @@
+""" Perft counts the leaf nodes of the move tree to a given depth. The counts
+are compared with known reference values to verify the move generation, and
+the speed is reported as nodes per second.
+
+Usage:
+    python perft.py                  run the reference suite
+    python perft.py --history perft_history.jsonl
+    python perft.py --depth 4        perft from the starting positions
+    python perft.py --fen "<fen>" --depth 3 --divide
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+import control
+from bitboards import move_to_uci
+from classes import Move, Positions
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Reference counts for depth 1, 2, 3... from the Chess Programming Wiki perft
+# results. Each position covers some of the special rules.
+REFERENCE_POSITIONS = {
+    'start': (STARTING_FEN, [20, 400, 8902, 197281]),
+    # Castling on both sides, pins and promotions
+    'kiwipete': (
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        [48, 2039, 97862],
+    ),
+    # En passant captures that expose the king along a row
+    'en_passant_pins': (
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        [14, 191, 2812, 43238],
+    ),
+    # Promotions with captures and lost castling rights
+    'promotions': (
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        [6, 264, 9467],
+    ),
+    'promotion_checks': (
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        [44, 1486, 62379],
+    ),
+    'middlegame': (
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - '
+        '0 10',
+        [46, 2079, 89890],
+    ),
+}
+
+
+def perft(positions: Positions, depth: int) -> int:
+    """ Returns the number of leaf nodes of the legal move tree. """
+    moves = positions.legal_moves()
+    if depth <= 1:
+
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for code in moves:
+        positions.make_move(code)
+        nodes += perft(positions, depth - 1)
+        positions.unmake_move()
+
+    return nodes
+
+
+def divide(positions: Positions, depth: int) -> Dict[str, int]:
+    """ Returns the perft count below each root move, keyed by the move. Used
+    to find the move where a count differs from a reference engine. """
+    counts = {}
+    for code in positions.legal_moves():
+        positions.make_move(code)
+        counts[move_to_uci(code)] = perft(positions, depth - 1)
+        positions.unmake_move()
+
+    return counts
+
+
+def check_rules(positions: Positions, depth: int) -> List[str]:
+    """ Walks the move tree and checks that the per-move rules used by the
+    game loop (check_positions, Piece.verify_move and
+    control.check_en_passant) accept every legal move. Castling isn't
+    supported by the game loop and is skipped. Returns the FEN and move of
+    every disagreement. """
+    failures = []
+    if depth == 0:
+
+        return failures
+
+    team = positions.side_to_move
+    en_passant = ['', '']
+    if positions.en_passant_square is not None:
+        en_passant = list(divmod(positions.en_passant_square, 8))
+    for code in positions.legal_moves():
+        uci = move_to_uci(code)
+        move = Move(uci[:4])
+        details = positions.check_positions(move)
+        piece = details['piece_start']
+        castling = piece.type == 'king' and abs(move.delta_cols) == 2
+        if not castling:
+            accepted = (
+                control.check_team_and_capture(
+                    team, piece.team, details['piece_end']
+                )
+                and not details['blocked']
+                and (
+                    control.check_en_passant(
+                        piece.type, move.end.get_coordinates(), en_passant
+                    )
+                    or piece.verify_move(
+                        move=move, captured_piece=details['piece_end']
+                    )
+                )
+            )
+            if not accepted:
+                failures.append(f'{positions.to_fen()} {uci}')
+        positions.make_move(code)
+        failures.extend(check_rules(positions, depth - 1))
+        positions.unmake_move()
+
+    return failures
+
+
+def timed_perft(positions: Positions, depth: int) -> Dict:
+    """ Runs perft and returns the node count, the time taken and the nodes
+    per second. """
+    start = time.perf_counter()
+    nodes = perft(positions, depth)
+    seconds = time.perf_counter() - start
+
+    return {
+        'depth': depth,
+        'nodes': nodes,
+        'seconds': seconds,
+        'nps': nodes / seconds if seconds > 0 else 0.0,
+    }
+
+
+def run_suite(
+        max_depth: int = 3,
+        history_file: str = None
+) -> bool:
+    """ Runs perft on every reference position up to max_depth, checks the
+    counts and the game loop rules, prints the results and, if a history
+    file is given, appends them to it (one JSON object per line). Returns
+    True if everything matched. """
+    passed = True
+    timestamp = datetime.now(timezone.utc).isoformat()
+    records = []
+    for name, (fen, expected_counts) in REFERENCE_POSITIONS.items():
+        for depth, expected in enumerate(expected_counts[:max_depth], 1):
+            result = timed_perft(Positions(fen), depth)
+            result.update({
+                'timestamp': timestamp,
+                'position': name,
+                'expected': expected,
+                'passed': result['nodes'] == expected,
+            })
+            records.append(result)
+            passed = passed and result['passed']
+            status = 'ok'
+            if not result['passed']:
+                status = f'FAILED, expected {expected}'
+            print(
+                f"{name:<18} depth {depth}  {result['nodes']:>9} nodes  "
+                f"{result['nps']:>10.0f} nps  {status}"
+            )
+        failures = check_rules(Positions(fen), min(max_depth, 2))
+        for failure in failures:
+            print(f'{name:<18} rules rejected legal move: {failure}')
+        passed = passed and not failures
+
+    if history_file:
+        with open(history_file, 'a') as history:
+            for record in records:
+                history.write(json.dumps(record) + '\n')
+
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--fen', help='position to count from')
+    parser.add_argument('--depth', type=int, help='depth to count to')
+    parser.add_argument(
+        '--divide', action='store_true',
+        help='break the count down per root move'
+    )
+    parser.add_argument(
+        '--max-depth', type=int, default=3,
+        help='deepest reference count to check in the suite'
+    )
+    parser.add_argument(
+        '--history',
+        help='JSON lines file to append the suite results to'
+    )
+    args = parser.parse_args()
+
+    if args.fen is None and args.depth is None:
+        raise SystemExit(0 if run_suite(args.max_depth, args.history) else 1)
+
+    positions = Positions(args.fen) if args.fen else Positions()
+    depth = args.depth or 1
+    if args.divide:
+        counts = divide(positions, depth)
+        for uci, nodes in sorted(counts.items()):
+            print(f'{uci}: {nodes}')
+        print(f'\nMoves: {len(counts)}\nNodes: {sum(counts.values())}')
+    else:
+        result = timed_perft(positions, depth)
+        print(
+            f"Nodes: {result['nodes']}\nTime: {result['seconds']:.3f} s\n"
+            f"Nodes per second: {result['nps']:.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+""" This module reads games in PGN (Portable Game Notation). Games are read
+one at a time from plain or gzip-compressed files, so only the game being
+read is held in memory however large the file is. The moves are given in
+SAN (standard algebraic notation, for example "Nbd7" or "exd5") and are
+turned into move codes with the bitboards, and the replayer plays them on
+Positions and checks them against the legal moves.
+
+Usage:
+    python pgn.py games.pgn.gz
+    python pgn.py games.pgn --workers 8 --uci games.txt
+"""
+import argparse
+import gzip
+import re
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, TextIO
+from bitboards import (
+    WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, SQUARE_NAMES, bit,
+    iter_bits, move_to_uci, popcount,
+)
+from classes import Positions
+from movegen import PAWN_ATTACKS, piece_attacks
+from pool import pool_map
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+# Movetext tokens: comments, variations, NAGs ("$1") and everything else up
+# to the next space or bracket. Comments in braces can continue on the next
+# lines.
+TOKENS = re.compile(r'\{[^}]*\}?|;.*|[()]|\$\d+|[^\s{}();$]+')
+# Move numbers in front of a move, like "12." or "12...". Castling written
+# with zeros ("0-0") doesn't match, since the dots are required.
+MOVE_NUMBER = re.compile(r'^\d+\.+')
+FILE_MASKS = [0x0101010101010101 << col for col in range(8)]
+ROW_MASKS = [0xFF << (8 * row) for row in range(8)]
+# Games handed to a worker process at a time by the bulk replayer
+BATCH_SIZE = 256
+
+
+class Game:
+    """ A game read from a PGN file.
+    Properties:
+        self.tags: the tag pairs, for example {'White': 'Carlsen'}.
+        self.moves: the moves in SAN, without comments or variations.
+        self.result: the result from the movetext, or '*'.
+    """
+
+    def __init__(self):
+        self.tags = {}
+        self.moves = []
+        self.result = '*'
+
+    def starting_positions(self) -> Positions:
+        """ Returns the positions the game starts from, which is given by
+        the FEN tag if there is one. """
+        fen = self.tags.get('FEN')
+
+        return Positions(fen) if fen else Positions()
+
+    def __repr__(self):
+
+        return (
+            f"{self.tags.get('White', '?')} - {self.tags.get('Black', '?')} "
+            f"{self.result} ({len(self.moves)} plies)"
+        )
+
+
+def open_pgn(path: str) -> TextIO:
+    """ Opens a PGN file as text, decompressing it if it starts with the
+    gzip magic number. Characters that aren't UTF-8 are replaced. """
+    with open(path, 'rb') as pgn:
+        compressed = pgn.read(2) == b'\x1f\x8b'
+    if compressed:
+
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def read_games(lines: Iterable[str]) -> Iterator[Game]:
+    """ Yields the games in the lines of a PGN file, one at a time. A game
+    ends with its result, or where the tags of the next game start. """
+    game = Game()
+    in_comment = False
+    depth = 0
+    for line in lines:
+        if in_comment:
+            end = line.find('}')
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            in_comment = False
+        stripped = line.strip()
+        if not stripped or stripped[0] == '%':
+            continue
+        if stripped[0] == '[' and not depth:
+            if game.moves:
+                yield game
+                game = Game()
+            name, _, value = stripped[1:].partition(' ')
+            value = value.rstrip(']').strip()
+            if value[:1] == '"':
+                value = value[1:-1] if value.endswith('"') else value[1:]
+            game.tags[name] = value.replace('\\"', '"')
+            continue
+
+        for token in TOKENS.findall(line):
+            first = token[0]
+            if first == '{':
+                in_comment = not token.endswith('}')
+            elif first == '(':
+                depth += 1
+            elif first == ')':
+                depth = max(depth - 1, 0)
+            elif depth or first in ';$':
+                continue
+            elif token in RESULTS:
+                game.result = token
+                yield game
+                game = Game()
+            else:
+                move = MOVE_NUMBER.sub('', token)
+                if move:
+                    game.moves.append(move)
+    if game.moves:
+        yield game
+
+
+def read_file(path: str) -> Iterator[Game]:
+    """ Yields the games of a PGN file, see read_games. """
+    with open_pgn(path) as lines:
+        yield from read_games(lines)
+
+
+"""
+*******************************************************************************
+                                      SAN
+*******************************************************************************
+"""
+
+
+def parse_san(positions: Positions, san: str) -> int:
+    """ Returns the move code of a move in SAN for the side to move. The
+    piece that moves is found from the attack sets instead of by generating
+    all moves: the pieces of the right type that reach the destination,
+    narrowed down by the file or row in the SAN and, if that isn't enough,
+    by the pins. Raises ValueError if no piece or more than one can make the
+    move. The move isn't checked to be legal otherwise (for example that it
+    gets out of check). """
+    move = san.rstrip('+#!?')
+    us = positions.turn
+    if move in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = 4 + 56 * us
+        end = king + 2 if len(move) == 3 else king - 2
+
+        return king | end << 6
+
+    promotion = 0
+    if '=' in move:
+        move, _, letter = move.partition('=')
+        promotion = SAN_PIECES.get(letter[:1].upper(), 0)
+    elif move[-1:] in 'NBRQ' and move[:1].islower():
+        promotion = SAN_PIECES[move[-1]]
+        move = move[:-1]
+    if len(move) < 2 or move[-2:] not in SQUARE_NAMES:
+        raise ValueError(f'{san} is not a move')
+    end = SQUARE_NAMES.index(move[-2:])
+    piece_type = SAN_PIECES.get(move[0], PAWN)
+    hints = move[1 if piece_type != PAWN else 0:-2].replace('x', '')
+
+    index = us * 6 + piece_type
+    if piece_type == PAWN:
+        # Pawns that capture towards the square or push onto it
+        if 'x' in move:
+            candidates = PAWN_ATTACKS[us ^ 1][end]
+        else:
+            step = -8 if us == WHITE else 8
+            candidates = bit(end + step) if 0 <= end + step < 64 else 0
+            if not positions.occupied & candidates and end >> 3 in (3, 4):
+                candidates = bit(end + 2 * step)
+    else:
+        candidates = piece_attacks(index, end, positions.occupied)
+    candidates &= positions.bitboards[index]
+    for hint in hints:
+        if hint in 'abcdefgh':
+            candidates &= FILE_MASKS[ord(hint) - ord('a')]
+        elif hint in '12345678':
+            candidates &= ROW_MASKS[int(hint) - 1]
+    if popcount(candidates) > 1:
+        pins = positions.pins()
+        for start in iter_bits(candidates):
+            if start in pins and not pins[start] & bit(end):
+                candidates ^= bit(start)
+    if popcount(candidates) != 1:
+        problem = 'ambiguous' if candidates else 'impossible'
+        raise ValueError(f'{san} is {problem} in {positions.to_fen()}')
+    start = candidates.bit_length() - 1
+
+    return start | end << 6 | promotion << 12
+
+
+"""
+*******************************************************************************
+                                    Replay
+*******************************************************************************
+"""
+
+
+def replay_game(game: Game) -> Dict:
+    """ Plays the moves of a game from its starting positions, checking
+    every move against the legal moves. Returns the moves as move strings,
+    the number of plies played, the final positions as FEN and, if a move
+    couldn't be played, the error. """
+    positions = game.starting_positions()
+    moves = []
+    error = ''
+    for san in game.moves:
+        try:
+            code = parse_san(positions, san)
+        except ValueError as exception:
+            error = str(exception)
+            break
+        if code not in positions.legal_moves():
+            error = f'{san} is illegal in {positions.to_fen()}'
+            break
+        positions.make_move(code)
+        moves.append(move_to_uci(code))
+
+    return {
+        'tags': game.tags,
+        'result': game.result,
+        'moves': moves,
+        'plies': len(moves),
+        'fen': positions.to_fen(),
+        'error': error,
+    }
+
+
+def replay_games(
+        games: Iterable[Game],
+        workers: int = 1,
+) -> Iterator[Dict]:
+    """ Replays the games, in order. With more than one worker (or None for
+    one per CPU) the games are replayed on a process pool, a batch of games
+    at a time, so that no more than a few batches are in memory at once. """
+
+    return pool_map(replay_game, games, workers, BATCH_SIZE)
+
+
+def replay_file(
+        path: str,
+        workers: int = 1,
+        limit: int = None,
+        uci_file: TextIO = None
+) -> Dict:
+    """ Replays the games of a PGN file (the first limit games if given) and
+    returns the number of games, plies and games with errors, and the
+    games and plies per second. With uci_file, the moves of every game are
+    written to it, one game per line, as read by book.read_games. """
+    start = time.perf_counter()
+    games = read_file(path)
+    if limit is not None:
+        games = islice(games, limit)
+    count = plies = errors = 0
+    for result in replay_games(games, workers):
+        count += 1
+        plies += result['plies']
+        if result['error']:
+            errors += 1
+        if uci_file is not None:
+            uci_file.write(' '.join(result['moves']) + '\n')
+    seconds = time.perf_counter() - start
+
+    return {
+        'games': count,
+        'plies': plies,
+        'errors': errors,
+        'seconds': seconds,
+        'games_per_second': count / seconds if seconds > 0 else 0.0,
+        'plies_per_second': plies / seconds if seconds > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('pgn', help='PGN file, optionally gzip-compressed')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='processes to replay the games on (0 for one per CPU)'
+    )
+    parser.add_argument('--limit', type=int, help='games to replay')
+    parser.add_argument(
+        '--uci', help='file to write the moves of every game to'
+    )
+    args = parser.parse_args()
+
+    uci_file = open(args.uci, 'w') if args.uci else None
+    try:
+        stats = replay_file(
+            args.pgn, args.workers or None, args.limit, uci_file
+        )
+    finally:
+        if uci_file is not None:
+            uci_file.close()
+    print(
+        f"Games: {stats['games']} ({stats['errors']} with errors)\n"
+        f"Plies: {stats['plies']}\n"
+        f"Time: {stats['seconds']:.2f} s\n"
+        f"Games per second: {stats['games_per_second']:.1f}\n"
+        f"Plies per second: {stats['plies_per_second']:.0f}"
+    )
+
+
+if __name__ == '__main__':
+    main()
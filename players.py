@@ -1,5 +1,5 @@
 """ This module contains the player class. """
-from numpy.random import randint
+import random
 from typing import List, Generator
 
 
@@ -16,7 +16,7 @@ class Player:
     def assign_first_team(self):
         """ Randomly assigns a team to the player and returns the other colour,
         to be assigned to the other player. """
-        idx = randint(2, size=1)[0]
+        idx = random.randrange(2)
         team = Player.teams[idx]
         self.team = team
 
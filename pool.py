@@ -0,0 +1,58 @@
+""" This module runs the bulk jobs of the other modules (batches of games,
+validation, replays, renders and the parallel search) on a process pool. The
+pool machinery is only imported when a pool is started, so that the modules
+don't pay for it when they're used one game at a time. """
+import os
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+
+def process_pool(
+        workers: int = None,
+        initializer: Callable = None,
+        initargs: Tuple = ()
+):
+    """ Returns a new ProcessPoolExecutor with workers processes (by default
+    one per CPU). Every worker calls initializer(*initargs) when it starts. """
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    )
+
+
+def _apply(function: Callable, chunk: List) -> List:
+    """ Worker function of pool_map. """
+
+    return [function(item) for item in chunk]
+
+
+def pool_map(
+        function: Callable,
+        items: Iterable,
+        workers: int = None,
+        chunksize: int = 1
+) -> Iterator:
+    """ Yields function(item) for every item, in order. With workers=1 the
+    items are processed in this process. Otherwise they're sent to a pool of
+    workers processes (None for one per CPU) in chunks of chunksize, and
+    only a few chunks per worker are read ahead, so items can be a stream
+    that doesn't fit in memory. The function has to be defined at module
+    level, so that it can be sent to the workers. """
+    if workers == 1:
+        for item in items:
+            yield function(item)
+
+        return
+
+    workers = workers or os.cpu_count() or 1
+    items = iter(items)
+    with process_pool(workers) as executor:
+        pending = deque()
+        for chunk in iter(lambda: list(islice(items, chunksize)), []):
+            pending.append(executor.submit(_apply, function, chunk))
+            if len(pending) > 2 * workers:
+                yield from pending.popleft().result()
+        for future in pending:
+            yield from future.result()
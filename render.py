@@ -0,0 +1,335 @@
+""" This module renders games to image files without a window, for example
+to make replays of finished games. The board is drawn once with the Agg
+backend and kept as an image, and so is every piece. A frame is made by
+copying the board image and pasting the pieces onto their squares with
+NumPy, so no figure is redrawn per move. Many games can be rendered in
+parallel on a process pool.
+
+Usage:
+    python render.py moves "e2e4 e7e5 g1f3" replay.gif
+    python render.py archive games.cga replays --count 100 --workers 4
+    python render.py archive games.cga frames --format png --first 12
+
+A replay is written as an animated GIF, an MP4 video (which needs ffmpeg)
+or a directory with a PNG image per position.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+from typing import Dict, Iterable, Iterator, List, Union
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from bitboards import EMPTY
+from board import _create_board
+from classes import PIECES, Positions
+from pool import pool_map
+from runner import parse_move
+
+FORMATS = ('gif', 'mp4', 'png')
+DEFAULT_DPI = 100
+DEFAULT_FPS = 2
+LAST_MOVE_COLOR = (0, 0, 255)
+
+
+def _rgba(canvas: FigureCanvasAgg) -> np.ndarray:
+    """ Returns a copy of what was last drawn on the canvas. """
+
+    return np.array(canvas.buffer_rgba(), dtype=np.uint8)
+
+
+class GameRenderer:
+    """ Draws positions to images without a window.
+    Properties:
+        self.dpi: the resolution of the images.
+        self.background: the empty board as an RGBA image.
+        self.sprites: for every piece (by bitboard index), the piece colours
+            multiplied by their opacity and the share of the square that
+            shows through.
+        self.centres: for every square, the pixel of its centre.
+        self.box, self.boxes: the size of the box around a square, and the
+            top left pixel of the box of every square.
+    Methods:
+        self.render(): returns the image of positions.
+        self.render_game(): yields the images of every position of a game.
+    """
+
+    def __init__(self, dpi: int = DEFAULT_DPI):
+        """ Draws the board and every piece once. """
+        self.dpi = dpi
+        fig = Figure(figsize=(4.5, 4.5), dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        board = _create_board(fig)
+        canvas.draw()
+        self.background = _rgba(canvas)
+        height = self.background.shape[0]
+
+        # Square centres in pixels, with rows counted from the top
+        ax_board = board['board']
+        centres = ax_board.transData.transform(
+            [(col, row) for row in range(8) for col in range(8)]
+        )
+        self.centres = [(height - y, x) for x, y in centres]
+        size = ax_board.transData.transform([(1, 0)])[0][0] - centres[0][0]
+        self.box = int(round(size))
+        half = self.box / 2
+        self.boxes = [
+            (int(round(row - half)), int(round(col - half)))
+            for row, col in self.centres
+        ]
+
+        # Every piece on its own on a transparent figure, cut out of the box
+        # of a square in the middle of the board
+        fig.patch.set_alpha(0)
+        for ax in fig.axes:
+            ax.set_visible(ax is ax_board)
+        for artist in ax_board.images + ax_board.texts + list(
+                ax_board.spines.values()):
+            artist.set_visible(False)
+        ax_board.patch.set_visible(False)
+        for text in fig.texts:
+            text.set_visible(False)
+        square = 27
+        top, left = self.boxes[square]
+        self.sprites = []
+        for piece in PIECES:
+            scatter = ax_board.scatter(
+                [square % 8], [square // 8], marker=piece.marker,
+                color=piece.color, s=piece.size
+            )
+            canvas.draw()
+            scatter.remove()
+            sprite = _rgba(canvas)[top:top + self.box, left:left + self.box]
+            alpha = sprite[..., 3:4].astype(np.float32) / 255
+            self.sprites.append((
+                sprite[..., :3].astype(np.float32) * alpha,
+                1 - alpha,
+            ))
+
+    def _paste(self, frame: np.ndarray, index: int, square: int):
+        """ Blends a piece onto the box of a square. """
+        top, left = self.boxes[square]
+        colours, shows_through = self.sprites[index]
+        box = frame[top:top + self.box, left:left + self.box, :3]
+        box[...] = (box * shows_through + colours).astype(np.uint8)
+
+    def _draw_line(self, frame: np.ndarray, start: int, end: int):
+        """ Draws the last move as a line between the square centres. """
+        (row_1, col_1), (row_2, col_2) = self.centres[start], self.centres[end]
+        steps = int(max(abs(row_2 - row_1), abs(col_2 - col_1))) + 1
+        rows = np.linspace(row_1, row_2, steps).round().astype(int)
+        cols = np.linspace(col_1, col_2, steps).round().astype(int)
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                frame[rows + d_row, cols + d_col, :3] = LAST_MOVE_COLOR
+
+    def render(
+            self,
+            positions: Positions,
+            last_move: int = None
+    ) -> np.ndarray:
+        """ Returns the image of the positions, as an RGBA array of shape
+        (height, width, 4). last_move is the move code of a move to mark.
+        """
+        frame = self.background.copy()
+        for square, index in enumerate(positions.mailbox):
+            if index != EMPTY:
+                self._paste(frame, index, square)
+        if last_move is not None:
+            self._draw_line(frame, last_move & 63, (last_move >> 6) & 63)
+
+        return frame
+
+    def render_game(
+            self,
+            moves: Iterable[Union[int, str]],
+            fen: str = None
+    ) -> Iterator[np.ndarray]:
+        """ Yields the image of the starting positions and of the positions
+        after every move. The moves are move codes or move strings, and they
+        aren't checked. """
+        positions = Positions(fen or None)
+        yield self.render(positions)
+        for move in moves:
+            code = parse_move(move)
+            positions.make_move(code)
+            yield self.render(positions, code)
+
+
+def save_frames(
+        frames: Iterable[np.ndarray],
+        path: str,
+        fps: float = DEFAULT_FPS,
+        output_format: str = None
+) -> str:
+    """ Writes the frames to path as an animated GIF, an MP4 video or a
+    directory of PNG images. The format is taken from the extension of path
+    if it isn't given. Returns path. """
+    if output_format is None:
+        extension = os.path.splitext(path)[1].lower().lstrip('.')
+        output_format = extension if extension in FORMATS else 'png'
+    # Pillow is installed along with matplotlib
+    from PIL import Image
+
+    if output_format == 'png':
+        os.makedirs(path, exist_ok=True)
+        for number, frame in enumerate(frames):
+            Image.fromarray(frame).save(
+                os.path.join(path, f'{number:04d}.png')
+            )
+    elif output_format == 'gif':
+        # One palette for the whole game, taken from the first two frames
+        # (the second shows the colour of the last move line), so that the
+        # frames don't have to be quantised and compared one by one
+        frames = [frame[..., :3] for frame in frames]
+        palette = Image.fromarray(np.concatenate(frames[:2])).quantize(
+            colors=256, dither=Image.Dither.NONE
+        )
+        images = [
+            Image.fromarray(frame).quantize(
+                palette=palette, dither=Image.Dither.NONE
+            )
+            for frame in frames
+        ]
+        images[0].save(
+            path, save_all=True, append_images=images[1:], loop=0,
+            duration=int(1000 / fps), optimize=False
+        )
+    elif output_format == 'mp4':
+        _write_video(frames, path, fps)
+    else:
+        raise ValueError(f'Unknown format {output_format}')
+
+    return path
+
+
+def _write_video(frames: Iterable[np.ndarray], path: str, fps: float):
+    """ Pipes the frames to ffmpeg. """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('Writing MP4 videos needs ffmpeg')
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    command = [
+        ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo',
+        '-pix_fmt', 'rgba', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        '-pix_fmt', 'yuv420p', path,
+    ]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        process.stdin.write(first.tobytes())
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+    if process.returncode:
+        raise RuntimeError(f'ffmpeg failed to write {path}')
+
+
+"""
+*******************************************************************************
+                                 Batch rendering
+*******************************************************************************
+"""
+# The renderer of a worker process, created by its first job
+_worker_renderer = None
+
+
+def render_job(job: Dict) -> str:
+    """ Renders one game and returns the file it was written to. A job has
+    the output path and either the moves (and optionally the starting fen)
+    or an archive file and the number of a game in it. Optional keys are
+    fps, format and dpi. """
+    global _worker_renderer
+    dpi = job.get('dpi', DEFAULT_DPI)
+    if _worker_renderer is None or _worker_renderer.dpi != dpi:
+        _worker_renderer = GameRenderer(dpi)
+
+    if 'archive' in job:
+        # Imported here, so that rendering move lists doesn't need it
+        from archive import GameArchive
+        with GameArchive(job['archive']) as archive:
+            game = archive.game(job['game'])
+        moves, fen = game['moves'], game['start_fen']
+    else:
+        moves, fen = job['moves'], job.get('fen')
+
+    return save_frames(
+        _worker_renderer.render_game(moves, fen), job['output'],
+        job.get('fps', DEFAULT_FPS), job.get('format')
+    )
+
+
+def render_games(jobs: Iterable[Dict], workers: int = None) -> List[str]:
+    """ Renders many games, see render_job, on a process pool with workers
+    processes (by default one per CPU). Every worker draws the board and
+    pieces once and reuses them for all its games. Returns the written
+    files in the order of the jobs. """
+
+    return list(pool_map(render_job, jobs, workers))
+
+
+def _archive_jobs(
+        path: str,
+        directory: str,
+        numbers: Iterable[int],
+        output_format: str
+) -> Iterator[Dict]:
+    for number in numbers:
+        name = f'game_{number:06d}'
+        if output_format != 'png':
+            name += '.' + output_format
+        yield {
+            'archive': path,
+            'game': number,
+            'output': os.path.join(directory, name),
+            'format': output_format,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    moves = commands.add_parser('moves', help='render a list of moves')
+    moves.add_argument('moves', help='moves such as "e2e4 e7e5"')
+    moves.add_argument('output', help='GIF or MP4 file, or PNG directory')
+    moves.add_argument('--fen', help='positions to start from')
+    archive = commands.add_parser('archive', help='render archived games')
+    archive.add_argument('archive', help='archive file, see archive.py')
+    archive.add_argument('directory', help='directory to write to')
+    archive.add_argument('--first', type=int, default=0, help='first game')
+    archive.add_argument('--count', type=int, default=1, help='games')
+    archive.add_argument('--format', choices=FORMATS, default='gif')
+    archive.add_argument(
+        '--workers', type=int, default=0,
+        help='processes to render on (0 for one per CPU)'
+    )
+    for command in (moves, archive):
+        command.add_argument('--fps', type=float, default=DEFAULT_FPS)
+        command.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    args = parser.parse_args()
+
+    if args.command == 'moves':
+        path = render_job({
+            'moves': args.moves.split(), 'fen': args.fen,
+            'output': args.output, 'fps': args.fps, 'dpi': args.dpi,
+        })
+        print(f'Wrote {path}')
+
+        return
+
+    os.makedirs(args.directory, exist_ok=True)
+    jobs = [
+        dict(job, fps=args.fps, dpi=args.dpi)
+        for job in _archive_jobs(
+            args.archive, args.directory,
+            range(args.first, args.first + args.count), args.format
+        )
+    ]
+    paths = render_games(jobs, args.workers or None)
+    print(f'Wrote {len(paths)} games to {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+""" This module plays games without the board window or any input, either
+from a list of moves or from two functions that choose the moves. Many games
+can be played in parallel on a process pool. """
+import random
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Union
+from bitboards import EMPTY, move_to_uci
+from classes import PIECES, Move, Positions
+from control import DRAWS, check_game_end
+from pool import pool_map
+
+# A move chooser gets the positions and the random number generator of the
+# game, and returns a move code or a move string such as "e2e4" (or "e7e8q"
+# for a promotion).
+MoveChooser = Callable[[Positions, random.Random], Union[int, str]]
+
+
+def parse_move(move: Union[int, str]) -> int:
+    """ Returns the move code for a move string, or the move code itself.
+    Raises ValueError if the string isn't a move. """
+    if isinstance(move, int):
+
+        return move
+
+    return Move.from_uci(move.lower().strip()).code
+
+
+def random_move(
+        positions: Positions,
+        chooser: random.Random = random
+) -> int:
+    """ Move chooser that picks a random legal move. """
+
+    return chooser.choice(positions.legal_moves())
+
+
+class GameRunner:
+    """ Plays a single game headlessly.
+    Properties:
+        self.positions: the Positions the game is played on.
+        self.start_fen: the FEN the game started from, '' for the starting
+            positions.
+        self.moves: the moves played so far, as move codes.
+        self.random: the random number generator given to the choosers.
+    Methods:
+        self.play(): plays the game to the end and returns the result.
+    """
+
+    def __init__(
+            self,
+            moves: Iterable[Union[int, str]] = None,
+            white: MoveChooser = None,
+            black: MoveChooser = None,
+            fen: str = None,
+            max_plies: int = 400,
+            seed: int = None,
+    ):
+        """ Either a list of moves or two move choosers have to be given. When
+        both are given, the listed moves are played first and the choosers
+        take over afterwards. The choosers share a random.Random seeded with
+        seed, so a game with a seed can be played again. """
+        self.positions = Positions(fen)
+        self.start_fen = fen or ''
+        self.script = list(moves) if moves is not None else []
+        self.choosers = [white, black]
+        self.max_plies = max_plies
+        self.moves = []
+        self.random = random.Random(seed)
+        self.points = {'white': 0, 'black': 0}
+
+    def _next_move(self) -> Union[int, str, None]:
+        """ Returns the next scripted move, or asks the chooser of the side to
+        move. Returns None if neither has a move. """
+        ply = len(self.moves)
+        if ply < len(self.script):
+
+            return self.script[ply]
+        chooser = self.choosers[self.positions.turn]
+        if chooser is None:
+
+            return None
+
+        return chooser(self.positions, self.random)
+
+    def _result(self, termination: str, winner: str = None) -> Dict:
+        """ Collects the outcome of the game in a dictionary. """
+        if winner == 'white':
+            result = '1-0'
+        elif winner == 'black':
+            result = '0-1'
+        elif termination in DRAWS:
+            result = '1/2-1/2'
+        else:
+            result = '*'
+
+        return {
+            'result': result,
+            'termination': termination,
+            'winner': winner,
+            'plies': len(self.moves),
+            'moves': [move_to_uci(code) for code in self.moves],
+            'points': dict(self.points),
+            'start_fen': self.start_fen,
+            'fen': self.positions.to_fen(),
+        }
+
+    def play(self) -> Dict:
+        """ Plays until checkmate, a draw (see control.check_game_end), an
+        illegal move, the end of the scripted moves or max_plies. Returns the
+        result as a dictionary. """
+        positions = self.positions
+        while len(self.moves) < self.max_plies:
+            team = positions.side_to_move
+            game_end = check_game_end(positions)
+            if game_end == 'checkmate':
+
+                return self._result(
+                    'checkmate', 'black' if team == 'white' else 'white'
+                )
+            if game_end:
+
+                return self._result(game_end)
+
+            move = self._next_move()
+            if move is None:
+
+                return self._result('end_of_moves')
+            try:
+                code = parse_move(move)
+            except ValueError:
+                code = None
+            if code is None or code not in positions.legal_moves():
+                result = self._result('illegal_move')
+                result['illegal_move'] = (
+                    move if code is None else move_to_uci(code)
+                )
+
+                return result
+
+            captured = positions.make_move(code)
+            if captured != EMPTY:
+                self.points[team] += PIECES[captured].value
+            self.moves.append(code)
+
+        return self._result('move_limit')
+
+
+"""
+*******************************************************************************
+                                  Batch games
+*******************************************************************************
+"""
+
+
+def play_game(game: Dict) -> Dict:
+    """ Plays one game from a dictionary of GameRunner arguments. Used as the
+    worker function of the process pool, so the move choosers have to be
+    module level functions. """
+
+    return GameRunner(**game).play()
+
+
+def game_statistics(results: List[Dict], seconds: float) -> Dict:
+    """ Summarises a list of game results. """
+    games = len(results)
+    plies = sum(result['plies'] for result in results)
+
+    return {
+        'games': games,
+        'results': dict(Counter(result['result'] for result in results)),
+        'terminations': dict(
+            Counter(result['termination'] for result in results)
+        ),
+        'average_plies': plies / games if games else 0.0,
+        'seconds': seconds,
+        'games_per_second': games / seconds if seconds > 0 else 0.0,
+        'plies_per_second': plies / seconds if seconds > 0 else 0.0,
+    }
+
+
+def run_batch(
+        games: Iterable[Dict],
+        workers: int = None,
+        chunksize: int = 16,
+        seed: int = None,
+) -> Dict:
+    """ Plays many games on a process pool. Every game is a dictionary of
+    GameRunner arguments, for example {'moves': [...]} for a replay or
+    {'white': random_move, 'black': random_move} for self-play. workers
+    defaults to the number of CPUs; with workers=1 the games are played in
+    this process. Games without a seed of their own get seed + their index,
+    where seed is random by default, so every batch plays new random games
+    but a batch can be played again with the seed it returns. Returns the
+    results in the order of the games, together with their statistics. """
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    games = [
+        dict({'seed': seed + i}, **game) for i, game in enumerate(games)
+    ]
+    start = time.perf_counter()
+    results = list(pool_map(play_game, games, workers, chunksize))
+
+    return {
+        'results': results,
+        'statistics': game_statistics(results, time.perf_counter() - start),
+        'seed': seed,
+    }
@@ -0,0 +1,421 @@
+""" This module hosts many games at once over local TCP or Unix sockets. The
+server runs on asyncio, so a player waiting to move doesn't block anyone:
+every game is a ServerGame object holding its Positions and clocks, and the
+moves sent by the players are checked and played as they arrive.
+
+Usage:
+    python server.py --port 8765 --minutes 5 --increment 2
+    python server.py --unix /tmp/chess.sock
+
+The protocol is one line of text per message. A player sends:
+    new [minutes] [increment]   start a game, playing white
+    join <game>                 join a game as black, which starts the clocks
+    move <move>                 play a move such as "e2e4" or "e7e8q"
+    board                       ask for the positions and the clocks
+    resign                      give up the game
+    quit                        close the connection
+and gets back "ok ..." or "error <reason>". Both players of a game are sent
+"start <game>", "move <move> <white ms> <black ms>" after every move and
+"end <result> <termination>".
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+from bitboards import WHITE, BLACK, move_to_uci
+from classes import Move, Positions
+from control import MOVE_PATTERN, check_game_end, explain_illegal_move
+from movegen import is_legal_move
+
+DEFAULT_MINUTES = 5.0
+DEFAULT_INCREMENT = 0.0
+# Connections waiting to be accepted, so that many players can connect at
+# once
+BACKLOG = 4096
+
+
+class Clock:
+    """ Chess clock of a game. Only the clock of the side to move runs, and
+    its time is only worked out when the side moves or is asked for it.
+    Properties:
+        self.remaining: the seconds left for white and black.
+        self.increment: the seconds added after every move.
+        self.running: the team whose clock runs, or None.
+    Methods:
+        self.start(): starts the clock of a team.
+        self.press(): stops the clock of a team after its move.
+        self.time_left(): returns the seconds left for a team.
+    """
+
+    def __init__(self, minutes: float, increment: float, timer=time.monotonic):
+        """ The timer returns the current time in seconds; the default is
+        the clock the event loop uses too. """
+        self.remaining = [minutes * 60.0, minutes * 60.0]
+        self.increment = increment
+        self.running = None
+        self._started = 0.0
+        self._timer = timer
+
+    def start(self, team: int):
+        self.running = team
+        self._started = self._timer()
+
+    def stop(self):
+        if self.running is not None:
+            self.remaining[self.running] = self.time_left(self.running)
+            self.running = None
+
+    def time_left(self, team: int) -> float:
+        if team != self.running:
+
+            return self.remaining[team]
+
+        return self.remaining[team] - (self._timer() - self._started)
+
+    def press(self, team: int) -> bool:
+        """ Stops the clock of the team that moved and starts the other one.
+        Returns False if the team ran out of time before its move. """
+        left = self.time_left(team)
+        if left <= 0:
+            self.remaining[team] = 0.0
+            self.running = None
+
+            return False
+        self.remaining[team] = left + self.increment
+        self.start(team ^ 1)
+
+        return True
+
+    def milliseconds(self) -> List[int]:
+        """ Returns the time left of both teams, in whole milliseconds. """
+
+        return [max(int(self.time_left(team) * 1000), 0) for team in (0, 1)]
+
+
+class ServerGame:
+    """ A game hosted by the server.
+    Properties:
+        self.number: the number of the game on the server.
+        self.positions: the Positions of the game.
+        self.players: the stream writers of white and black (None until a
+            player joins).
+        self.clock: the Clock of the game.
+        self.moves: the moves played, as move codes.
+        self.result, self.termination: the outcome, '' while playing.
+    Methods:
+        self.play(): checks and plays a move of a team.
+        self.finish(): ends the game and tells both players.
+    """
+
+    def __init__(self, number: int, minutes: float, increment: float):
+        self.number = number
+        self.positions = Positions()
+        self.players = [None, None]
+        self.clock = Clock(minutes, increment)
+        self.moves = []
+        self.result = ''
+        self.termination = ''
+        self._flag = None
+
+    @property
+    def started(self) -> bool:
+
+        return None not in self.players
+
+    def broadcast(self, message: str):
+        """ Sends a message to both players. The writes are buffered, the
+        handlers of the connections wait for them to drain. """
+        for writer in self.players:
+            if writer is not None and not writer.is_closing():
+                writer.write(message.encode() + b'\n')
+
+    def start(self):
+        self.broadcast(f'start {self.number}')
+        self._start_clock(WHITE)
+
+    def _start_clock(self, team: int):
+        """ Starts the clock of the team and arranges for its flag to fall
+        when its time runs out, even if it never moves again. """
+        if self._flag is not None:
+            self._flag.cancel()
+        self.clock.start(team)
+        self._flag = asyncio.get_running_loop().call_later(
+            self.clock.time_left(team), self._flag_fall, team
+        )
+
+    def _flag_fall(self, team: int):
+        if self.result or self.clock.running != team:
+            return
+        left = self.clock.time_left(team)
+        if left > 0:
+            # The timer of the event loop can fire a little early
+            self._flag = asyncio.get_running_loop().call_later(
+                left, self._flag_fall, team
+            )
+            return
+        self.clock.remaining[team] = 0.0
+        self.finish('time', winner=team ^ 1)
+
+    def play(self, team: int, text: str) -> str:
+        """ Checks and plays a move of the team. Returns '' if the move was
+        played, otherwise the reason it wasn't. """
+        if self.result:
+
+            return 'the game is over'
+        if not self.started:
+
+            return 'waiting for an opponent'
+        if team != self.positions.turn:
+
+            return 'it is not your turn'
+        text = text.lower().strip()
+        if not MOVE_PATTERN.match(text):
+
+            return f'{text!r} is not a move'
+        code = Move.from_uci(text).code
+        if not is_legal_move(self.positions, code):
+
+            return explain_illegal_move(self.positions, code)
+        if not self.clock.press(team):
+            self.finish('time', winner=team ^ 1)
+
+            return 'out of time'
+
+        self.positions.make_move(code)
+        self.moves.append(code)
+        white_ms, black_ms = self.clock.milliseconds()
+        self.broadcast(f'move {move_to_uci(code)} {white_ms} {black_ms}')
+        game_end = check_game_end(self.positions)
+        if game_end == 'checkmate':
+            self.finish(game_end, winner=team)
+        elif game_end:
+            self.finish(game_end)
+        else:
+            self._start_clock(team ^ 1)
+
+        return ''
+
+    def finish(self, termination: str, winner: Optional[int] = None):
+        """ Ends the game and stops the clocks. Without a winner the game is
+        a draw. """
+        if self.result:
+            return
+        if self._flag is not None:
+            self._flag.cancel()
+        self.clock.stop()
+        self.termination = termination
+        self.result = ('1-0', '0-1')[winner] if winner is not None else (
+            '1/2-1/2'
+        )
+        self.broadcast(f'end {self.result} {termination}')
+
+    def status(self) -> str:
+        white_ms, black_ms = self.clock.milliseconds()
+
+        return (
+            f'{self.positions.to_fen()} {white_ms} {black_ms} '
+            f'{self.result or "*"}'
+        )
+
+
+def check_time_control(
+        minutes: float,
+        increment: float
+) -> Tuple[float, float]:
+    """ Returns the time control as floats. Raises ValueError unless the
+    minutes are positive and the increment isn't negative, and both are
+    finite, since nan or inf would stop the clocks from ever running out. """
+    minutes = float(minutes)
+    increment = float(increment)
+    if not (
+        math.isfinite(minutes) and math.isfinite(increment)
+        and minutes > 0 and increment >= 0
+    ):
+        raise ValueError('the time control has to be finite and positive')
+
+    return minutes, increment
+
+
+class GameServer:
+    """ Hosts the games and the connections of their players.
+    Properties:
+        self.games: the games that are waiting or being played, by number.
+        self.minutes, self.increment: the default time control.
+    Methods:
+        self.handle(): serves a single connection.
+        self.serve(): listens on a TCP port or a Unix socket.
+    """
+
+    def __init__(
+            self,
+            minutes: float = DEFAULT_MINUTES,
+            increment: float = DEFAULT_INCREMENT
+    ):
+        """ Raises ValueError if the default time control isn't valid, see
+        check_time_control. """
+        self.games: Dict[int, ServerGame] = {}
+        self.minutes, self.increment = check_time_control(minutes, increment)
+        self._numbers = itertools.count(1)
+
+    def _new_game(self, writer, args: List[str]) -> ServerGame:
+        minutes, increment = check_time_control(
+            args[0] if args else self.minutes,
+            args[1] if len(args) > 1 else self.increment
+        )
+        game = ServerGame(next(self._numbers), minutes, increment)
+        game.players[WHITE] = writer
+        self.games[game.number] = game
+
+        return game
+
+    def _end_game(self, game: ServerGame):
+        self.games.pop(game.number, None)
+
+    async def handle(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter
+    ):
+        """ Reads the commands of a player until the connection closes. A
+        player takes part in one game at a time; leaving a game that isn't
+        over loses it. """
+        game = None
+        team = WHITE
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, *args = line.decode(errors='replace').split() or ['']
+                try:
+                    reply = self._execute(command, args, game, team, writer)
+                except ValueError as error:
+                    # Bad input only costs the player an error line
+                    reply = f'error {error}'
+                if isinstance(reply, tuple):
+                    game, team, reply = reply
+                if reply:
+                    writer.write(reply.encode() + b'\n')
+                if game is not None and game.result:
+                    # Finished games stay readable by their players
+                    self._end_game(game)
+                if command == 'quit':
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if game is not None:
+                if game.started and not game.result:
+                    game.finish('abandoned', winner=team ^ 1)
+                self._end_game(game)
+            writer.close()
+
+    def _execute(self, command: str, args: List[str], game, team, writer):
+        """ Runs a command of a player. Returns the reply, or the new game,
+        team and reply when the player starts or joins a game. """
+        if command == 'new':
+            if game is not None and not game.result:
+
+                return 'error you are already in a game'
+            try:
+                game = self._new_game(writer, args)
+            except ValueError as error:
+
+                return f'error {error}'
+
+            return game, WHITE, f'ok {game.number} white'
+        if command == 'join':
+            if game is not None and not game.result:
+
+                return 'error you are already in a game'
+            try:
+                wanted = self.games.get(int(args[0]))
+            except (IndexError, ValueError):
+                wanted = None
+            if wanted is None or wanted.started:
+
+                return 'error there is no such game waiting'
+            wanted.players[BLACK] = writer
+            writer.write(f'ok {wanted.number} black\n'.encode())
+            wanted.start()
+
+            return wanted, BLACK, ''
+        if command == 'quit':
+
+            return 'ok bye'
+        if game is None:
+
+            return 'error start or join a game first'
+        if command == 'move':
+            if not args:
+
+                return 'error which move?'
+            error = game.play(team, args[0])
+
+            return f'error {error}' if error else ''
+        if command == 'board':
+
+            return f'ok {game.status()}'
+        if command == 'resign':
+            if not game.started:
+                self._end_game(game)
+
+                return None, team, 'ok'
+            game.finish('resignation', winner=team ^ 1)
+
+            return ''
+
+        return f'error unknown command {command!r}'
+
+    async def serve(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 8765,
+            path: str = None
+    ):
+        """ Serves connections until cancelled, on the Unix socket at path if
+        it's given and otherwise on the TCP port. """
+        if path:
+            server = await asyncio.start_unix_server(
+                self.handle, path, backlog=BACKLOG
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle, host, port, backlog=BACKLOG
+            )
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port')
+    parser.add_argument('--unix', help='Unix socket to listen on instead')
+    parser.add_argument(
+        '--minutes', type=float, default=DEFAULT_MINUTES,
+        help='default time of each player'
+    )
+    parser.add_argument(
+        '--increment', type=float, default=DEFAULT_INCREMENT,
+        help='default seconds added after every move'
+    )
+    args = parser.parse_args()
+
+    try:
+        server = GameServer(args.minutes, args.increment)
+    except ValueError as error:
+        parser.error(str(error))
+    where = args.unix or f'{args.host}:{args.port}'
+    print(f'Serving games on {where}')
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
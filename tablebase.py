@@ -0,0 +1,548 @@
+""" This module generates and probes endgame tablebases for a king and one
+piece against a bare king (KQK, KRK and KPK). The tables are built by
+retrograde analysis: starting from the checkmates, the positions are solved
+backwards one ply at a time, which gives the exact result and the distance
+to mate of every position. Each table is stored in a file with one byte per
+position. The symmetries of the board are used to only store the positions
+with the strong king on one side of the board (KPK) or in one eighth of it
+(KQK, KRK).
+
+Usage:
+    python tablebase.py generate
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+"""
+import argparse
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+from bitboards import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, bit, iter_bits,
+    lsb, move_to_uci, popcount,
+)
+from classes import FEN_LETTERS, Positions
+from movegen import KING_ATTACKS, piece_attacks
+
+MAGIC = b'CHTB'
+VERSION = 1
+# Magic, version, table name and number of positions
+HEADER = struct.Struct('<4sI4sI')
+DEFAULT_DIRECTORY = 'tablebases'
+
+# The tables that can be generated, with the bitboard index of the white
+# piece. The strong side is stored as white; positions where black has the
+# piece are probed with the colours swapped.
+TABLES = {
+    'KQK': QUEEN,
+    'KRK': ROOK,
+    'KPK': PAWN,
+}
+# Tables that the generation of a table looks up, for promotions
+DEPENDENCIES = {
+    'KPK': ['KQK', 'KRK'],
+}
+
+# Values stored per position, for the side to move: a draw, a win in 1-127
+# plies, a loss in LOSS + 0-126 plies, or an impossible position
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+
+# Squares of the strong king. With a pawn only the left half of the board is
+# used (the board can be mirrored left to right), without a pawn the
+# triangle a1-d1-d4 (mirrored left to right, top to bottom and along the
+# diagonal).
+PAWN_KING_SQUARES = [row * 8 + col for row in range(8) for col in range(4)]
+KING_SQUARES = [row * 8 + col for row in range(4) for col in range(row, 4)]
+TRANSPOSE = [(square & 7) * 8 + (square >> 3) for square in range(64)]
+
+
+def _slots(squares: List[int]) -> List[int]:
+    """ Returns the position of every square in the list, -1 if it isn't in
+    it. """
+    slots = [-1] * 64
+    for slot, square in enumerate(squares):
+        slots[square] = slot
+
+    return slots
+
+
+PAWN_KING_SLOTS = _slots(PAWN_KING_SQUARES)
+KING_SLOTS = _slots(KING_SQUARES)
+
+
+def table_size(name: str) -> int:
+    """ Returns the number of positions stored in the table. """
+    if TABLES[name] == PAWN:
+
+        return len(PAWN_KING_SQUARES) * 48 * 64 * 2
+
+    return len(KING_SQUARES) * 64 * 64 * 2
+
+
+def table_index(
+        piece: int,
+        king: int,
+        square: int,
+        enemy_king: int,
+        turn: int
+) -> int:
+    """ Returns where the position (strong king, piece square, bare king,
+    side to move) is stored in the table of the piece, after moving it into
+    the stored part of the board. """
+    if king & 7 > 3:
+        king ^= 7
+        square ^= 7
+        enemy_king ^= 7
+    if piece == PAWN:
+
+        return (
+            ((PAWN_KING_SLOTS[king] * 48 + square - 8) * 64 + enemy_king) * 2
+            + turn
+        )
+
+    if king >> 3 > 3:
+        king ^= 56
+        square ^= 56
+        enemy_king ^= 56
+    # With the king on the diagonal, the other pieces decide whether the
+    # board is mirrored along it, so that every position has one index
+    row, col = king >> 3, king & 7
+    if row == col:
+        row, col = square >> 3, square & 7
+        if row == col:
+            row, col = enemy_king >> 3, enemy_king & 7
+    if row > col:
+        king = TRANSPOSE[king]
+        square = TRANSPOSE[square]
+        enemy_king = TRANSPOSE[enemy_king]
+
+    return ((KING_SLOTS[king] * 64 + square) * 64 + enemy_king) * 2 + turn
+
+
+def _decode(piece: int, index: int) -> Tuple[int, int, int, int]:
+    """ Returns (strong king, piece square, bare king, side to move) stored
+    at the index. """
+    turn = index & 1
+    index >>= 1
+    enemy_king = index & 63
+    index >>= 6
+    if piece == PAWN:
+        slot, square = divmod(index, 48)
+
+        return PAWN_KING_SQUARES[slot], square + 8, enemy_king, turn
+
+    slot, square = divmod(index, 64)
+
+    return KING_SQUARES[slot], square, enemy_king, turn
+
+
+"""
+*******************************************************************************
+                                   Generation
+*******************************************************************************
+"""
+
+
+def _is_legal(
+        piece: int,
+        king: int,
+        square: int,
+        enemy_king: int,
+        turn: int
+) -> bool:
+    """ Checks that the squares differ, that the kings don't touch, that a
+    pawn isn't on the first or last row and, with white to move, that the
+    black king isn't in check. """
+    if king == square or king == enemy_king or square == enemy_king:
+
+        return False
+    if KING_ATTACKS[king] & bit(enemy_king):
+
+        return False
+    if piece == PAWN and not 8 <= square < 56:
+
+        return False
+    occupied = bit(king) | bit(square) | bit(enemy_king)
+
+    return turn == BLACK or not (
+        piece_attacks(piece, square, occupied) & bit(enemy_king)
+    )
+
+
+def _black_moves(
+        piece: int,
+        king: int,
+        square: int,
+        enemy_king: int
+) -> Tuple[List[int], bool]:
+    """ Returns the squares the black king can move to without capturing,
+    and whether it can safely capture the white piece. """
+    moves = []
+    can_capture = False
+    targets = KING_ATTACKS[enemy_king] & ~KING_ATTACKS[king] & ~bit(king)
+    for target in iter_bits(targets):
+        if target == square:
+            can_capture = True
+            continue
+        occupied = bit(king) | bit(square) | bit(target)
+        if not piece_attacks(piece, square, occupied) & bit(target):
+            moves.append(target)
+
+    return moves, can_capture
+
+
+def _promotion_seeds(
+        king: int,
+        square: int,
+        enemy_king: int,
+        tables: Dict[str, bytearray]
+) -> int:
+    """ Returns the fewest plies to mate by promoting the pawn (white to
+    move), or 0 if no promotion wins. Promotions to bishops and knights are
+    always draws. """
+    target = square + 8
+    if target < 56 or target in (king, enemy_king):
+
+        return 0
+    best = 0
+    for name in DEPENDENCIES['KPK']:
+        piece = TABLES[name]
+        value = tables[name][
+            table_index(piece, king, target, enemy_king, BLACK)
+        ]
+        if LOSS <= value < ILLEGAL:
+            plies = value - LOSS + 1
+            if not best or plies < best:
+                best = plies
+
+    return best
+
+
+def _white_unmoves(
+        piece: int,
+        king: int,
+        square: int,
+        enemy_king: int
+) -> List[Tuple[int, int]]:
+    """ Returns the (king, piece square) pairs white could have moved from
+    to reach the position. """
+    empty = ~(bit(king) | bit(square) | bit(enemy_king))
+    unmoves = [
+        (start, square)
+        for start in iter_bits(
+            KING_ATTACKS[king] & empty & ~KING_ATTACKS[enemy_king]
+        )
+    ]
+    if piece == PAWN:
+        start = square - 8
+        if start >= 8 and empty & bit(start):
+            unmoves.append((king, start))
+            if square >> 3 == 3 and empty & bit(start - 8):
+                unmoves.append((king, start - 8))
+    else:
+        occupied = bit(king) | bit(enemy_king)
+        for start in iter_bits(
+            piece_attacks(piece, square, occupied) & empty
+        ):
+            unmoves.append((king, start))
+
+    return unmoves
+
+
+def generate(name: str, tables: Dict[str, bytearray] = None) -> bytearray:
+    """ Solves every position of the table by retrograde analysis and
+    returns the values. tables has to hold the tables the generation
+    depends on (see DEPENDENCIES).
+
+    The checkmates are solved first. Then, for n = 0, 1, 2..., every white
+    position with a move to a black position lost in n plies is won in n + 1
+    plies, and every black position whose moves all lead to white positions
+    won in n plies or less is lost in n + 1 plies. Positions that are never
+    reached this way are draws. """
+    piece = TABLES[name]
+    size = table_size(name)
+    values = bytearray(size)
+    # Solved positions, including draws and impossible positions that are
+    # known up front
+    solved = bytearray(size)
+    frontier = []
+    seeds = {}
+    for index in range(size):
+        king, square, enemy_king, turn = _decode(piece, index)
+        if (
+            not _is_legal(piece, king, square, enemy_king, turn)
+            or table_index(piece, king, square, enemy_king, turn) != index
+        ):
+            # Impossible, or stored under the index of its mirror image
+            values[index] = ILLEGAL
+            solved[index] = 1
+        elif turn == BLACK:
+            moves, can_capture = _black_moves(
+                piece, king, square, enemy_king
+            )
+            if can_capture:
+                solved[index] = 1
+            elif not moves:
+                solved[index] = 1
+                occupied = bit(king) | bit(square) | bit(enemy_king)
+                if piece_attacks(piece, square, occupied) & bit(enemy_king):
+                    values[index] = LOSS
+                    frontier.append(index)
+        elif piece == PAWN:
+            plies = _promotion_seeds(king, square, enemy_king, tables)
+            if plies:
+                seeds.setdefault(plies, []).append(index)
+
+    plies = 0
+    while frontier or any(level > plies for level in seeds):
+        next_frontier = []
+        for index in frontier:
+            king, square, enemy_king, turn = _decode(piece, index)
+            if turn == BLACK:
+                for start_king, start in _white_unmoves(
+                        piece, king, square, enemy_king
+                ):
+                    previous = table_index(
+                        piece, start_king, start, enemy_king, WHITE
+                    )
+                    if not solved[previous]:
+                        solved[previous] = 1
+                        values[previous] = plies + 1
+                        next_frontier.append(previous)
+                continue
+
+            targets = KING_ATTACKS[enemy_king] & ~KING_ATTACKS[king]
+            for start in iter_bits(targets & ~bit(king) & ~bit(square)):
+                previous = table_index(piece, king, square, start, BLACK)
+                if solved[previous]:
+                    continue
+                moves, _ = _black_moves(piece, king, square, start)
+                if all(
+                    solved[next_index] and 0 < values[next_index] < LOSS
+                    for next_index in (
+                        table_index(piece, king, square, target, WHITE)
+                        for target in moves
+                    )
+                ):
+                    solved[previous] = 1
+                    values[previous] = LOSS + plies + 1
+                    next_frontier.append(previous)
+
+        plies += 1
+        for index in seeds.pop(plies, []):
+            if not solved[index]:
+                solved[index] = 1
+                values[index] = plies
+                next_frontier.append(index)
+        frontier = next_frontier
+
+    return values
+
+
+def write_table(name: str, values: bytearray, directory: str):
+    """ Writes the values to <directory>/<name>.tb. """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{name}.tb'), 'wb') as table:
+        table.write(HEADER.pack(MAGIC, VERSION, name.encode(), len(values)))
+        table.write(values)
+
+
+def generate_all(
+        names: List[str] = None,
+        directory: str = DEFAULT_DIRECTORY
+) -> Dict[str, bytearray]:
+    """ Generates the tables (all by default) and the tables they depend on,
+    and writes them to the directory. Returns the values by table name. """
+    tables = {}
+
+    def solve(name: str):
+        if name in tables:
+
+            return
+        for dependency in DEPENDENCIES.get(name, []):
+            solve(dependency)
+        tables[name] = generate(name, tables)
+        write_table(name, tables[name], directory)
+
+    for name in names or list(TABLES):
+        solve(name)
+
+    return tables
+
+
+"""
+*******************************************************************************
+                                    Probing
+*******************************************************************************
+"""
+
+
+class Tablebases:
+    """ Read-only access to the tables in a directory. The files are mapped
+    with mmap the first time they are needed.
+    Methods:
+        self.probe(): returns the result and distance to mate of positions.
+        self.best_move(): returns the move that mates fastest or holds out
+            longest.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self._maps = {}
+
+    def __getstate__(self):
+        """ Only the directory is pickled, the files are mapped again. """
+
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+    def _table(self, name: str) -> Optional[mmap.mmap]:
+        """ Returns the mapped values of the table, or None if the table
+        file doesn't exist. """
+        if name not in self._maps:
+            path = os.path.join(self.directory, f'{name}.tb')
+            if not os.path.exists(path):
+                self._maps[name] = None
+            else:
+                with open(path, 'rb') as table:
+                    values = mmap.mmap(
+                        table.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+                magic, version, stored_name, size = HEADER.unpack_from(
+                    values, 0
+                )
+                if (
+                    magic != MAGIC or version != VERSION
+                    or stored_name.rstrip(b'\0') != name.encode()
+                    or len(values) != HEADER.size + size
+                ):
+                    raise ValueError(f'{path} is not a {name} table')
+                self._maps[name] = values
+
+        return self._maps[name]
+
+    def probe(self, positions: Positions) -> Optional[Tuple[int, int]]:
+        """ Returns (result, plies to mate) for the side to move, where the
+        result is 1 for a win, 0 for a draw and -1 for a loss. Returns None
+        if the positions aren't covered: more than three pieces, castling
+        rights, or a missing table. Bare kings and a single bishop or knight
+        are draws without a table. """
+        occupied = positions.occupied
+        pieces = popcount(occupied)
+        if pieces == 2:
+
+            return 0, 0
+        if pieces != 3 or positions.castling_rights:
+
+            return None
+
+        bitboards = positions.bitboards
+        for index in range(12):
+            if index % 6 != KING and bitboards[index]:
+                break
+        piece = index % 6
+        if piece in (KNIGHT, BISHOP):
+
+            return 0, 0
+        king = lsb(bitboards[KING])
+        enemy_king = lsb(bitboards[KING + 6])
+        square = lsb(bitboards[index])
+        turn = positions.turn
+        if index // 6 == BLACK:
+            king, enemy_king = enemy_king ^ 56, king ^ 56
+            square ^= 56
+            turn ^= 1
+        values = self._table(f'K{FEN_LETTERS[piece].upper()}K')
+        if values is None:
+
+            return None
+
+        value = values[
+            HEADER.size + table_index(piece, king, square, enemy_king, turn)
+        ]
+        if value == DRAW or value == ILLEGAL:
+
+            return 0, 0
+        if value < LOSS:
+
+            return 1, value
+
+        return -1, value - LOSS
+
+    def best_move(self, positions: Positions) -> Optional[int]:
+        """ Returns the move that wins fastest, or else draws, or else loses
+        slowest. Returns None if the positions or one of the positions after
+        a move aren't covered. """
+        best = None
+        best_rank = None
+        for code in positions.legal_moves():
+            positions.make_move(code)
+            result = self.probe(positions)
+            positions.unmake_move()
+            if result is None:
+
+                return None
+            outcome, plies = result
+            # The result after the move is the opponent's: the lower the
+            # better, then the fewest plies for a win and the most for a
+            # loss
+            rank = (outcome, plies if outcome < 0 else -plies)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = code, rank
+
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_command = commands.add_parser(
+        'generate', help='generate the tables'
+    )
+    generate_command.add_argument(
+        'tables', nargs='*',
+        help=f'tables to generate: {", ".join(TABLES)} (default all)'
+    )
+    probe = commands.add_parser('probe', help='look a position up')
+    probe.add_argument('--fen', required=True, help='position to look up')
+    for command in (generate_command, probe):
+        command.add_argument(
+            '--directory', default=DEFAULT_DIRECTORY,
+            help='directory of the table files'
+        )
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        for name in args.tables:
+            if name not in TABLES:
+                parser.error(f'there is no generator for {name}')
+        tables = generate_all(args.tables, args.directory)
+        for name, values in tables.items():
+            wins = sum(1 for value in values if 0 < value < LOSS)
+            longest = max(value for value in values if value < LOSS)
+            print(
+                f'{name}: {len(values)} positions, {wins} won, longest mate '
+                f'{longest} plies'
+            )
+    else:
+        positions = Positions(args.fen)
+        tablebases = Tablebases(args.directory)
+        result = tablebases.probe(positions)
+        if result is None:
+            print('The position is not in the tables')
+        else:
+            outcome, plies = result
+            print(
+                ['Loss', 'Draw', 'Win'][outcome + 1]
+                + (f' in {plies} plies' if outcome else '')
+            )
+            move = tablebases.best_move(positions)
+            if move is not None:
+                print(f'Best move: {move_to_uci(move)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+""" The modules of the game live at the top of the repository, next to this
+directory, so it's put on the import path for the tests. """
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,80 @@
+""" Tests of the binary game archive. """
+import os
+import pytest
+import archive
+from archive import GameArchive, append_games, write_archive
+from bitboards import move_to_uci
+from runner import GameRunner
+
+GAMES = [
+    {'moves': ['e2e4', 'e7e5', 'g1f3'], 'result': '*'},
+    {'moves': ['d2d4', 'd7d5'], 'result': '1/2-1/2'},
+]
+
+
+def read_games(path: str) -> list:
+    with GameArchive(path) as games:
+
+        return [
+            [move_to_uci(code) for code in games.moves(number)]
+            for number in range(len(games))
+        ]
+
+
+def test_games_are_appended(tmp_path):
+    path = str(tmp_path / 'games.cga')
+    assert write_archive(path, GAMES[:1]) == 1
+    assert append_games(path, GAMES[1:]) == 2
+    assert read_games(path) == [game['moves'] for game in GAMES]
+
+
+def test_a_bad_game_leaves_the_archive_untouched(tmp_path):
+    path = str(tmp_path / 'games.cga')
+    write_archive(path, GAMES)
+    with open(path, 'rb') as archive_file:
+        before = archive_file.read()
+    with pytest.raises(ValueError):
+        append_games(path, [GAMES[0], {'moves': ['Nf3']}])
+    with open(path, 'rb') as archive_file:
+        assert archive_file.read() == before
+    assert len(read_games(path)) == 2
+
+
+def test_a_failed_write_leaves_the_archive_readable(tmp_path, monkeypatch):
+    path = str(tmp_path / 'games.cga')
+    write_archive(path, GAMES)
+    size = os.path.getsize(path)
+
+    def fail(descriptor):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(archive.os, 'fsync', fail)
+    with pytest.raises(OSError):
+        append_games(path, GAMES)
+    assert os.path.getsize(path) == size
+    assert read_games(path) == [game['moves'] for game in GAMES]
+
+
+def test_runner_results_keep_their_starting_positions(tmp_path):
+    fen = '4k3/8/8/8/8/8/4P3/4K3 w - - 0 1'
+    result = GameRunner(['e2e4', 'e8d7'], fen=fen).play()
+    path = str(tmp_path / 'games.cga')
+    write_archive(path, [result])
+    with GameArchive(path) as games:
+        assert games.game(0)['start_fen'] == fen
+        assert games.positions(0).to_fen() == result['fen']
+
+
+def test_pgn_games_that_cant_be_replayed_are_skipped(tmp_path, capsys):
+    source = tmp_path / 'games.pgn'
+    source.write_text(
+        '[Result "1-0"]\n\n1. e4 e5 2. Ke3 Nc6 1-0\n\n'
+        '[Result "0-1"]\n\n1. f3 e5 2. g4 Qh4# 0-1\n'
+    )
+    games = list(archive._read_source(str(source), 'pgn'))
+    assert games == [{
+        'moves': ['f2f3', 'e7e5', 'g2g4', 'd8h4'],
+        'result': '0-1',
+        'start_fen': '',
+    }]
+    assert 'Skipped game 0: Ke3' in capsys.readouterr().err
@@ -0,0 +1,46 @@
+""" Tests of the NumPy board batches. """
+import numpy as np
+from batch import PositionBatch
+from bitboards import BLACK, WHITE
+from classes import Positions
+from perft import REFERENCE_POSITIONS
+
+FENS = [fen for fen, _ in REFERENCE_POSITIONS.values()]
+
+
+def test_conversions_round_trip():
+    positions = [Positions(fen) for fen in FENS]
+    batch = PositionBatch.from_positions(positions)
+    assert len(batch) == len(FENS)
+    bitboards = batch.to_bitboards()
+    assert bitboards.tolist() == [board.bitboards for board in positions]
+    again = PositionBatch.from_bitboards(bitboards, batch.turns)
+    assert np.array_equal(again.squares, batch.squares)
+    for board, copy in zip(positions, batch.to_positions()):
+        assert copy.to_fen().split()[:2] == board.to_fen().split()[:2]
+
+
+def test_scores_of_the_starting_positions_are_even():
+    batch = PositionBatch.from_positions([Positions()])
+    assert batch.material().tolist() == [0]
+    assert batch.piece_square_score().tolist() == [0]
+    assert batch.centre_control().tolist() == [0]
+    assert batch.attacked_squares().tolist() == [[22, 22]]
+
+
+def test_material_without_the_black_queen():
+    batch = PositionBatch.from_positions([
+        Positions('rnb1kbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    ])
+    assert batch.material().tolist() == [9]
+    assert batch.evaluate()[0] > 800
+
+
+def test_attacked_squares_match_the_attack_maps():
+    positions = [Positions(fen) for fen in FENS]
+    counts = PositionBatch.from_positions(positions).attack_counts()
+    for board, board_counts in zip(positions, counts):
+        for team in (WHITE, BLACK):
+            attacked = np.flatnonzero(board_counts[team].ravel())
+            expected = board.attacked_by(team)
+            assert sum(1 << int(square) for square in attacked) == expected
@@ -0,0 +1,53 @@
+""" Tests of the opening book. """
+import mmap
+import pytest
+import book
+from book import HEADER, MAGIC, OpeningBook, build_book
+from classes import Move, Positions
+
+
+def test_games_stop_counting_at_a_malformed_move(tmp_path):
+    path = str(tmp_path / 'book.bin')
+    games = [
+        ['e2e4', 'e7e5', 'Nf3', 'b8c6'],
+        ['e2e4', 'c7c5'],
+        ['d2d4', 'e7e5', 'e5e4'],
+    ]
+    assert build_book(games, path) == 5
+    with OpeningBook(path) as book:
+        assert dict(book.lookup(Positions())) == {
+            Move('e2e4').code: 2, Move('d2d4').code: 1,
+        }
+        positions = Positions()
+        positions.make_move(Move('e2e4').code)
+        assert dict(book.lookup(positions)) == {
+            Move('e7e5').code: 1, Move('c7c5').code: 1,
+        }
+
+
+@pytest.mark.parametrize('content', [
+    b'CHB',
+    b'XXXX' + bytes(HEADER.size),
+    HEADER.pack(MAGIC, 1, 3),
+])
+def test_files_that_are_not_books_are_closed(tmp_path, monkeypatch, content):
+    path = tmp_path / 'book.bin'
+    path.write_bytes(content)
+    opened = []
+    real_mmap = mmap.mmap
+
+    def recording_open(*args):
+        opened.append(open(*args))
+
+        return opened[-1]
+
+    def recording_mmap(*args, **kwargs):
+        opened.append(real_mmap(*args, **kwargs))
+
+        return opened[-1]
+
+    monkeypatch.setattr(book, 'open', recording_open, raising=False)
+    monkeypatch.setattr(book.mmap, 'mmap', recording_mmap)
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
+    assert opened and all(resource.closed for resource in opened)
@@ -0,0 +1,46 @@
+""" Tests of the search and the engine player. """
+import engine
+from classes import Move, Positions
+from engine import (
+    MATE_SCORE, EnginePlayer, ParallelSearch, Search, order_moves
+)
+from tablebase import Tablebases
+
+
+def test_engine_player_shuts_its_pool_down():
+    with EnginePlayer(workers=2, max_depth=1, time_limit=None) as player:
+        code = player.choose_move(Positions())
+        assert code in Positions().legal_moves()
+        assert player.search._executor is not None
+    assert player.search._executor is None
+
+
+def test_parallel_workers_probe_the_tablebases(monkeypatch):
+    monkeypatch.setattr(engine, '_worker_search', None)
+    tablebases = Tablebases()
+    player = EnginePlayer(workers=2, tablebases=tablebases)
+    assert isinstance(player.search, ParallelSearch)
+    assert player.search.tablebases is tablebases
+    engine._start_worker(tablebases)
+    assert engine._worker_search.tablebases is tablebases
+    player.close()
+
+
+def test_mate_on_the_hundredth_ply_is_not_a_draw():
+    positions = Positions('6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80')
+    result = Search(max_depth=2).run(positions)
+    assert result['uci'] == 'a1a8'
+    assert result['score'] == MATE_SCORE - 1
+
+
+def test_order_moves_without_a_search():
+    positions = Positions(
+        'rnbqkbnr/ppp1pppp/8/3p4/4P3/2N5/PPPP1PPP/R1BQKBNR w KQkq - 0 2'
+    )
+    moves = positions.legal_moves()
+    ordered = order_moves(positions, moves)
+    assert sorted(ordered) == sorted(moves)
+    assert ordered[:2] == [Move('e4d5').code, Move('c3d5').code]
+    quiet = Move('g1f3').code
+    assert order_moves(positions, moves, (quiet, 0))[2] == quiet
+    assert order_moves(positions, moves, hash_move=quiet)[0] == quiet
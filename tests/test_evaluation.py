@@ -0,0 +1,72 @@
+""" Tests of the tapered evaluation and its incremental scores. """
+import pytest
+from classes import Positions
+from evaluation import PawnTable, evaluate, full_scores
+from perft import REFERENCE_POSITIONS
+
+
+def mirrored(fen: str) -> str:
+    """ Returns the FEN with the board flipped and the colours swapped. """
+    board, turn, castling, en_passant, *clocks = fen.split()
+    board = '/'.join(board.split('/')[::-1]).swapcase()
+    castling = ''.join(sorted(castling.swapcase())) if castling != '-' else '-'
+    if en_passant != '-':
+        en_passant = en_passant[0] + str(9 - int(en_passant[1]))
+
+    return ' '.join(
+        [board, 'b' if turn == 'w' else 'w', castling, en_passant, *clocks]
+    )
+
+
+def scores(positions: Positions) -> tuple:
+
+    return positions.midgame, positions.endgame, positions.phase
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_incremental_scores_survive_make_and_unmake(name):
+    positions = Positions(REFERENCE_POSITIONS[name][0])
+    before = evaluate(positions)
+    assert scores(positions) == full_scores(positions)
+    for code in positions.legal_moves():
+        positions.make_move(code)
+        assert scores(positions) == full_scores(positions)
+        for reply in positions.legal_moves():
+            positions.make_move(reply)
+            assert scores(positions) == full_scores(positions)
+            positions.unmake_move()
+        positions.unmake_move()
+        assert evaluate(positions) == before
+    assert scores(positions) == full_scores(positions)
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_mirrored_positions_score_the_same(name):
+    fen = REFERENCE_POSITIONS[name][0]
+    assert evaluate(Positions(fen)) == evaluate(Positions(mirrored(fen)))
+
+
+def test_starting_positions_are_even():
+    assert evaluate(Positions()) == 0
+    assert full_scores(Positions())[1] == 0
+
+
+def test_material_and_passed_pawns_count():
+    extra_queen = Positions('4k3/8/8/8/8/8/8/3QK3 w - - 0 1')
+    assert evaluate(extra_queen) > 800
+    extra_queen.turn = 1
+    assert evaluate(extra_queen) < -800
+    passed = Positions('4k3/8/8/3P4/8/8/8/4K3 w - - 0 1')
+    blocked = Positions('4k3/3p4/8/3P4/8/8/8/4K3 w - - 0 1')
+    assert evaluate(passed) > 100
+    assert evaluate(blocked) < evaluate(passed) - 100
+
+
+def test_pawn_table_caches_the_pawn_scores():
+    table = PawnTable(64)
+    positions = Positions(REFERENCE_POSITIONS['kiwipete'][0])
+    assert evaluate(positions, table) == evaluate(positions)
+    assert evaluate(positions, table) == evaluate(positions)
+    assert table.stats() == {'probes': 2, 'hits': 1, 'hit_rate': 0.5}
+    table.clear()
+    assert table.stats()['probes'] == 0
@@ -0,0 +1,53 @@
+""" Tests of the checks for the end of a game. """
+import pytest
+from classes import Move, Positions
+from control import check_game_end, is_insufficient_material
+from movegen import has_legal_move, iter_legal_moves
+from perft import REFERENCE_POSITIONS
+
+
+@pytest.mark.parametrize('fen, expected', [
+    ('rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3',
+     'checkmate'),
+    ('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1', 'stalemate'),
+    ('8/8/8/4k3/8/8/8/4KN2 w - - 0 1', 'insufficient_material'),
+    ('8/8/8/4k3/8/8/8/2B1KB2 w - - 0 1', ''),
+    ('8/8/8/3bk3/8/8/8/4KB2 w - - 0 1', 'insufficient_material'),
+    ('8/8/8/2b1k3/8/8/8/4KB2 w - - 0 1', ''),
+    ('8/8/8/4k3/8/8/8/4KN1n w - - 0 1', ''),
+    ('8/8/8/4k3/8/8/8/4K2R w - - 99 80', ''),
+    ('8/8/8/4k3/8/8/8/4K2R w - - 100 80', 'fifty_moves'),
+    (REFERENCE_POSITIONS['kiwipete'][0], ''),
+])
+def test_game_end(fen, expected):
+    assert check_game_end(Positions(fen)) == expected
+
+
+def test_threefold_repetition():
+    positions = Positions()
+    for _ in range(2):
+        assert check_game_end(positions) == ''
+        for move in ('g1f3', 'g8f6', 'f3g1', 'f6g8'):
+            positions.make_move(Move(move).code)
+    assert check_game_end(positions) == 'threefold_repetition'
+    positions.unmake_move()
+    assert check_game_end(positions) == ''
+
+
+def test_insufficient_material_needs_no_pawns():
+    assert not is_insufficient_material(Positions())
+    assert is_insufficient_material(
+        Positions('8/8/8/4k3/8/8/8/4K3 w - - 0 1')
+    )
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_lazy_moves_are_the_legal_moves(name):
+    positions = Positions(REFERENCE_POSITIONS[name][0])
+    for code in positions.legal_moves():
+        positions.make_move(code)
+        moves = list(iter_legal_moves(positions))
+        assert len(moves) == len(set(moves))
+        assert sorted(moves) == sorted(positions.legal_moves())
+        assert has_legal_move(positions) == bool(moves)
+        positions.unmake_move()
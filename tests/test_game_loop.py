@@ -0,0 +1,56 @@
+""" Tests of the moves typed in by the players of the game loop. """
+import builtins
+import chess
+from classes import Move, Player, Positions
+from instrumentation import Instrumentation
+
+
+def play(positions: Positions, moves: str):
+    for move in moves.split():
+        positions.make_move(Move(move).code)
+
+
+def typed_move(monkeypatch, positions: Positions, inputs: list) -> Move:
+    """ Lets a white or black player type in the inputs one by one. """
+    player = Player('player')
+    player.team = positions.side_to_move
+    answers = iter(inputs)
+    monkeypatch.setattr(builtins, 'input', lambda prompt='': next(answers))
+
+    return chess.request_legal_move(positions, player, Instrumentation())
+
+
+def test_moves_leaving_the_king_in_check_are_refused(monkeypatch, capsys):
+    positions = Positions()
+    play(positions, 'e2e4 f7f6 d1h5')
+    move = typed_move(monkeypatch, positions, ['a7a6', 'g7g6'])
+    assert move == Move('g7g6')
+    assert "doesn't get the king out of check" in capsys.readouterr().out
+
+
+def test_pinned_pieces_are_refused(monkeypatch, capsys):
+    positions = Positions('4k3/4r3/8/8/8/8/4R3/4K3 b - - 0 1')
+    move = typed_move(monkeypatch, positions, ['e7d7', 'e7e2'])
+    assert move == Move('e7e2')
+    assert 'the piece is pinned to its king' in capsys.readouterr().out
+
+
+def test_castling_is_typed_as_a_king_move(monkeypatch):
+    positions = Positions()
+    play(positions, 'e2e4 e7e5 g1f3 b8c6 f1c4 g8f6')
+    move = typed_move(monkeypatch, positions, ['e1g1'])
+    positions.make_move(move.code)
+    assert positions.to_fen().startswith(
+        'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQ1RK1 b kq'
+    )
+
+
+def test_promotions_need_the_letter_of_the_new_piece(monkeypatch, capsys):
+    positions = Positions('8/4P3/8/8/8/8/8/k6K w - - 0 1')
+    move = typed_move(monkeypatch, positions, ['e7e8', 'e7e8x', 'e7e8n'])
+    assert move == Move('e7e8n')
+    output = capsys.readouterr().out
+    assert 'has to be promoted' in output
+    assert 'not a valid move' in output
+    positions.make_move(move.code)
+    assert positions.to_fen().startswith('4N3/8/8/8/8/8/8/k6K b')
@@ -0,0 +1,29 @@
+""" Tests of the shared Square and Move instances. """
+import copy
+import pickle
+import pytest
+from classes import EMPTY_SQUARE, Move, Square
+
+
+def test_moves_and_squares_are_immutable():
+    move = Move('e2e4')
+    with pytest.raises(AttributeError):
+        move.start = None
+    with pytest.raises(AttributeError):
+        Square('e2').row = 3
+    assert Move('e2e4').start is Square('e2')
+    assert Square('e2').row == 1
+
+
+@pytest.mark.parametrize('move', ['e2e4', 'e7e8q', 'a2a1n'])
+def test_pickled_and_copied_moves_are_the_shared_instances(move):
+    move = Move(move)
+    assert pickle.loads(pickle.dumps(move)) is move
+    assert copy.deepcopy(move) is move
+    assert copy.copy(move) is move
+
+
+def test_pickled_squares_are_the_shared_instances():
+    for square in (Square('h8'), EMPTY_SQUARE):
+        assert pickle.loads(pickle.dumps(square)) is square
+        assert copy.deepcopy(square) is square
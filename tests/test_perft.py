@@ -0,0 +1,35 @@
+""" Tests of the move generation against the perft reference counts. """
+import json
+import pytest
+from classes import Positions
+from perft import (
+    REFERENCE_POSITIONS, STARTING_FEN, divide, perft, run_suite
+)
+
+MAX_DEPTH = 3
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_reference_counts(name):
+    fen, counts = REFERENCE_POSITIONS[name]
+    positions = Positions(fen)
+    for depth, expected in enumerate(counts[:MAX_DEPTH], 1):
+        assert perft(positions, depth) == expected
+    assert positions.to_fen() == Positions(fen).to_fen()
+
+
+def test_divide_adds_up_to_perft():
+    counts = divide(Positions(STARTING_FEN), 3)
+    assert len(counts) == 20
+    assert counts['e2e4'] == 600
+    assert sum(counts.values()) == 8902
+
+
+def test_run_suite_writes_the_history_only_when_asked(tmp_path, capsys):
+    assert run_suite(1)
+    history = tmp_path / 'history.jsonl'
+    assert run_suite(1, str(history))
+    records = [json.loads(line) for line in history.read_text().splitlines()]
+    assert len(records) == len(REFERENCE_POSITIONS)
+    assert all(record['passed'] for record in records)
+    assert 'FAILED' not in capsys.readouterr().out
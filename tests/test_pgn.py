@@ -0,0 +1,87 @@
+""" Tests of reading and replaying PGN games. """
+import gzip
+import io
+import pytest
+from bitboards import move_to_uci
+from classes import Positions
+from pgn import parse_san, read_games, replay_file, replay_game
+
+CASTLING_PGN = '''[Event "Castling with zeros"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. 0-0 d6 5. d3 Bg4 6. Nc3 Qd7 7. Be3
+0-0-0 8. a3 *
+'''
+
+
+def test_castling_written_with_zeros():
+    game, = read_games(CASTLING_PGN.splitlines())
+    assert game.moves[6] == '0-0'
+    assert game.moves[13] == '0-0-0'
+    assert game.moves[-1] == 'a3'
+    result = replay_game(game)
+    assert result['error'] == ''
+    assert result['moves'][6] == 'e1g1'
+    assert result['moves'][13] == 'e8c8'
+    assert result['plies'] == 15
+
+
+def test_move_numbers_are_removed():
+    game, = read_games(['1.e4 1...e5 2.Nf3 1-0'])
+    assert game.moves == ['e4', 'e5', 'Nf3']
+    assert game.result == '1-0'
+
+
+@pytest.mark.parametrize('fen, san, uci', [
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O', 'e1g1'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O-O', 'e1c1'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1', '0-0+', 'e8g8'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1', 'O-O-O', 'e8c8'),
+    # Disambiguation by file, by row and by a pin
+    ('4k3/8/8/8/8/8/8/RN2K1NR w - - 0 1', 'Ngf3', 'g1f3'),
+    ('4k3/R7/8/8/8/8/8/R3K3 w - - 0 1', 'R1a4', 'a1a4'),
+    ('4k3/8/8/1b6/8/8/4N3/4K1N1 w - - 0 1', 'Nf3', 'g1f3'),
+    # Promotions, captures and en passant
+    ('3r4/4P3/8/8/8/8/8/k3K3 w - - 0 1', 'e8=Q+', 'e7e8q'),
+    ('3r4/4P3/8/8/8/8/8/k3K3 w - - 0 1', 'exd8=N', 'e7d8n'),
+    ('3r4/4P3/8/8/8/8/8/k3K3 w - - 0 1', 'exd8R!', 'e7d8r'),
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'exd6', 'e5d6'),
+    ('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1', 'e4', 'e2e4'),
+])
+def test_parse_san(fen, san, uci):
+    positions = Positions(fen)
+    code = parse_san(positions, san)
+    assert move_to_uci(code) == uci
+    assert code in positions.legal_moves()
+
+
+def test_ambiguous_and_impossible_moves_are_refused():
+    positions = Positions('4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1')
+    with pytest.raises(ValueError, match='ambiguous'):
+        parse_san(positions, 'Nd2')
+    with pytest.raises(ValueError, match='impossible'):
+        parse_san(positions, 'Nd4')
+
+
+def test_replayed_moves_can_be_read_back(tmp_path):
+    pgn = (
+        '[Event "First"]\n[Result "1-0"]\n\n'
+        '1. e4 {a comment\nover two lines} e5 2. Qh5 (2. Nf3 Nc6) Nc6 '
+        '3. Bc4 Nf6?? $4 4. Qxf7# 1-0\n\n'
+        '[Event "Second"]\n[FEN "4k3/8/8/8/8/8/8/R3K3 w Q - 0 1"]\n\n'
+        '1. O-O-O Kf7 *\n'
+    )
+    path = tmp_path / 'games.pgn.gz'
+    with gzip.open(path, 'wt') as games:
+        games.write(pgn)
+    uci = io.StringIO()
+    stats = replay_file(str(path), uci_file=uci)
+    assert (stats['games'], stats['plies'], stats['errors']) == (2, 9, 0)
+    assert uci.getvalue().splitlines() == [
+        'e2e4 e7e5 d1h5 b8c6 f1c4 g8f6 h5f7',
+        'e1c1 e8f7',
+    ]
+    first, second = read_games(pgn.splitlines())
+    assert (first.result, second.result) == ('1-0', '*')
+    assert second.tags['FEN'] == '4k3/8/8/8/8/8/8/R3K3 w Q - 0 1'
+    assert replay_game(second)['fen'].startswith('8/5k2/8/')
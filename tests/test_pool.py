@@ -0,0 +1,10 @@
+""" Tests of the process pool helper. """
+import pytest
+from pool import pool_map
+
+
+@pytest.mark.parametrize('workers, chunksize', [(1, 1), (2, 1), (2, 3)])
+def test_results_come_back_in_order(workers, chunksize):
+    items = iter(range(50))
+    results = pool_map(abs, (-item for item in items), workers, chunksize)
+    assert list(results) == list(range(50))
@@ -0,0 +1,48 @@
+""" Tests of playing moves on Positions and taking them back. """
+import pytest
+from bitboards import BLACK, EMPTY, PAWN, QUEEN
+from classes import Move, Positions
+from perft import REFERENCE_POSITIONS
+
+
+def state(positions: Positions) -> tuple:
+    """ Everything make_move changes and unmake_move has to restore. """
+
+    return (
+        positions.to_fen(), list(positions.bitboards),
+        list(positions.occupancy), positions.occupied,
+        list(positions.mailbox), list(positions.attacks), positions.key,
+        positions.halfmove_clock, list(positions.recent_keys),
+    )
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_unmake_move_restores_the_positions(name):
+    positions = Positions(REFERENCE_POSITIONS[name][0])
+    before = state(positions)
+    for code in positions.legal_moves():
+        positions.make_move(code)
+        after = state(positions)
+        for reply in positions.legal_moves():
+            positions.make_move(reply)
+            assert positions.unmake_move() == reply
+            assert state(positions) == after
+        assert positions.unmake_move() == code
+        assert state(positions) == before
+    assert positions.history == []
+
+
+def test_en_passant_castling_and_promotion():
+    fen = 'r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1'
+    positions = Positions(fen)
+    assert positions.make_move(Move('e5d6').code) == BLACK * 6 + PAWN
+    assert positions.mailbox[35] == EMPTY
+    positions.make_move(Move('e8c8').code)
+    assert positions.to_fen().startswith('2kr3r/')
+    assert positions.make_move(Move('b7b8q').code) == EMPTY
+    assert positions.mailbox[57] == QUEEN
+    assert positions.halfmove_clock == 0
+    for _ in range(3):
+        positions.unmake_move()
+    assert positions.to_fen() == fen
+    assert positions.mailbox[49] == PAWN
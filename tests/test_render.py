@@ -0,0 +1,66 @@
+""" Tests of rendering games to images without a window. """
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from archive import write_archive
+from classes import Positions
+from render import LAST_MOVE_COLOR, GameRenderer, render_games, save_frames
+
+MOVES = ['e2e4', 'e7e5', 'g1f3']
+
+
+@pytest.fixture(scope='module')
+def renderer() -> GameRenderer:
+
+    return GameRenderer(dpi=40)
+
+
+def test_render_game_yields_a_frame_per_position(renderer):
+    frames = list(renderer.render_game(MOVES))
+    assert len(frames) == len(MOVES) + 1
+    assert all(frame.shape == frames[0].shape for frame in frames)
+    assert frames[0].shape[2] == 4 and frames[0].dtype == np.uint8
+    assert np.array_equal(frames[0], renderer.render(Positions()))
+    for before, after in zip(frames, frames[1:]):
+        assert not np.array_equal(before, after)
+    marked = [
+        np.all(frame[..., :3] == LAST_MOVE_COLOR, axis=2).any()
+        for frame in frames
+    ]
+    assert marked == [False, True, True, True]
+
+
+def test_render_game_from_a_fen(renderer):
+    fen = '4k3/8/8/8/8/8/4P3/4K3 w - - 0 1'
+    frames = list(renderer.render_game(['e2e4'], fen))
+    assert len(frames) == 2
+    assert np.array_equal(frames[0], renderer.render(Positions(fen)))
+
+
+def test_save_frames(renderer, tmp_path):
+    frames = list(renderer.render_game(MOVES))
+    directory = save_frames(frames, str(tmp_path / 'frames'))
+    assert sorted(os.listdir(directory)) == [
+        f'{number:04d}.png' for number in range(len(frames))
+    ]
+    gif = save_frames(frames, str(tmp_path / 'game.gif'))
+    with Image.open(gif) as image:
+        assert image.n_frames == len(frames)
+    with pytest.raises(ValueError):
+        save_frames(frames, str(tmp_path / 'game'), output_format='bmp')
+
+
+def test_render_games_of_an_archive(tmp_path):
+    path = str(tmp_path / 'games.cga')
+    write_archive(path, [{'moves': MOVES}, {'moves': MOVES[:1]}])
+    jobs = [
+        {
+            'archive': path, 'game': number, 'dpi': 40, 'format': 'png',
+            'output': str(tmp_path / f'game_{number}'),
+        }
+        for number in range(2)
+    ]
+    outputs = render_games(jobs, workers=1)
+    assert outputs == [job['output'] for job in jobs]
+    assert [len(os.listdir(output)) for output in outputs] == [4, 2]
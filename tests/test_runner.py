@@ -0,0 +1,45 @@
+""" Tests of the headless games of runner.py. """
+import random
+import pytest
+from classes import Move
+from runner import GameRunner, parse_move, random_move, run_batch
+
+SELF_PLAY = {'white': random_move, 'black': random_move, 'max_plies': 40}
+
+
+@pytest.mark.parametrize('text', ['Nf3', 'e2', 'e2e9', 'e7e8k', 'e2e4qq', ''])
+def test_malformed_moves_raise_value_error(text):
+    with pytest.raises(ValueError):
+        parse_move(text)
+    with pytest.raises(ValueError):
+        Move.from_uci(text)
+
+
+def test_malformed_moves_end_the_game_as_illegal():
+    result = GameRunner(moves=['e2e4', 'Nf6']).play()
+    assert result['termination'] == 'illegal_move'
+    assert result['illegal_move'] == 'Nf6'
+    assert result['plies'] == 1
+
+
+def test_illegal_moves_end_the_game():
+    result = GameRunner(moves=['e2e4', 'e7e4']).play()
+    assert result['termination'] == 'illegal_move'
+    assert result['illegal_move'] == 'e7e4'
+
+
+def test_batches_are_random_unless_seeded():
+    first = run_batch([SELF_PLAY] * 3, workers=1)
+    second = run_batch([SELF_PLAY] * 3, workers=1)
+    assert first['seed'] != second['seed']
+    assert first['results'] != second['results']
+    again = run_batch([SELF_PLAY] * 3, workers=1, seed=first['seed'])
+    assert again['results'] == first['results']
+
+
+def test_games_leave_the_global_random_state_alone():
+    random.seed(7)
+    expected = [random.random() for _ in range(3)]
+    random.seed(7)
+    run_batch([SELF_PLAY, dict(SELF_PLAY, seed=1)], workers=1, seed=3)
+    assert [random.random() for _ in range(3)] == expected
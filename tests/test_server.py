@@ -0,0 +1,103 @@
+""" Tests of the commands of the game server. """
+import asyncio
+from typing import List
+import pytest
+from bitboards import WHITE
+from server import GameServer
+
+
+class FakeWriter:
+    """ Collects what the server writes to a connection. """
+
+    def __init__(self):
+        self.data = b''
+        self.closed = False
+
+    def write(self, data: bytes):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def talk(server: GameServer, lines: List[str]) -> List[str]:
+    """ Sends the lines over one connection and returns the replies. """
+
+    async def connection():
+        reader = asyncio.StreamReader()
+        reader.feed_data(''.join(f'{line}\n' for line in lines).encode())
+        reader.feed_eof()
+        writer = FakeWriter()
+        await server.handle(reader, writer)
+
+        return writer
+
+    writer = asyncio.run(connection())
+    assert writer.closed
+
+    return writer.data.decode().splitlines()
+
+
+@pytest.mark.parametrize('args', [
+    ['nan'], ['inf'], ['-inf'], ['0'], ['-1'], ['5', 'nan'], ['5', 'inf'],
+    ['5', '-1'], ['five'],
+])
+def test_invalid_time_controls_are_refused(args):
+    server = GameServer()
+    reply = server._execute('new', args, None, WHITE, None)
+    assert reply.startswith('error ')
+    assert not server.games
+
+
+def test_valid_time_controls_start_a_game():
+    server = GameServer()
+    game, team, reply = server._execute('new', ['3', '2'], None, WHITE, None)
+    assert (team, reply) == (WHITE, f'ok {game.number} white')
+    assert game.clock.remaining == [180.0, 180.0]
+    assert game.clock.increment == 2.0
+
+
+@pytest.mark.parametrize('minutes, increment', [
+    (float('nan'), 0), (float('inf'), 0), (5, float('inf')), (0, 0),
+])
+def test_invalid_default_time_controls_are_refused(minutes, increment):
+    with pytest.raises(ValueError):
+        GameServer(minutes, increment)
+
+
+def test_malformed_commands_get_error_lines():
+    replies = talk(GameServer(), [
+        'join \u00b2', 'join abc', 'join', 'join 99', 'move e2e4', 'board',
+        'fly', '', 'new 5 x', 'new', 'board', 'quit',
+    ])
+    assert replies[:9] == [
+        'error there is no such game waiting',
+        'error there is no such game waiting',
+        'error there is no such game waiting',
+        'error there is no such game waiting',
+        'error start or join a game first',
+        'error start or join a game first',
+        'error start or join a game first',
+        'error start or join a game first',
+        "error could not convert string to float: 'x'",
+    ]
+    assert replies[9] == 'ok 1 white'
+    assert replies[10].startswith('ok rnbqkbnr/')
+    assert replies[11] == 'ok bye'
+
+
+def test_errors_of_a_command_keep_the_connection(monkeypatch):
+    server = GameServer()
+
+    def broken(*args):
+        raise ValueError('broken')
+
+    monkeypatch.setattr(server, '_execute', broken)
+    assert talk(server, ['new', 'new']) == ['error broken', 'error broken']
@@ -0,0 +1,67 @@
+""" Tests of the generated endgame tablebases. """
+import pytest
+from classes import Positions
+from tablebase import Tablebases, generate_all
+
+
+@pytest.fixture(scope='module')
+def tablebases(tmp_path_factory) -> Tablebases:
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    tables = generate_all(['KQK', 'KRK'], directory)
+    assert sorted(tables) == ['KQK', 'KRK']
+
+    return Tablebases(directory)
+
+
+@pytest.mark.parametrize('fen, expected', [
+    # Checkmates, with the side to move mated
+    ('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1', (-1, 0)),
+    ('R7/8/8/8/8/8/8/k1K5 b - - 0 1', (-1, 0)),
+    # Mate in one, and the same with the colours swapped
+    ('k7/8/1K6/8/8/8/8/6Q1 w - - 0 1', (1, 1)),
+    ('6q1/8/8/8/8/1k6/8/K7 b - - 0 1', (1, 1)),
+    ('3k4/8/3K4/8/8/8/8/R7 w - - 0 1', (1, 1)),
+    # Stalemate, and a queen the bare king can take
+    ('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1', (0, 0)),
+    ('8/8/8/3k4/3Q4/8/8/7K b - - 0 1', (0, 0)),
+    # A lone bishop and bare kings are draws without a table
+    ('8/8/8/8/8/8/8/KBk5 w - - 0 1', (0, 0)),
+    ('8/8/8/4k3/8/8/8/4K3 w - - 0 1', (0, 0)),
+])
+def test_probe_values(tablebases, fen, expected):
+    assert tablebases.probe(Positions(fen)) == expected
+
+
+def test_symmetric_positions_have_the_same_value(tablebases):
+    fen = '8/8/8/4k3/8/8/8/4K2Q w - - 0 1'
+    value = tablebases.probe(Positions(fen))
+    assert value[0] == 1
+    for mirrored in (
+        '8/8/8/3k4/8/8/8/Q2K4 w - - 0 1',
+        '4K2Q/8/8/8/4k3/8/8/8 w - - 0 1',
+        '4k2q/8/8/8/4K3/8/8/8 b - - 0 1',
+    ):
+        assert tablebases.probe(Positions(mirrored)) == value
+
+
+@pytest.mark.parametrize('fen', [
+    '8/8/8/4k3/8/8/8/4K2Q w - - 0 1',
+    '8/8/3k4/8/8/8/8/R3K3 w - - 0 1',
+])
+def test_best_moves_mate_in_the_stored_plies(tablebases, fen):
+    positions = Positions(fen)
+    outcome, plies = tablebases.probe(positions)
+    assert outcome == 1
+    for left in range(plies, 0, -1):
+        assert tablebases.probe(positions) == (
+            (1, left) if left % 2 else (-1, left)
+        )
+        positions.make_move(tablebases.best_move(positions))
+    assert positions.is_king_checked()
+    assert positions.legal_moves() == []
+
+
+def test_missing_tables_are_not_probed(tmp_path):
+    positions = Positions('8/8/8/4k3/8/8/8/4K2Q w - - 0 1')
+    assert Tablebases(str(tmp_path)).probe(positions) is None
+    assert Tablebases(str(tmp_path)).best_move(positions) is None
@@ -0,0 +1,61 @@
+""" Tests of the transposition table. """
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+# Keys that fall into the same bucket of a table with few buckets
+FIRST, SECOND, THIRD = 0x1000, 0x2000, 0x3000
+
+
+def small_table() -> TranspositionTable:
+    table = TranspositionTable(0.001)
+    assert FIRST & table._mask == SECOND & table._mask == THIRD & table._mask
+
+    return table
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.buckets == 2 ** 20 // 32
+    assert table.probe(12345) is None
+    table.store(12345, 0x1234, 7, LOWER, -250)
+    table.store(54321, 0, 3, UPPER, 99990)
+    assert table.probe(12345) == (0x1234, 7, LOWER, -250)
+    assert table.probe(54321) == (0, 3, UPPER, 99990)
+    stats = table.stats()
+    assert (stats['probes'], stats['hits'], stats['stores']) == (3, 2, 2)
+    table.clear()
+    assert table.probe(12345) is None
+    assert table.occupancy() == 0
+
+
+def test_deeper_results_keep_the_first_slot():
+    table = small_table()
+    table.store(FIRST, 1, 8, EXACT, 10)
+    table.store(SECOND, 2, 2, EXACT, 20)
+    table.store(THIRD, 3, 4, EXACT, 30)
+    assert table.probe(FIRST) == (1, 8, EXACT, 10)
+    assert table.probe(SECOND) is None
+    assert table.probe(THIRD) == (3, 4, EXACT, 30)
+    assert table.collisions == 1
+
+
+def test_deeper_or_older_entries_are_replaced():
+    table = small_table()
+    table.store(FIRST, 1, 4, EXACT, 10)
+    table.store(SECOND, 2, 6, EXACT, 20)
+    assert table.probe(FIRST) is None
+    assert table.probe(SECOND) == (2, 6, EXACT, 20)
+    table.new_search()
+    table.store(THIRD, 3, 1, EXACT, 30)
+    assert table.probe(SECOND) is None
+    assert table.probe(THIRD) == (3, 1, EXACT, 30)
+
+
+def test_a_key_is_never_stored_twice():
+    table = small_table()
+    table.store(FIRST, 1, 8, EXACT, 10)
+    table.store(SECOND, 2, 2, EXACT, 20)
+    table.new_search()
+    table.store(SECOND, 3, 5, LOWER, 30)
+    table.store(THIRD, 4, 6, EXACT, 40)
+    assert list(table.keys[:2]) == [THIRD, SECOND]
+    assert table.probe(SECOND) == (3, 5, LOWER, 30)
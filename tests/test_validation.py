@@ -0,0 +1,79 @@
+""" Tests of the checks of single moves and whole move lists. """
+from bitboards import KING, QUEEN, encode_move
+from classes import Move, Positions
+from control import explain_illegal_move, validate_moves
+from movegen import is_legal_move
+
+PROMOTION_FEN = '8/4P3/8/8/8/8/8/k6K w - - 0 1'
+
+
+def test_unknown_promotion_pieces_are_illegal():
+    positions = Positions()
+    for promotion in (KING, 6, 7):
+        code = encode_move(12, 28, promotion)
+        assert not is_legal_move(positions, code)
+        assert validate_moves([code]) == (
+            0, 'a pawn can only be promoted to a knight, bishop, rook or queen'
+        )
+
+
+def test_promotions_before_the_last_row_are_illegal():
+    positions = Positions()
+    code = encode_move(12, 28, QUEEN)
+    assert not is_legal_move(positions, code)
+    assert explain_illegal_move(positions, code) == (
+        'only a pawn reaching the last row can be promoted'
+    )
+    assert validate_moves(['e2e4q'])[0] == 0
+
+
+def test_promotions_on_the_last_row():
+    positions = Positions(PROMOTION_FEN)
+    assert is_legal_move(positions, encode_move(52, 60, QUEEN))
+    assert not is_legal_move(positions, encode_move(52, 60))
+    assert not is_legal_move(positions, encode_move(52, 60, KING))
+    assert validate_moves(['e7e8q'], PROMOTION_FEN) == (-1, '')
+
+
+def test_is_legal_move_agrees_with_the_legal_moves():
+    positions = Positions()
+    for move in ('e2e4', 'f7f6', 'd1h5'):
+        code = Move.from_uci(move).code
+        assert is_legal_move(positions, code)
+        positions.make_move(code)
+    legal = set(positions.legal_moves())
+    for code in range(1 << 15):
+        assert is_legal_move(positions, code) == (code in legal)
+
+
+def test_moves_into_check_are_explained():
+    positions = Positions()
+    for move in ('e2e4', 'e7e5', 'e1e2', 'd8g5'):
+        positions.make_move(Move.from_uci(move).code)
+    code = Move.from_uci('e2e3').code
+    assert not is_legal_move(positions, code)
+    assert explain_illegal_move(positions, code) == (
+        'the move would leave the king in check'
+    )
+    assert validate_moves(['e2e4', 'e7e5', 'e1e2', 'd8g5', 'e2e3']) == (
+        4, 'the move would leave the king in check'
+    )
+
+
+def test_unreachable_moves_in_check_are_explained():
+    positions = Positions()
+    for move in ('e2e4', 'f7f6', 'd1h5'):
+        positions.make_move(Move.from_uci(move).code)
+    assert explain_illegal_move(positions, Move.from_uci('g8e6').code) == (
+        "the piece can't move like that"
+    )
+    assert explain_illegal_move(positions, Move.from_uci('a7a6').code) == (
+        "the move doesn't get the king out of check"
+    )
+
+
+def test_entries_that_are_not_moves():
+    for entry in (None, 1.5, b'e2e4', 1 << 15, -1):
+        assert validate_moves(['e2e4', entry]) == (
+            1, f'{entry!r} is not a move code'
+        )
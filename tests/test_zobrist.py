@@ -0,0 +1,44 @@
+""" Tests of the Zobrist keys kept by Positions. """
+import pytest
+from classes import Move, Positions
+from perft import REFERENCE_POSITIONS
+from zobrist import compute_key
+
+
+def walk(positions: Positions, depth: int):
+    """ Checks the incremental key against compute_key at every node. """
+    assert positions.key == compute_key(positions)
+    if depth == 0:
+        return
+    for code in positions.legal_moves():
+        positions.make_move(code)
+        walk(positions, depth - 1)
+        positions.unmake_move()
+        assert positions.key == compute_key(positions)
+
+
+@pytest.mark.parametrize('name', list(REFERENCE_POSITIONS))
+def test_incremental_keys_match_computed_keys(name):
+    walk(Positions(REFERENCE_POSITIONS[name][0]), 2)
+
+
+def test_transpositions_share_a_key():
+    first = Positions()
+    second = Positions()
+    for move in ('g1f3', 'g8f6', 'b1c3', 'b8c6'):
+        first.make_move(Move(move).code)
+    for move in ('b1c3', 'b8c6', 'g1f3', 'g8f6'):
+        second.make_move(Move(move).code)
+    assert first.key == second.key
+    assert first.key == Positions(first.to_fen()).key
+
+
+def test_side_castling_and_en_passant_change_the_key():
+    fen = 'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq - 0 3'
+    keys = {
+        Positions(fen).key,
+        Positions(fen.replace(' w ', ' b ')).key,
+        Positions(fen.replace('KQkq', 'Kkq')).key,
+        Positions(fen.replace(' - 0', ' d6 0')).key,
+    }
+    assert len(keys) == 4
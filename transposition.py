@@ -0,0 +1,156 @@
+""" This module contains the transposition table of the search. It remembers
+the result of searching a position, keyed by its Zobrist key, so that a
+position reached again through another move order doesn't have to be
+searched again. The table has a fixed size, chosen by a memory budget, and is
+stored in two preallocated arrays of 64-bit integers instead of a dictionary,
+so its memory stays the same however long the analysis runs. """
+from array import array
+from typing import Dict, Optional, Tuple
+
+# Bound types of a stored score
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+# Every entry takes two 64-bit integers: the key and the packed data
+ENTRY_BYTES = 16
+# Entries per bucket: the first slot keeps the deepest search, the second is
+# always replaced
+BUCKET_SIZE = 2
+DEFAULT_SIZE_MB = 16
+
+# Layout of the packed data: move code (16 bits), depth (8 bits), bound
+# (2 bits), age (6 bits) and the score offset to be positive (32 bits)
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+SCORE_OFFSET = 1 << 31
+AGES = 64
+
+
+class TranspositionTable:
+    """ Fixed-size hash table of search results.
+    Properties:
+        self.buckets: the number of buckets (a power of two).
+        self.age: the current search; entries of older searches are
+            replaced first.
+        self.probes, self.hits: lookups and lookups that found the key.
+        self.stores, self.collisions: writes, and writes that replaced a
+            different position.
+    Methods:
+        self.probe(): returns the entry stored for a key.
+        self.store(): stores the result of a search.
+        self.new_search(): ages the stored entries.
+        self.stats(): returns the counters and the occupancy.
+    """
+
+    def __init__(self, size_mb: float = DEFAULT_SIZE_MB):
+        """ Uses the largest power of two of buckets that fits in size_mb
+        megabytes. """
+        buckets = int(size_mb * 2 ** 20) // (ENTRY_BYTES * BUCKET_SIZE)
+        self.buckets = 1 << (max(buckets, 1).bit_length() - 1)
+        self._mask = self.buckets - 1
+        self.keys = array('Q', bytes(8 * BUCKET_SIZE * self.buckets))
+        self.data = array('Q', bytes(8 * BUCKET_SIZE * self.buckets))
+        self.age = 0
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def __len__(self):
+
+        return len(self.keys)
+
+    def clear(self):
+        """ Empties the table and resets the counters. """
+        self.keys = array('Q', bytes(8 * len(self.keys)))
+        self.data = array('Q', bytes(8 * len(self.data)))
+        self.age = 0
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def new_search(self):
+        """ Starts a new search. Entries stored by earlier searches are still
+        used, but they give way to new ones. """
+        self.age = (self.age + 1) % AGES
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """ Returns (move, depth, bound, score) stored for the key, or None.
+        """
+        self.probes += 1
+        slot = (key & self._mask) * BUCKET_SIZE
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+
+                return None
+        self.hits += 1
+        data = self.data[slot]
+
+        return (
+            data & 0xFFFF,
+            (data >> DEPTH_SHIFT) & 0xFF,
+            (data >> BOUND_SHIFT) & 3,
+            (data >> SCORE_SHIFT) - SCORE_OFFSET,
+        )
+
+    def store(self, key: int, move: int, depth: int, bound: int, score: int):
+        """ Stores a search result. An entry of the same position is always
+        replaced, in whichever slot it is, so a key is never held twice.
+        Otherwise the first slot of the bucket is replaced by a search at
+        least as deep or if it's left over from an earlier search, and the
+        second slot is replaced if not. """
+        self.stores += 1
+        slot = (key & self._mask) * BUCKET_SIZE
+        keys = self.keys
+        data = self.data
+        stored_key = keys[slot]
+        if stored_key != key:
+            if keys[slot + 1] == key:
+                slot += 1
+            elif stored_key:
+                stored = data[slot]
+                if (
+                    depth < (stored >> DEPTH_SHIFT) & 0xFF
+                    and (stored >> AGE_SHIFT) & (AGES - 1) == self.age
+                ):
+                    slot += 1
+            stored_key = keys[slot]
+        if not stored_key:
+            self.used += 1
+        elif stored_key != key:
+            self.collisions += 1
+        keys[slot] = key
+        data[slot] = (
+            move
+            | depth << DEPTH_SHIFT
+            | bound << BOUND_SHIFT
+            | self.age << AGE_SHIFT
+            | (score + SCORE_OFFSET) << SCORE_SHIFT
+        )
+
+    def occupancy(self) -> float:
+        """ Returns the share of the slots that hold an entry. """
+
+        return self.used / len(self.keys)
+
+    def stats(self) -> Dict:
+        """ Returns the size and the counters of the table. """
+
+        return {
+            'entries': len(self.keys),
+            'megabytes': len(self.keys) * ENTRY_BYTES / 2 ** 20,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'stores': self.stores,
+            'collisions': self.collisions,
+            'occupancy': self.occupancy(),
+        }
@@ -0,0 +1,43 @@
+""" This module contains the Zobrist keys used to hash positions. Every piece
+on every square, the side to move, each set of castling rights and each en
+passant column has a random 64-bit number. The key of a position is the XOR
+of the numbers that apply to it, so a move only has to XOR in and out the
+parts that changed. """
+import random
+from bitboards import iter_bits
+
+# A fixed seed makes the keys the same in every process, so keys can be
+# stored and shared between workers.
+_RANDOM = random.Random(20200419)
+
+PIECE_KEYS = [
+    [_RANDOM.getrandbits(64) for _ in range(64)] for _ in range(12)
+]
+BLACK_TO_MOVE_KEY = _RANDOM.getrandbits(64)
+CASTLING_KEYS = [_RANDOM.getrandbits(64) for _ in range(16)]
+EN_PASSANT_KEYS = [_RANDOM.getrandbits(64) for _ in range(8)]
+
+
+def en_passant_key(square: int) -> int:
+    """ Returns the key for an en passant square (0 for None). """
+    if square is None:
+
+        return 0
+
+    return EN_PASSANT_KEYS[square & 7]
+
+
+def compute_key(positions) -> int:
+    """ Computes the key of the positions from scratch. Positions keeps its
+    key up to date incrementally, this is used to set it up and to verify
+    it. """
+    key = 0
+    for index, bitboard in enumerate(positions.bitboards):
+        for square in iter_bits(bitboard):
+            key ^= PIECE_KEYS[index][square]
+    if positions.turn:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[positions.castling_rights]
+    key ^= en_passant_key(positions.en_passant_square)
+
+    return key